@@ -0,0 +1,56 @@
+'''Benchmark of email template rendering for bulk campaigns
+
+Compares rendering with str.format on the raw template, like mails were
+built before templates were precompiled, with precompiled templates.
+Building the EmailMsg model, which validates the mail address, is measured
+separately.
+
+Usage: python -m benchmarks.bench_email_templates [mails]
+'''
+
+import sys
+import time
+
+from harbor.helpers.email import BUILTIN_TEMPLATE_PATH, get_template_engine
+from harbor.helpers.settings import get_settings
+
+TEMPLATE = 'register_verification'
+
+
+def bench(name: str, mails: int, render):
+    '''Prints renders per second of render(index)'''
+    start = time.perf_counter()
+    for index in range(mails):
+        render(index)
+    seconds = time.perf_counter() - start
+    print(f'{name:<32} {mails / seconds:>12,.0f}')
+
+
+def main(mails: int):
+    '''Runs benchmark and prints results'''
+    engine = get_template_engine()
+    template = engine.get(TEMPLATE)
+    path = get_settings().EMAIL_TEMPLATE_PATH or BUILTIN_TEMPLATE_PATH
+    raw = [(path / f'{TEMPLATE}.en.{part}').read_text(encoding='utf-8')
+           for part in ('subject', 'txt', 'html')]
+
+    def render_raw(index):
+        settings = get_settings()
+        values = {'frontend_url': settings.FRONTEND_URL, 'secret': f'secret-{index}'}
+        return tuple(part.format(**values) for part in raw)
+
+    def render_precompiled(index):
+        return template.render({'secret': f'secret-{index}'})
+
+    def render_msg(index):
+        return engine.render(TEMPLATE, 'TestUser', f'user{index}@kh.test',
+                             {'secret': f'secret-{index}'})
+
+    print(f'{"Mode":<32} {"Mails/s":>12}')
+    bench('str.format per mail', mails, render_raw)
+    bench('Precompiled', mails, render_precompiled)
+    bench('Precompiled + EmailMsg', mails, render_msg)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,95 @@
+'''Benchmark of friend aware user search on a synthetic graph
+
+Seeds verified users with random friendships in a temporary database
+(50,000 users with 20 friends each is 1,000,000 edges by default) and
+compares UserMongoRepo.get_search with and without ranking by network.
+
+Usage: python -m benchmarks.bench_friend_search [users] [friends per user]
+'''
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from typing import List
+
+from bson import ObjectId
+from pymongo import InsertOne
+
+from harbor.domain.user import User
+from harbor.helpers.settings import get_settings
+from harbor.repository.mongo.users import UserMongoRepo, trigrams
+
+PREFIXES = ('harbor', 'sailor', 'captain', 'anchor', 'pirate', 'mermaid')
+QUERIES = ('h', 'sai', 'captain1', 'or12', 'unknown')
+SEARCHES_PER_QUERY = 20
+
+
+async def seed(repo: UserMongoRepo, users: int, degree: int):
+    '''Inserts users with random friends'''
+    user_ids = [ObjectId() for _ in range(users)]
+    requests = []
+    for (i, user_id) in enumerate(user_ids):
+        username = f'{random.choice(PREFIXES)}{i}'
+        friends = random.sample(user_ids, degree)
+        requests.append(InsertOne({
+            '_id': user_id,
+            'display_name': username,
+            'username': username,
+            'email': f'{username}@kh.test',
+            'is_verified': True,
+            'friends': [str(friend_id) for friend_id in friends if friend_id != user_id],
+            'search_keys': trigrams(username),
+        }))
+        if len(requests) == 10000:
+            await repo.col.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        await repo.col.bulk_write(requests, ordered=False)
+    return [str(user_id) for user_id in user_ids]
+
+
+async def time_search(repo: UserMongoRepo, requesters: List[User]) -> float:
+    '''Returns average milliseconds per search'''
+    start = time.perf_counter()
+    for query in QUERIES:
+        for _ in range(SEARCHES_PER_QUERY):
+            await repo.get_search(random.choice(requesters), query)
+    return (time.perf_counter() - start) * 1000 / (len(QUERIES) * SEARCHES_PER_QUERY)
+
+
+async def no_network(_):
+    '''Skips ranking by network'''
+    return (set(), set())
+
+
+async def main(users: int, degree: int):
+    '''Seeds users and prints search timings'''
+    os.environ['MONGO_DATABASE'] = f'bench-kh-users-{uuid.uuid4().hex[:10]}'
+    get_settings.cache_clear()
+
+    async with UserMongoRepo() as repo:
+        try:
+            start = time.perf_counter()
+            user_ids = await seed(repo, users, degree)
+            print(f'Seeded {users:,} users with {users * degree:,} friendships '
+                  f'in {time.perf_counter() - start:.1f}s')
+
+            # Requesting users are loaded per request before searching
+            requesters = [await repo.get(user_id) for user_id in random.sample(user_ids, 100)]
+
+            print(f'{"Search":<12} {"ms/search":>12}')
+            print(f'{"network":<12} {await time_search(repo, requesters):>12.2f}')
+            repo.get_network = no_network
+            print(f'{"plain":<12} {await time_search(repo, requesters):>12.2f}')
+        finally:
+            await repo.client.drop_database(repo.db)
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    ))
@@ -0,0 +1,91 @@
+'''Benchmark of JWT algorithms on the access token paths
+
+Compares sign and verify throughput of create_access_token and
+validate_access_token per algorithm. The verified token cache is disabled,
+so every validation does a full signature check.
+
+Usage: python -m benchmarks.bench_jwt [iterations]
+'''
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from harbor.helpers import auth
+from harbor.helpers.settings import get_settings
+
+ALGORITHMS = {
+    'ES256': lambda: ec.generate_private_key(ec.SECP256R1()),
+    'ES512': lambda: ec.generate_private_key(ec.SECP521R1()),
+    'RS256': lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    'EdDSA': ed25519.Ed25519PrivateKey.generate,
+    'HS256': None,
+    'HS512': None,
+}
+
+CACHED_FUNCTIONS = (get_settings, auth.get_keyring, auth.get_token_cache)
+
+
+def write_keys(path: Path, jwt_alg: str):
+    '''Writes key material for an algorithm to path'''
+    generate = ALGORITHMS[jwt_alg]
+    if generate is None:
+        (path / 'secret.key').write_text(os.urandom(64).hex())
+        return
+
+    private_key = generate()
+    (path / 'private.pem').write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    (path / 'public.pem').write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+
+
+async def bench_algorithm(jwt_alg: str, iterations: int):
+    '''Returns sign and verify operations per second for an algorithm'''
+    with tempfile.TemporaryDirectory() as key_path:
+        write_keys(Path(key_path), jwt_alg)
+        os.environ['JWT_ALG'] = jwt_alg
+        os.environ['JWT_KEY_PATH'] = key_path
+        os.environ['JWT_VERIFY_CACHE_SIZE'] = '0'
+        for cached in CACHED_FUNCTIONS:
+            cached.cache_clear()
+
+        # Sign
+        user_id = '507f1f77bcf86cd799439011'
+        start = time.perf_counter()
+        for _ in range(iterations):
+            token = await auth.create_access_token(user_id=user_id)
+        sign_seconds = time.perf_counter() - start
+
+        # Verify
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await auth.validate_access_token(token)
+        verify_seconds = time.perf_counter() - start
+
+    return (iterations / sign_seconds, iterations / verify_seconds)
+
+
+async def main(iterations: int):
+    '''Runs benchmark for all algorithms and prints results'''
+    print(f'{"Algorithm":<10} {"Sign/s":>12} {"Verify/s":>12}')
+    for jwt_alg in ALGORITHMS:
+        (sign, verify) = await bench_algorithm(jwt_alg, iterations)
+        print(f'{jwt_alg:<10} {sign:>12,.0f} {verify:>12,.0f}')
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    )
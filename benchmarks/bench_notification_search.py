@@ -0,0 +1,109 @@
+'''Benchmark of notification search on a seeded collection
+
+Compares the former case insensitive regex search with the text index
+search of NotificationMongoRepo.get_search. Notifications are seeded in a
+temporary database, which is dropped afterwards.
+
+Usage: python -m benchmarks.bench_notification_search [notifications] [users]
+'''
+
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import DESCENDING
+
+from harbor.domain.notification import Notification
+from harbor.helpers.settings import get_settings
+from harbor.repository.mongo.notifications import NotificationMongoRepo
+
+WORDS = ('harbor', 'friend', 'request', 'accepted', 'event', 'group', 'invite',
+         'comment', 'photo', 'message', 'reminder', 'profile', 'update', 'liked')
+QUERIES = ('harbor', 'friend request', 'reminder', 'unknownword')
+SEARCHES_PER_QUERY = 20
+
+
+def random_text(length: int) -> str:
+    '''Returns random words'''
+    return ' '.join(random.choice(WORDS) for _ in range(length))
+
+
+async def seed(repo: NotificationMongoRepo, count: int, user_ids):
+    '''Inserts random notifications'''
+    now = datetime.now(timezone.utc)
+    batch = []
+    for i in range(count):
+        batch.append(Notification(
+            user_id=random.choice(user_ids),
+            title=random_text(3),
+            description=random_text(10),
+            is_read=True,
+            icon='https://kh.test/icon',
+            link='/profile/me',
+            created_on=now - timedelta(minutes=i),
+        ))
+        if len(batch) == 10000:
+            await repo.add_many(batch)
+            batch = []
+    if batch:
+        await repo.add_many(batch)
+
+
+async def regex_search(repo: NotificationMongoRepo, user_id: str, search_string: str):
+    '''Former search implementation'''
+    return await repo.col.find(
+        filter={
+            'user_id': {'$eq': ObjectId(user_id)},
+            '$or': [
+                {'title': {'$regex': f'.*{search_string}.*', '$options': 'i'}},
+                {'description': {'$regex': f'.*{search_string}.*', '$options': 'i'}},
+            ]
+        },
+        sort=[('created_on', DESCENDING)],
+    ).to_list(None)
+
+
+async def text_search(repo: NotificationMongoRepo, user_id: str, search_string: str):
+    '''Text index search, first page'''
+    return await repo.get_search(user_id, search_string, limit=20)
+
+
+async def time_search(search, repo, user_ids) -> float:
+    '''Returns average milliseconds per search'''
+    start = time.perf_counter()
+    for query in QUERIES:
+        for _ in range(SEARCHES_PER_QUERY):
+            await search(repo, random.choice(user_ids), query)
+    return (time.perf_counter() - start) * 1000 / (len(QUERIES) * SEARCHES_PER_QUERY)
+
+
+async def main(count: int, users: int):
+    '''Seeds notifications and prints search timings'''
+    os.environ['MONGO_DATABASE'] = f'bench-kh-notifications-{uuid.uuid4().hex[:10]}'
+    get_settings.cache_clear()
+    user_ids = [str(ObjectId()) for _ in range(users)]
+
+    async with NotificationMongoRepo() as repo:
+        try:
+            start = time.perf_counter()
+            await seed(repo, count, user_ids)
+            print(f'Seeded {count:,} notifications for {users:,} users '
+                  f'in {time.perf_counter() - start:.1f}s')
+
+            print(f'{"Search":<10} {"ms/search":>12}')
+            for (name, search) in (('regex', regex_search), ('text', text_search)):
+                print(f'{name:<10} {await time_search(search, repo, user_ids):>12.2f}')
+        finally:
+            await repo.client.drop_database(repo.db)
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+    ))
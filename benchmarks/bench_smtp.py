@@ -0,0 +1,79 @@
+'''Benchmark of the SMTP connection pool
+
+Sends mails to a local aiosmtpd server which discards them. Compares a new
+connection per mail, like send_mail did before the pool, with pooled
+connections. Requires aiosmtpd (see requirements/dev.txt).
+
+Usage: python -m benchmarks.bench_smtp [mails]
+'''
+
+import os
+import sys
+import time
+
+from aiosmtpd.controller import Controller
+
+from harbor.domain.email import EmailMsg
+from harbor.helpers.settings import get_settings
+from harbor.worker.smtp import SMTPPool
+from harbor.worker.tasks.email import build_message
+
+HOSTNAME = '127.0.0.1'
+PORT = 8025
+
+
+class CountingHandler:
+    '''Discards received mails and counts them'''
+
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):  # pylint: disable=invalid-name,unused-argument
+        '''Counts a received mail'''
+        self.received += 1
+        return '250 OK'
+
+
+def bench_pool(mails: int, max_messages: int):
+    '''Returns sent mails per second and opened connections'''
+    os.environ['EMAIL_MAX_MESSAGES_PER_CONNECTION'] = str(max_messages)
+    get_settings.cache_clear()
+    pool = SMTPPool()
+    msg = build_message(EmailMsg(
+        to_name='TestUser',
+        to_email='user@kh.test',
+        subject='Benchmark',
+        text='Benchmark',
+        html='<p>Benchmark</p>',
+    ))
+
+    start = time.perf_counter()
+    for _ in range(mails):
+        pool.send_message(msg)
+    seconds = time.perf_counter() - start
+    pool.close()
+    return (mails / seconds, pool.connects)
+
+
+def main(mails: int):
+    '''Runs benchmark and prints results'''
+    os.environ['EMAIL_HOSTNAME'] = HOSTNAME
+    os.environ['EMAIL_PORT'] = str(PORT)
+    os.environ['EMAIL_SECURITY'] = 'unsecure'
+    handler = CountingHandler()
+    controller = Controller(handler, hostname=HOSTNAME, port=PORT)
+    controller.start()
+    try:
+        print(f'{"Mode":<24} {"Mails/s":>10} {"Connections":>12}')
+        for (mode, max_messages) in (('Connection per mail', 1),
+                                     ('Pooled (100 per conn)', 100),
+                                     ('Pooled (unlimited)', mails)):
+            (rate, connects) = bench_pool(mails, max_messages)
+            print(f'{mode:<24} {rate:>10,.0f} {connects:>12}')
+    finally:
+        controller.stop()
+    print(f'Received {handler.received} mails')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
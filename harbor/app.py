@@ -1,15 +1,24 @@
 '''Main entry point for Kinky Harbor'''
 
+import asyncio
 import logging
 
 import uvicorn
 from fastapi import FastAPI
-from starlette.responses import RedirectResponse
+from starlette.requests import Request
+from starlette.responses import JSONResponse, RedirectResponse
 from starlette.middleware.cors import CORSMiddleware
+from starlette.status import HTTP_503_SERVICE_UNAVAILABLE
 
+from harbor.helpers import auth
+from harbor.helpers.autocomplete import get_user_index, keep_user_index_fresh
+from harbor.helpers.hub import get_hub
+from harbor.helpers.keyring import get_keyring
 from harbor.helpers.settings import get_settings
 from harbor.repository.mongo import (
+    common as mongo_common,
     notifications as mongo_notif,
+    outbox as mongo_outbox,
     refresh_tokens as mongo_rt,
     stats as mongo_stats,
     users as mongo_user,
@@ -23,6 +32,8 @@ from harbor.rest import (
     stats as router_stats,
     users as router_users,
 )
+from harbor.worker.mail_buffer import get_mail_buffer
+from harbor.worker.outbox import get_task_outbox
 
 
 # Start app
@@ -78,28 +89,112 @@ app.include_router(
 async def create_repos():
     '''Creates repositories on application start'''
     logging.info("Database repositories: Creating ...")
+    client = mongo_common.create_db_client()
+    app.state.db_client = client
+    (notif, outbox, refresh_token, stats, user, verif_token) = await asyncio.gather(
+        mongo_notif.create_repo(client),
+        mongo_outbox.create_repo(client),
+        mongo_rt.create_repo(client),
+        mongo_stats.create_repo(client),
+        mongo_user.create_repo(client),
+        mongo_vt.create_repo(client),
+    )
     app.state.repos = {
-        'notification': await mongo_notif.create_repo(),
-        'refresh_token': await mongo_rt.create_repo(),
-        'stats': await mongo_stats.create_repo(),
-        'user': await mongo_user.create_repo(),
-        'verif_token': await mongo_vt.create_repo()
+        'notification': notif,
+        'refresh_token': refresh_token,
+        'stats': stats,
+        'task_outbox': outbox,
+        'user': user,
+        'verif_token': verif_token,
     }
     logging.info("Database repositories: Created")
+    stats.add_upsert_listener(router_stats.invalidate_response_cache)
+    await get_task_outbox().start(outbox, durable=get_settings().TASK_OUTBOX_DURABLE)
+    await mongo_common.log_pool_stats(client)
 
 # Close database connections
 @app.on_event("shutdown")
 async def close_repos():
-    '''Close DB client of repositories on application shutdown'''
+    '''Close shared DB client of repositories on application shutdown'''
+    # Publish pending tasks first, durable outbox needs the database
+    await get_mail_buffer().close()
+    await get_task_outbox().close(get_settings().TASK_OUTBOX_DRAIN_SECONDS)
     logging.info("Database repositories: Closing ...")
-    await app.state.repos['notification'].close()
-    await app.state.repos['refresh_token'].close()
-    await app.state.repos['stats'].close()
-    await app.state.repos['user'].close()
-    await app.state.repos['verif_token'].close()
+    app.state.db_client.close()
     logging.info("Database repositories: Closed")
 
 
+# Autocomplete usernames in memory
+@app.on_event('startup')
+async def start_user_index():
+    '''Starts loading and refreshing the autocomplete index of users'''
+    if get_settings().USER_AUTOCOMPLETE:
+        app.state.user_index_refresh = asyncio.ensure_future(
+            keep_user_index_fresh(get_user_index(), app.state.repos['user']))
+
+
+@app.on_event('shutdown')
+async def stop_user_index():
+    '''Stops refreshing the autocomplete index of users'''
+    task = getattr(app.state, 'user_index_refresh', None)
+    if task:
+        task.cancel()
+
+
+# Load JWT keys and reload them in the background
+@app.on_event('startup')
+async def start_jwt_key_reload():
+    '''Loads JWT keys and starts reloading them periodically'''
+    get_keyring()
+    interval = get_settings().JWT_KEY_RELOAD_SECONDS
+    if interval > 0:
+        app.state.jwt_key_reload = asyncio.ensure_future(
+            auth.reload_jwt_keys_periodically(interval))
+
+
+@app.on_event('shutdown')
+async def stop_jwt_key_reload():
+    '''Stops reloading JWT keys on application shutdown'''
+    task = getattr(app.state, 'jwt_key_reload', None)
+    if task:
+        task.cancel()
+
+
+# Push notifications to open streams
+@app.on_event('startup')
+async def start_notification_hub():
+    '''Starts receiving published notifications'''
+    await get_hub().start()
+
+
+@app.on_event('shutdown')
+async def stop_notification_hub():
+    '''Sends notifications published in the background and stops receiving'''
+    await get_hub().wait_published()
+    await get_hub().close()
+
+
+# Stop password hashing workers
+@app.on_event("shutdown")
+async def stop_hash_executor():
+    '''Stop password hashing processes on application shutdown'''
+    auth.shutdown_hash_executor()
+
+
+@app.exception_handler(auth.PasswordHasherBusyError)
+async def hasher_busy_handler(_: Request, exc: auth.PasswordHasherBusyError):
+    '''Returns 503 if too many password hashing jobs are pending'''
+    logging.warning('Password hashing rejected: %s', exc)
+    return JSONResponse(
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'},
+        content={
+            'code': 'service_busy',
+            'msg': 'Service is busy, please try again',
+        },
+    )
+
+
 # Add CORS
 app.add_middleware(
     CORSMiddleware,
@@ -1,9 +1,13 @@
 '''This module contains all notification related models'''
 
-from pydantic import HttpUrl
+from datetime import datetime, timedelta, timezone
+
+from pydantic import BaseModel, HttpUrl
 
 from harbor.domain.common import CreatedOnMixin, DBModelMixin, ObjectIdStr
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 class Notification(DBModelMixin, CreatedOnMixin):
     '''Notification'''
@@ -13,3 +17,49 @@ class Notification(DBModelMixin, CreatedOnMixin):
     is_read: bool = False
     icon: HttpUrl
     link: str
+
+
+class NotificationTemplate(BaseModel):
+    '''Content of a notification sent to many users'''
+    title: str
+    description: str
+    icon: HttpUrl
+    link: str
+
+    def for_user(self, user_id: str) -> Notification:
+        '''Returns a notification for a recipient'''
+        return Notification(user_id=user_id, **self.dict())
+
+
+class NotificationCursor(BaseModel):
+    '''Position in a list of notifications, sorted newest first
+
+    Encoded as "<created_on in ms since epoch>-<notification ID>"
+    '''
+    created_on: datetime
+    id: ObjectIdStr
+
+    @classmethod
+    def from_notification(cls, notification: Notification) -> 'NotificationCursor':
+        '''Returns cursor pointing to the provided notification'''
+        return cls(created_on=notification.created_on, id=notification.id)
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'NotificationCursor':
+        '''Parses an encoded cursor
+
+        Raises
+            ValueError: Cursor is invalid
+        '''
+        try:
+            (timestamp, notif_id) = cursor.split('-')
+            created_on = EPOCH + timedelta(milliseconds=int(timestamp))
+        except (ValueError, OverflowError, OSError) as error:
+            raise ValueError(f'Invalid cursor "{cursor}"') from error
+        return cls(created_on=created_on, id=notif_id)
+
+    def encode(self) -> str:
+        '''Returns cursor as string'''
+        created_on = self.created_on.replace(tzinfo=self.created_on.tzinfo or timezone.utc)
+        timestamp = (created_on - EPOCH) // timedelta(milliseconds=1)
+        return f'{timestamp}-{self.id}'
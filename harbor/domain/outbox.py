@@ -0,0 +1,11 @@
+'''This module contains all task outbox related models'''
+
+from typing import Any, List
+
+from harbor.domain.common import CreatedOnMixin, DBModelMixin
+
+
+class OutboxTask(DBModelMixin, CreatedOnMixin):
+    '''Celery task waiting to be published'''
+    task_name: str
+    args: List[Any] = []
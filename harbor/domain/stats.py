@@ -1,6 +1,6 @@
 '''This module contains all statistics related models'''
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from enum import Enum, unique
 from typing import Dict
 
@@ -11,6 +11,9 @@ from pydantic import BaseModel
 class ReadingSubject(str, Enum):
     '''Supported reading subjects'''
     ACTIVE_USERS = 'active_users'
+    LOGINS = 'logins'
+    NOTIFICATIONS_SENT = 'notifications_sent'
+    REGISTRATIONS = 'registrations'
 
 
 class Reading(BaseModel):
@@ -27,10 +30,33 @@ class ReadingAggregationTimespan(int, Enum):
     MONTH = 30
     YEAR = 365
 
+    def bucket_start(self, value: datetime) -> datetime:
+        '''Returns start of the week (Monday), month or year containing value'''
+        day = datetime(value.year, value.month, value.day, tzinfo=value.tzinfo)
+        if self is ReadingAggregationTimespan.WEEK:
+            return day - timedelta(days=day.weekday())
+        if self is ReadingAggregationTimespan.MONTH:
+            return day.replace(day=1)
+        return day.replace(month=1, day=1)
+
+    def bucket_end(self, value: datetime) -> datetime:
+        '''Returns start of the next bucket after the one containing value'''
+        start = self.bucket_start(value)
+        if self is ReadingAggregationTimespan.WEEK:
+            return start + timedelta(days=7)
+        if self is ReadingAggregationTimespan.MONTH:
+            if start.month == 12:
+                return start.replace(year=start.year + 1, month=1)
+            return start.replace(month=start.month + 1)
+        return start.replace(year=start.year + 1)
+
 
 class ReadingAggregationOperation(str, Enum):
     '''Operation of aggregated reading'''
     AVERAGE = 'avg'
+    MINIMUM = 'min'
+    MAXIMUM = 'max'
+    SUM = 'sum'
 
 
 class ReadingAggregation(BaseModel):
@@ -1,6 +1,7 @@
 '''This module contains all token related models'''
 
 import secrets
+from datetime import datetime
 from enum import Enum, unique
 from typing import Optional
 
@@ -12,6 +13,7 @@ from harbor.domain.common import CreatedOnMixin, DBModelMixin, ObjectIdStr
 class AccessTokenData(BaseModel):
     '''Contains data which will be embedded into AccessToken'''
     user_id: ObjectIdStr
+    expires_on: Optional[datetime] = None
 
 
 class AccessRefreshTokens(BaseModel):
@@ -1,30 +1,226 @@
 '''Helpers module for authentication related functions'''
 
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 
 import jwt
 from passlib.context import CryptContext
 from pydantic import ValidationError
 
 from harbor.domain.token import AccessTokenData
-from harbor.helpers.settings import get_settings, get_jwt_key
+from harbor.helpers.keyring import get_keyring
+from harbor.helpers.settings import get_settings
 
-PASSLIB_OPTS = {
-    'schemes': ['bcrypt'],
-    'deprecated': 'auto',
-}
+
+@lru_cache(maxsize=None)
+def get_crypt_context() -> CryptContext:
+    '''Returns cached password hashing context'''
+    settings = get_settings()
+    opts = {
+        'schemes': settings.PASSWORD_SCHEMES,
+        'deprecated': 'auto',
+    }
+    if 'bcrypt' in settings.PASSWORD_SCHEMES:
+        # Hashes with less rounds are upgraded on login
+        opts['bcrypt__default_rounds'] = settings.PASSWORD_BCRYPT_ROUNDS
+        opts['bcrypt__min_rounds'] = settings.PASSWORD_BCRYPT_ROUNDS
+    return CryptContext(**opts)
 
 
 def verify_password(plain_password, password_hash):
     '''Verify if password matches hashed password'''
-    ctx = CryptContext(**PASSLIB_OPTS)
-    return ctx.verify(plain_password, password_hash)
+    return get_crypt_context().verify(plain_password, password_hash)
+
+
+def verify_and_update_password(plain_password, password_hash):
+    '''Verify if password matches hashed password and rehash if outdated
+
+    Returns
+        (bool, str): Password matches and new hash (None if hash is up to date)
+    '''
+    return get_crypt_context().verify_and_update(plain_password, password_hash)
 
 
 def get_password_hash(password):
     '''Generates password hash from password'''
-    ctx = CryptContext(**PASSLIB_OPTS)
-    return ctx.hash(password)
+    return get_crypt_context().hash(password)
+
+
+class PasswordHasherBusyError(Exception):
+    '''Too many password hashing jobs are pending'''
+
+
+class HashMetrics:
+    '''Keeps track of password hashing jobs and their latency'''
+
+    def __init__(self):
+        self.in_flight = 0
+        self.count = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        '''Records the latency of a finished job'''
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def dict(self):
+        '''Returns metrics as dictionary'''
+        return {
+            'in_flight': self.in_flight,
+            'count': self.count,
+            'rejected': self.rejected,
+            'avg_seconds': self.total_seconds / self.count if self.count else 0.0,
+            'max_seconds': self.max_seconds,
+        }
+
+
+HASH_METRICS = HashMetrics()
+
+
+@lru_cache(maxsize=None)
+def get_hash_executor() -> ProcessPoolExecutor:
+    '''Returns process pool which runs password hashing jobs'''
+    workers = get_settings().PASSWORD_HASH_WORKERS
+    logging.info('%s: Starting password hash pool with %s workers', __name__, workers)
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+    )
+
+
+def shutdown_hash_executor():
+    '''Stops process pool for password hashing if started'''
+    if get_hash_executor.cache_info().currsize:
+        get_hash_executor().shutdown()
+        get_hash_executor.cache_clear()
+
+
+async def run_hash_job(func, *args):
+    '''Runs a CPU bound hashing function in the password hash pool
+
+    Raises
+        PasswordHasherBusyError: Maximum amount of pending jobs is reached
+    '''
+    # Refuse job if queue is full
+    settings = get_settings()
+    max_pending = settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE
+    if HASH_METRICS.in_flight >= max_pending:
+        HASH_METRICS.rejected += 1
+        raise PasswordHasherBusyError(f'{HASH_METRICS.in_flight} hashing jobs pending')
+
+    # Run job in process pool
+    HASH_METRICS.in_flight += 1
+    start = time.perf_counter()
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(get_hash_executor(), func, *args)
+    finally:
+        HASH_METRICS.in_flight -= 1
+        HASH_METRICS.record(time.perf_counter() - start)
+
+
+async def verify_password_async(plain_password, password_hash):
+    '''Verify if password matches hashed password without blocking the event loop'''
+    return await run_hash_job(verify_password, plain_password, password_hash)
+
+
+async def verify_and_update_password_async(plain_password, password_hash):
+    '''Verify password and rehash if outdated without blocking the event loop'''
+    return await run_hash_job(verify_and_update_password, plain_password, password_hash)
+
+
+async def get_password_hash_async(password):
+    '''Generates password hash from password without blocking the event loop'''
+    return await run_hash_job(get_password_hash, password)
+
+
+class VerifiedTokenCache:
+    '''Bounded LRU of verified access tokens, kept until they expire'''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.tokens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> AccessTokenData:
+        '''Returns copy of cached token data or None if unknown or expired'''
+        key = self._digest(token)
+        entry = self.tokens.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        (data, expires_at) = entry
+        if expires_at <= time.time():
+            del self.tokens[key]
+            self.misses += 1
+            return None
+
+        self.tokens.move_to_end(key)
+        self.hits += 1
+        return data.copy()
+
+    def add(self, token: str, data: AccessTokenData, expires_at: float):
+        '''Stores verified token data until expires_at (UNIX timestamp)'''
+        if self.maxsize <= 0:
+            return
+        key = self._digest(token)
+        self.tokens[key] = (data.copy(), expires_at)
+        self.tokens.move_to_end(key)
+        while len(self.tokens) > self.maxsize:
+            self.tokens.popitem(last=False)
+
+    def clear(self):
+        '''Removes all cached tokens and resets counters'''
+        self.tokens.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def dict(self):
+        '''Returns metrics as dictionary'''
+        return {
+            'size': len(self.tokens),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_token_cache() -> VerifiedTokenCache:
+    '''Returns cache of verified access tokens'''
+    return VerifiedTokenCache(get_settings().JWT_VERIFY_CACHE_SIZE)
+
+
+async def reload_jwt_keys_periodically(interval: float):
+    '''Reloads JWT keys in the background until cancelled
+
+    Cached tokens are dropped if keys are changed, so tokens of removed keys
+    are rejected immediately.
+    '''
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await loop.run_in_executor(None, get_keyring().reload):
+                get_token_cache().clear()
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s: Unable to reload JWT keys', __name__)
 
 
 async def create_access_token(*, user_id: str, expires_delta: timedelta = None):
@@ -44,8 +240,8 @@ async def create_access_token(*, user_id: str, expires_delta: timedelta = None):
     }
 
     # Generate token
-    jwt_key_private = get_jwt_key('private')
-    return jwt.encode(data, jwt_key_private, algorithm=settings.JWT_ALG)
+    (kid, jwt_key_private) = get_keyring().get_signing_key()
+    return jwt.encode(data, jwt_key_private, algorithm=settings.JWT_ALG, headers={'kid': kid})
 
 
 class InvalidTokenError(Exception):
@@ -58,12 +254,18 @@ async def validate_access_token(token: str) -> AccessTokenData:
     Raises
         InvalidTokenError: Provided token is invalid
     '''
+    # Skip verification of recently verified tokens
+    token_cache = get_token_cache()
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
     # Get settings
     settings = get_settings()
 
     # Decode JWT token
     try:
-        jwt_key_public = get_jwt_key('public')
+        jwt_key_public = get_keyring().get_verify_key(token)
         payload = jwt.decode(token, jwt_key_public,
                              algorithms=[settings.JWT_ALG])
     except jwt.PyJWTError:
@@ -79,8 +281,14 @@ async def validate_access_token(token: str) -> AccessTokenData:
 
     # Build access token data
     try:
-        return AccessTokenData(user_id=user_id)
+        data = AccessTokenData(user_id=user_id)
     except ValidationError:
         raise InvalidTokenError(
             f'JWT token contains invalid user ID: "{user_id!r}"'
         )
+
+    # Cache verified token until it expires
+    if 'exp' in payload:
+        data.expires_on = datetime.fromtimestamp(payload['exp'], timezone.utc)
+        token_cache.add(token, data, payload['exp'])
+    return data
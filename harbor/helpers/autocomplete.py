@@ -0,0 +1,166 @@
+'''Helpers module for in-memory autocompletion of usernames
+
+Verified users are kept in parallel arrays, sorted by username. A prefix
+query is a binary search followed by a short scan, without database
+round trip. Usernames are interned and shared with the display name if
+equal, to keep memory use compact.
+'''
+
+import asyncio
+import logging
+import sys
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List
+
+from harbor.domain.user import BaseUser
+from harbor.helpers.settings import get_settings
+from harbor.repository.base import ChangeFeedUnsupportedError, UserRepo
+
+# Changes are watched from before a load, covering clock skew with the database
+WATCH_OVERLAP = timedelta(seconds=10)
+RETRY_SECONDS = 1
+RETRY_MAX_SECONDS = 60
+
+
+class AutocompleteIndex:
+    '''Sorted in-memory index of verified users'''
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.by_id: Dict[str, str] = {}
+        self.ready = False
+
+    @staticmethod
+    def _entry(user: BaseUser):
+        '''Returns interned username, ID and display name of a user'''
+        key = sys.intern(user.username)
+        name = key if key == user.display_name else user.display_name
+        return (key, str(user.id), name)
+
+    def build(self, users: Iterable[BaseUser]):
+        '''Replaces all entries at once'''
+        entries = sorted(self._entry(user) for user in users)
+        self.keys = [entry[0] for entry in entries]
+        self.ids = [entry[1] for entry in entries]
+        self.names = [entry[2] for entry in entries]
+        self.by_id = dict(zip(self.ids, self.keys))
+        self.ready = True
+
+    def upsert(self, user: BaseUser):
+        '''Adds or replaces a user'''
+        self.remove(str(user.id))
+        (key, user_id, name) = self._entry(user)
+        pos = bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.ids.insert(pos, user_id)
+        self.names.insert(pos, name)
+        self.by_id[user_id] = key
+
+    def remove(self, user_id: str):
+        '''Removes a user if present'''
+        key = self.by_id.pop(user_id, None)
+        if key is None:
+            return
+        pos = bisect_left(self.keys, key)
+        while self.ids[pos] != user_id:
+            pos += 1
+        del self.keys[pos]
+        del self.ids[pos]
+        del self.names[pos]
+
+    def search(self, query: str, limit: int = 10, exclude_id: str = None,
+               ranks: Dict[str, int] = None) -> List[BaseUser]:
+        '''Returns users of which the username starts with query, exact match first
+
+        Users in ranks are returned before others, lowest rank first, e.g.
+        friends before friends of friends.
+        '''
+        prefix = query.lower()
+        ranked = []
+        for (user_id, rank) in (ranks or {}).items():
+            key = self.by_id.get(user_id)
+            if key is not None and key.startswith(prefix) and user_id != exclude_id:
+                ranked.append((rank, key != prefix, key, user_id))
+        ranked = sorted(ranked)[:limit]
+        results = [self._user(key, user_id) for (_, _, key, user_id) in ranked]
+        skip_ids = {user_id for (_, _, _, user_id) in ranked} | {exclude_id}
+
+        pos = bisect_left(self.keys, prefix)
+        while pos < len(self.keys) and len(results) < limit:
+            if not self.keys[pos].startswith(prefix):
+                break
+            if self.ids[pos] not in skip_ids:
+                results.append(BaseUser(id=self.ids[pos], display_name=self.names[pos]))
+            pos += 1
+        return results
+
+    def _user(self, key: str, user_id: str) -> BaseUser:
+        '''Returns the user with username key and ID'''
+        pos = bisect_left(self.keys, key)
+        while self.ids[pos] != user_id:
+            pos += 1
+        return BaseUser(id=user_id, display_name=self.names[pos])
+
+    def __len__(self):
+        return len(self.keys)
+
+
+@lru_cache(maxsize=None)
+def get_user_index() -> AutocompleteIndex:
+    '''Returns process wide autocomplete index of users'''
+    return AutocompleteIndex()
+
+
+async def load_user_index(index: AutocompleteIndex, user_repo: UserRepo):
+    '''Builds the index from all verified users'''
+    users = [user async for user in user_repo.iter_verified()]
+    index.build(users)
+    logging.info('%s: Loaded %s users in autocomplete index', __name__, len(index))
+
+
+async def keep_user_index_fresh(index: AutocompleteIndex, user_repo: UserRepo):
+    '''Loads the index and applies changes until cancelled
+
+    Changes are watched with the change feed of the database, starting
+    shortly before the load so changes made during the load aren't lost.
+    If watching fails, the index is marked not ready, then reloaded and
+    watched again with backoff. If the database doesn't support the change
+    feed, the index is rebuilt periodically instead.
+    '''
+    delay = RETRY_SECONDS
+    while True:
+        try:
+            since = datetime.now(timezone.utc) - WATCH_OVERLAP
+            await load_user_index(index, user_repo)
+            delay = RETRY_SECONDS
+            async for (user_id, user) in user_repo.watch_verified(since):
+                if user:
+                    index.upsert(user)
+                else:
+                    index.remove(user_id)
+            logging.warning('%s: Change feed closed, reloading index', __name__)
+        except ChangeFeedUnsupportedError as error:
+            await rebuild_user_index_forever(index, user_repo, error)
+        except Exception:  # pylint: disable=broad-except
+            index.ready = False
+            logging.exception('%s: Failed to keep index fresh, retry in %ss', __name__, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_SECONDS)
+
+
+async def rebuild_user_index_forever(index: AutocompleteIndex, user_repo: UserRepo,
+                                     error: ChangeFeedUnsupportedError):
+    '''Rebuilds the index periodically until cancelled'''
+    interval = get_settings().USER_AUTOCOMPLETE_REFRESH_SECONDS
+    logging.warning('%s: Change feed unsupported, rebuilding index every %ss: %s',
+                    __name__, interval, error)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_user_index(index, user_repo)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s: Failed to rebuild index, retry in %ss', __name__, interval)
@@ -0,0 +1,61 @@
+'''Helpers module for in-process caching'''
+
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    '''Bounded LRU cache of which entries expire after a fixed time'''
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''Returns cached value or None if unknown or expired'''
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        (value, expires_at) = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        '''Stores a value until TTL is passed'''
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self.entries[key] = (value, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def delete(self, key):
+        '''Removes a value from the cache'''
+        self.entries.pop(key, None)
+
+    def clear(self):
+        '''Removes all values and resets counters'''
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def dict(self):
+        '''Returns metrics as dictionary'''
+        return {
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -1,132 +1,127 @@
-'''This module contains all email templates'''
-
-from harbor.domain.email import EmailMsg
-from harbor.helpers.settings import get_settings
+'''This module renders all emails from templates
 
+Templates are loaded once from EMAIL_TEMPLATE_PATH, which defaults to
+harbor/templates/email. A template consists of 3 files per language:
+"<name>.<language>.subject", "<name>.<language>.txt" and
+"<name>.<language>.html". Placeholders use str.format syntax.
 
-TEMPLATE_REGISTER_TEXT = """\
-Welcome to Kinky Harbor!
-Please verify your mail address by clicking {registration_link}
+On load, placeholders of static values like "{frontend_url}" are replaced,
+so rendering a mail only formats the placeholders of the recipient.
+Values are HTML escaped in the HTML part.
+'''
 
-- Kinky Harbor crew -
-"""
-
-TEMPLATE_REGISTER_HTML = """\
-<html>
-  <head></head>
-  <body>
-    <p>Welcome to Kinky Harbor!</p>
-    <p>Please verify your mail address by clicking
-        <a href="{registration_link}">{registration_link}</a>.
-    </p>
-    <p>- Kinky Harbor crew -</p>
-  </body>
-</html>
-"""
+import html
+import string
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Tuple
 
+from harbor.domain.email import EmailMsg
+from harbor.helpers.settings import get_settings
 
-def prepare_register_verification(to_name: str, to_email: str, secret: str) -> EmailMsg:
-    '''Prepare mail with registration verification link'''
-    # Get settings
+BUILTIN_TEMPLATE_PATH = Path(__file__).parent.parent / 'templates' / 'email'
+
+
+def precompile(template: str, static: Dict[str, str]) -> str:
+    '''Returns format string with static placeholders replaced by their value'''
+    formatter = string.Formatter()
+    parts = []
+    for (literal, field, spec, conversion) in formatter.parse(template):
+        parts.append(literal.replace('{', '{{').replace('}', '}}'))
+        if field is None:
+            continue
+        if field in static:
+            value = formatter.convert_field(static[field], conversion)
+            value = format(value, spec or '')
+            parts.append(value.replace('{', '{{').replace('}', '}}'))
+        else:
+            conversion = f'!{conversion}' if conversion else ''
+            spec = f':{spec}' if spec else ''
+            parts.append(f'{{{field}{conversion}{spec}}}')
+    return ''.join(parts)
+
+
+class CompiledTemplate(NamedTuple):
+    '''Format strings of a template in a single language'''
+    subject: str
+    text: str
+    html: str
+
+    def render(self, values: Dict[str, str]) -> Tuple[str, str, str]:
+        '''Returns subject, text and HTML body'''
+        html_values = {key: html.escape(str(value)) for (key, value) in values.items()}
+        return (
+            self.subject.format_map(values),
+            self.text.format_map(values),
+            self.html.format_map(html_values),
+        )
+
+
+class TemplateEngine:
+    '''Loads and renders templates with language variants'''
+
+    def __init__(self, path: Path, static: Dict[str, str], default_language: str = 'en'):
+        self.default_language = default_language
+        self.templates: Dict[Tuple[str, str], CompiledTemplate] = {}
+        html_static = {key: html.escape(value) for (key, value) in static.items()}
+
+        # Load all templates with a subject file
+        for subject_path in Path(path).glob('*.*.subject'):
+            (name, language, _) = subject_path.name.rsplit('.', 2)
+            base = subject_path.parent / f'{name}.{language}'
+            self.templates[(name, language)] = CompiledTemplate(
+                subject=precompile(subject_path.read_text(encoding='utf-8').strip(), static),
+                text=precompile(Path(f'{base}.txt').read_text(encoding='utf-8'), static),
+                html=precompile(Path(f'{base}.html').read_text(encoding='utf-8'), html_static),
+            )
+
+    def get(self, name: str, language: str = None) -> CompiledTemplate:
+        '''Returns template in language, falls back to the default language'''
+        template = self.templates.get((name, language or self.default_language))
+        if template is None:
+            template = self.templates[(name, self.default_language)]
+        return template
+
+    def render(self, name: str, to_name: str, to_email: str,
+               values: Dict[str, str] = None, language: str = None) -> EmailMsg:
+        '''Returns a mail rendered from a template'''
+        (subject, text, body) = self.get(name, language).render(values or {})
+        return EmailMsg(
+            to_name=to_name,
+            to_email=to_email,
+            subject=subject,
+            text=text,
+            html=body,
+        )
+
+
+@lru_cache(maxsize=None)
+def get_template_engine() -> TemplateEngine:
+    '''Returns process wide template engine'''
     settings = get_settings()
-
-    # Build message
-    registration_link = f'{settings.FRONTEND_URL}/register/verify?token={secret}'
-    msg = TEMPLATE_REGISTER_TEXT.format(
-        registration_link=registration_link)
-    msg_html = TEMPLATE_REGISTER_HTML.format(
-        registration_link=registration_link)
-
-    return EmailMsg(
-        to_name=to_name,
-        to_email=to_email,
-        subject='Verify your Kinky Harbor account',
-        text=msg,
-        html=msg_html,
+    return TemplateEngine(
+        path=settings.EMAIL_TEMPLATE_PATH or BUILTIN_TEMPLATE_PATH,
+        static={'frontend_url': str(settings.FRONTEND_URL)},
+        default_language=settings.EMAIL_LANGUAGE,
     )
 
 
-TEMPLATE_REGISTER_EMAIL_EXISTS_TEXT = """\
-There was an attempt to create a new account on Kinky Harbor with this mail adress.
-In case you forgot your password, please request a reset at {reset_password_link}.
-If you didn't try to register, safely ignore this message.
-
-- Kinky Harbor crew -
-"""
-
-TEMPLATE_REGISTER_EMAIL_EXISTS_HTML = """\
-<html>
-  <head></head>
-  <body>
-    <p>There was an attempt to create a new account on Kinky Harbor with this mail adress.</p>
-    <p>In case you forgot your password, please request a reset at
-        <a href="{reset_password_link}">{reset_password_link}</a>.
-    </p>
-    <p>If you didn't try to register, safely ignore this message.</p>
-    <p>- Kinky Harbor crew -</p>
-  </body>
-</html>
-"""
+def prepare_register_verification(to_name: str, to_email: str, secret: str,
+                                  language: str = None) -> EmailMsg:
+    '''Prepare mail with registration verification link'''
+    return get_template_engine().render(
+        'register_verification', to_name, to_email, {'secret': secret}, language)
 
 
-def prepare_register_email_exist(to_name: str, to_email: str) -> EmailMsg:
+def prepare_register_email_exist(to_name: str, to_email: str,
+                                 language: str = None) -> EmailMsg:
     '''Prepare mail with link to request a password reset'''
-    # Get settings
-    settings = get_settings()
-
-    # Build message
-    reset_password_link = f'{settings.FRONTEND_URL}/login/request-reset/'
-    msg = TEMPLATE_REGISTER_EMAIL_EXISTS_TEXT.format(
-        reset_password_link=reset_password_link)
-    msg_html = TEMPLATE_REGISTER_EMAIL_EXISTS_HTML.format(
-        reset_password_link=reset_password_link)
-
-    return EmailMsg(
-        to_name=to_name,
-        to_email=to_email,
-        subject='Registration attempt at Kinky Harbor',
-        text=msg,
-        html=msg_html,
-    )
-
-
-TEMPLATE_RESET_PASSWORD_TEXT = """\
-A password reset has been requested for this mail address.
-Please use following link to set a new password: {reset_password_link}.
-If you didn't try to reset your password, safely ignore this message.
+    return get_template_engine().render(
+        'register_email_exists', to_name, to_email, language=language)
 
-- Kinky Harbor crew -
-"""
 
-TEMPLATE_RESET_PASSWORD_HTML = """\
-<html>
-  <head></head>
-  <body>
-    <p>A password reset has been requested for this mail address.</p>
-    <p>Please use following link to set a new password:
-        <a href="{reset_password_link}">{reset_password_link}</a>.
-    </p>
-    <p>If you didn't try to reset your password, safely ignore this message.</p>
-    <p>- Kinky Harbor crew -</p>
-  </body>
-</html>
-"""
-
-
-def prepare_reset_password(to_name: str, to_email: str, user_id: str, token: str) -> EmailMsg:
+def prepare_reset_password(to_name: str, to_email: str, user_id: str, token: str,
+                           language: str = None) -> EmailMsg:
     '''Prepare mail with link to reset your password'''
-    # Get settings
-    settings = get_settings()
-
-    # Build message
-    link = f'{settings.FRONTEND_URL}/login/reset-password?user={user_id}&token={token}'
-    msg = TEMPLATE_RESET_PASSWORD_TEXT.format(reset_password_link=link)
-    msg_html = TEMPLATE_RESET_PASSWORD_HTML.format(reset_password_link=link)
-
-    return EmailMsg(
-        to_name=to_name,
-        to_email=to_email,
-        subject='Password reset for Kinky Harbor',
-        text=msg,
-        html=msg_html,
-    )
+    return get_template_engine().render(
+        'reset_password', to_name, to_email, {'user_id': user_id, 'token': token}, language)
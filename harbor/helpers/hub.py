@@ -0,0 +1,254 @@
+'''Helpers module to push notifications to connected clients
+
+The hub keeps a queue per open stream, indexed by user ID. Published
+notifications pass through a broker, which delivers them to the hub of
+every API worker. By default this is a fanout exchange on the RabbitMQ of
+Celery, so notifications created by Celery tasks reach open streams too.
+The in-memory broker only reaches the current process.
+'''
+
+import asyncio
+import logging
+import socket
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Set, Tuple
+
+from kombu import Connection, Exchange, Queue
+from kombu.pools import producers
+
+from harbor.domain.notification import Notification
+from harbor.helpers.settings import get_settings
+from harbor.worker import settings as worker_settings
+
+DeliverFunc = Callable[[str, str], Awaitable[None]]
+
+
+class Broker(ABC):
+    '''Transports published notifications to the hub of every API worker'''
+
+    @abstractmethod
+    async def start(self, deliver: DeliverFunc):
+        '''Starts delivering received messages with deliver(user_id, payload)'''
+
+    @abstractmethod
+    async def publish(self, user_id: str, payload: str):
+        '''Publishes a message for a user'''
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        '''Publishes (user ID, payload) messages'''
+        for (user_id, payload) in messages:
+            await self.publish(user_id, payload)
+
+    @abstractmethod
+    async def close(self):
+        '''Stops delivering messages'''
+
+
+class InMemoryBroker(Broker):
+    '''Broker which only delivers within the current process'''
+
+    def __init__(self):
+        self.deliver = None
+
+    async def start(self, deliver: DeliverFunc):
+        self.deliver = deliver
+
+    async def publish(self, user_id: str, payload: str):
+        if self.deliver:
+            await self.deliver(user_id, payload)
+
+    async def close(self):
+        self.deliver = None
+
+
+class AMQPBroker(Broker):
+    '''Broker which fans out messages to all API workers over an exchange
+
+    Messages are published to a fanout exchange. Each started broker consumes
+    from its own exclusive queue in a background thread and reconnects with
+    backoff. Messages published while a broker is disconnected don't reach it.
+    Processes which only publish, like Celery workers, don't need to start it.
+    '''
+
+    def __init__(self, url: str, exchange: str = 'harbor.notifications'):
+        self.connection = Connection(url)
+        self.exchange = Exchange(exchange, type='fanout', durable=False)
+        self.deliver: DeliverFunc = None
+        self.loop: asyncio.AbstractEventLoop = None
+        self.stopping = threading.Event()
+        self.thread: threading.Thread = None
+
+    async def start(self, deliver: DeliverFunc):
+        self.deliver = deliver
+        self.loop = asyncio.get_running_loop()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.consume_forever,
+                                       name='notification-broker', daemon=True)
+        self.thread.start()
+
+    async def publish(self, user_id: str, payload: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.publish_sync, user_id, payload)
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.publish_many_sync, messages)
+
+    def publish_sync(self, user_id: str, payload: str):
+        '''Publishes a message, blocks until it is sent'''
+        self.publish_many_sync([(user_id, payload)])
+
+    def publish_many_sync(self, messages: List[Tuple[str, str]]):
+        '''Publishes messages over one producer, blocks until they are sent'''
+        with producers[self.connection].acquire(block=True, timeout=5) as producer:
+            for (user_id, payload) in messages:
+                producer.publish(
+                    {'user_id': user_id, 'payload': payload},
+                    exchange=self.exchange,
+                    declare=[self.exchange],
+                    serializer='json',
+                    retry=True,
+                    retry_policy={'max_retries': 3},
+                )
+
+    async def close(self):
+        self.stopping.set()
+        if self.thread:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.thread.join, 5)
+            self.thread = None
+        self.deliver = None
+
+    def consume_forever(self):
+        '''Delivers received messages on the event loop until stopped'''
+        delay = 0.5
+        queue = Queue(f'{self.exchange.name}.{uuid.uuid4().hex}', exchange=self.exchange,
+                      durable=False, exclusive=True, auto_delete=True)
+        while not self.stopping.is_set():
+            try:
+                with self.connection.clone() as conn, \
+                        conn.Consumer(queue, callbacks=[self.on_message],
+                                      accept=['json'], no_ack=True):
+                    logging.info('%s: Receiving notifications from %s',
+                                 __name__, conn.as_uri())
+                    delay = 0.5
+                    while not self.stopping.is_set():
+                        try:
+                            conn.drain_events(timeout=1)
+                        except socket.timeout:
+                            pass
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('%s: Notification broker disconnected, reconnect in %ss',
+                                  __name__, delay)
+                self.stopping.wait(delay)
+                delay = min(delay * 2, 30)
+
+    def on_message(self, body: Dict, _):
+        '''Passes a received message to the event loop of the hub'''
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self.deliver(body['user_id'], body['payload']), self.loop)
+        except (KeyError, TypeError, RuntimeError):
+            logging.exception('%s: Unable to deliver notification', __name__)
+
+
+class NotificationHub:
+    '''Fans out published notifications to open streams of a user'''
+
+    def __init__(self, broker: Broker = None, queue_size: int = 100):
+        self.broker = broker or InMemoryBroker()
+        self.queue_size = queue_size
+        self.streams: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self.dropped = 0
+        self.publishing: Set[asyncio.Future] = set()
+
+    async def start(self):
+        '''Starts receiving messages from the broker'''
+        await self.broker.start(self.deliver)
+
+    async def close(self):
+        '''Stops receiving messages from the broker'''
+        await self.broker.close()
+
+    async def publish(self, notification: Notification):
+        '''Publishes a notification to all streams of its user'''
+        await self.broker.publish(notification.user_id, notification.json())
+
+    async def publish_many(self, notifications: List[Notification]):
+        '''Publishes notifications with a single call to the broker'''
+        await self.broker.publish_many(
+            [(notification.user_id, notification.json()) for notification in notifications])
+
+    def publish_in_background(self, notifications: List[Notification]):
+        '''Publishes notifications without waiting for the broker
+
+        Failures are logged and ignored.
+        '''
+        future = asyncio.ensure_future(self._publish_logged(notifications))
+        self.publishing.add(future)
+        future.add_done_callback(self.publishing.discard)
+
+    async def _publish_logged(self, notifications: List[Notification]):
+        '''Publishes notifications, failures are logged and ignored'''
+        try:
+            await self.publish_many(notifications)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s: Failed to publish %s notifications',
+                              __name__, len(notifications))
+
+    async def wait_published(self, timeout: float = 5):
+        '''Waits until notifications published in the background are sent'''
+        if self.publishing:
+            await asyncio.wait(set(self.publishing), timeout=timeout)
+
+    async def deliver(self, user_id: str, payload: str):
+        '''Puts a message on all local streams of a user'''
+        for queue in self.streams.get(user_id, ()):
+            if queue.full():
+                # Client is too slow, drop oldest message
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(payload)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: str) -> AsyncIterator[asyncio.Queue]:
+        '''Opens a stream for a user, closed on exit'''
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.streams[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self.streams[user_id].discard(queue)
+            if not self.streams[user_id]:
+                del self.streams[user_id]
+
+    def dict(self):
+        '''Returns metrics as dictionary'''
+        return {
+            'users': len(self.streams),
+            'streams': sum(len(queues) for queues in self.streams.values()),
+            'dropped': self.dropped,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_hub() -> NotificationHub:
+    '''Returns process wide notification hub'''
+    settings = get_settings()
+    url = settings.NOTIFICATION_BROKER_URL
+    if url == 'local':
+        broker = InMemoryBroker()
+    else:
+        broker = AMQPBroker(url or f'amqp://guest@{worker_settings.CELERY_RABBITMQ_HOST}//')
+    return NotificationHub(broker, queue_size=settings.NOTIFICATION_STREAM_QUEUE_SIZE)
+
+
+def publish_notifications(notifications: List[Notification]):
+    '''Publishes notifications in the background, failures are logged and ignored'''
+    if notifications:
+        get_hub().publish_in_background(notifications)
@@ -0,0 +1,210 @@
+'''Helpers module for JWT signing keys'''
+
+import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Tuple
+
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+from harbor.helpers.settings import HMAC_ALGORITHMS, get_settings
+
+# Key ID of keys without prefix (e.g. "private.pem")
+DEFAULT_KID = 'default'
+
+
+class UnknownKeyError(jwt.InvalidTokenError):
+    '''Token is signed with an unknown key'''
+
+
+def split_key_filename(filename: str) -> Tuple[str, str]:
+    '''Splits filename of a key into key ID and key type
+
+    Examples
+        "private.pem" => ("default", "private")
+        "2020-06.public.pem" => ("2020-06", "public")
+        "2020-06.secret.key" => ("2020-06", "secret")
+    '''
+    parts = filename.split('.')
+    if len(parts) < 2:
+        return ('', '')
+    if len(parts) == 2:
+        return (DEFAULT_KID, parts[0])
+    return ('.'.join(parts[:-2]), parts[-2])
+
+
+class JWTKeyring:
+    '''Parsed JWT keys indexed by key ID (kid)
+
+    Key files in the key directory are named "<kid>.private.pem" and
+    "<kid>.public.pem" (or "<kid>.secret.key" for HMAC algorithms).
+    Tokens are signed with the most recently modified private key which has
+    a public key. Public keys without private key are only used to verify
+    tokens.
+
+    Keys of a rotation reach API workers at different times. The public key
+    of a token signed with an unknown key ID is looked up, at most once per
+    UNKNOWN_KID_RELOAD_SECONDS, so it's accepted without waiting for the
+    next periodic reload.
+    '''
+
+    UNKNOWN_KID_RELOAD_SECONDS = 1
+
+    def __init__(self, jwt_alg: str, path: Path, secret: str = ''):
+        self.jwt_alg = jwt_alg
+        self.path = Path(path)
+        self.verify_keys = {}
+        self.signing_key = (None, None)
+        self._files = None
+        self._parsed = {}
+        self._unknown_kid_loaded_at = float('-inf')
+
+        if jwt_alg in HMAC_ALGORITHMS and secret:
+            # Shared secret provided by settings, nothing to reload
+            key = self.algorithm.prepare_key(secret)
+            self.verify_keys = {DEFAULT_KID: key}
+            self.signing_key = (DEFAULT_KID, key)
+            self.path = None
+        else:
+            self.reload()
+
+    @property
+    def algorithm(self):
+        '''Returns the PyJWT algorithm of the keys'''
+        return get_default_algorithms()[self.jwt_alg]
+
+    def _scan(self) -> Dict[str, float]:
+        '''Returns key files with their modification time'''
+        if self.jwt_alg in HMAC_ALGORITHMS:
+            key_types = ('secret',)
+        else:
+            key_types = ('private', 'public')
+
+        files = {}
+        for entry in os.scandir(self.path):
+            if entry.is_file() and split_key_filename(entry.name)[1] in key_types:
+                files[entry.name] = entry.stat().st_mtime
+        return files
+
+    def _parse(self, filename: str, mtime: float):
+        '''Returns parsed key, reusing keys of unchanged files'''
+        cached = self._parsed.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(self.path / filename, mode='r', encoding='utf-8') as key_file:
+            key_material = key_file.read()
+        if self.jwt_alg in HMAC_ALGORITHMS:
+            key_material = key_material.strip()
+        return self.algorithm.prepare_key(key_material)
+
+    def reload(self) -> bool:
+        '''Reloads keys if key files are changed
+
+        Returns
+            bool: Keys are changed
+
+        Raises
+            FileNotFoundError: No key found to sign tokens
+        '''
+        if self.path is None:
+            return False
+
+        # Skip parsing if no files are changed
+        files = self._scan()
+        if files == self._files:
+            return False
+
+        # Parse keys
+        parsed = {}
+        verify_keys = {}
+        signing_candidates = []
+        for (filename, mtime) in files.items():
+            (kid, key_type) = split_key_filename(filename)
+            key = self._parse(filename, mtime)
+            parsed[filename] = (mtime, key)
+            if key_type in ('public', 'secret'):
+                verify_keys[kid] = key
+            if key_type in ('private', 'secret'):
+                signing_candidates.append((mtime, kid, key))
+
+        # Tokens signed with a key without public key would fail verification
+        for (_, kid, _) in signing_candidates:
+            if kid not in verify_keys:
+                logging.warning('%s: JWT key "%s" has no public key, not used for signing',
+                                __name__, kid)
+        signing_candidates = [cand for cand in signing_candidates if cand[1] in verify_keys]
+        if not signing_candidates:
+            raise FileNotFoundError(f'No JWT signing key found in "{self.path}"')
+
+        # Swap keys at once
+        (_, kid, key) = max(signing_candidates, key=lambda cand: cand[:2])
+        self.verify_keys = verify_keys
+        self.signing_key = (kid, key)
+        self._files = files
+        self._parsed = parsed
+        logging.info('%s: Loaded JWT keys %s, signing with "%s"',
+                     __name__, sorted(verify_keys), kid)
+        return True
+
+    def get_signing_key(self):
+        '''Returns key ID and key to sign new tokens'''
+        return self.signing_key
+
+    def get_verify_key(self, token: str):
+        '''Returns key to verify the token based on its "kid" header
+
+        Tokens without "kid" header are verified with the default key. The key
+        of an unknown key ID is looked up in the key directory, e.g. during a
+        rotation.
+
+        Raises
+            UnknownKeyError: Key ID is unknown
+            jwt.PyJWTError: Token header can't be decoded
+        '''
+        kid = jwt.get_unverified_header(token).get('kid', DEFAULT_KID)
+        try:
+            return self.verify_keys[kid]
+        except (KeyError, TypeError) as error:
+            if not self._load_unknown_kid(kid):
+                raise UnknownKeyError(f'Unknown key ID "{kid}"') from error
+        return self.verify_keys[kid]
+
+    def _load_unknown_kid(self, kid: str) -> bool:
+        '''Loads the verify key of an unknown key ID, at most once per
+        UNKNOWN_KID_RELOAD_SECONDS
+
+        Keys are only added. Removed keys and the signing key are updated
+        by "reload", which also drops cached tokens of removed keys.
+
+        Returns
+            bool: Key is loaded
+        '''
+        now = time.monotonic()
+        if self.path is None or not isinstance(kid, str):
+            return False
+        if now - self._unknown_kid_loaded_at < self.UNKNOWN_KID_RELOAD_SECONDS:
+            return False
+        self._unknown_kid_loaded_at = now
+
+        key_type = 'secret' if self.jwt_alg in HMAC_ALGORITHMS else 'public'
+        for (filename, mtime) in self._scan().items():
+            if split_key_filename(filename) == (kid, key_type):
+                self.verify_keys = {**self.verify_keys, kid: self._parse(filename, mtime)}
+                logging.info('%s: Loaded JWT key "%s" of a token', __name__, kid)
+                return True
+        return False
+
+
+@lru_cache(maxsize=None)
+def get_keyring() -> JWTKeyring:
+    '''Returns keyring for the configured JWT algorithm'''
+    settings = get_settings()
+    return JWTKeyring(
+        settings.JWT_ALG,
+        settings.JWT_KEY_PATH,
+        settings.JWT_SECRET.get_secret_value(),
+    )
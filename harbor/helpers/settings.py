@@ -3,14 +3,18 @@
 import logging
 import sys
 from functools import lru_cache
-from typing import Set
+from typing import List, Set
 
-from pydantic import BaseSettings, AnyHttpUrl, NameEmail, SecretStr, DirectoryPath
+from jwt.algorithms import get_default_algorithms
+from pydantic import BaseSettings, AnyHttpUrl, NameEmail, SecretStr, DirectoryPath, validator
 
 from harbor.domain.email import EmailSecurity
 from harbor.helpers import debug
 
 
+HMAC_ALGORITHMS = ('HS256', 'HS384', 'HS512')
+
+
 class Settings(BaseSettings):
     '''Handles ENV and file based settings'''
     # General
@@ -25,15 +29,100 @@ class Settings(BaseSettings):
     EMAIL_SECURITY: EmailSecurity = EmailSecurity.UNSECURE
     EMAIL_USERNAME: str = ''
     EMAIL_PASSWORD: SecretStr = ''
+    # Directory with mail templates, defaults to harbor/templates/email
+    EMAIL_TEMPLATE_PATH: DirectoryPath = None
+    # Language of mails, if a template isn't available in the language of the user
+    EMAIL_LANGUAGE: str = 'en'
+    # Idle SMTP connections kept open per worker process
+    EMAIL_POOL_SIZE: int = 2
+    # Idle connections are checked with NOOP before reuse after this time
+    EMAIL_KEEPALIVE_SECONDS: float = 30
+    EMAIL_MAX_MESSAGES_PER_CONNECTION: int = 100
+    # Mails are queued as batch after the delay or when the batch is full
+    EMAIL_BATCH_SIZE: int = 50
+    EMAIL_BATCH_DELAY_SECONDS: float = 1
+    # Temporary failures are retried with exponential backoff
+    EMAIL_BATCH_MAX_RETRIES: int = 3
+    EMAIL_RETRY_DELAY_SECONDS: int = 60
 
     # JWT
     JWT_KEY_PATH: DirectoryPath = 'jwt-keys'
     JWT_ALG: str = "ES512"
+    JWT_SECRET: SecretStr = ''
+    JWT_KEY_RELOAD_SECONDS: int = 60
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    JWT_VERIFY_CACHE_SIZE: int = 4096
+
+    # Password hashing
+    # First scheme is used for new hashes, others are upgraded on login (e.g. argon2, bcrypt)
+    PASSWORD_SCHEMES: List[str] = ['bcrypt']
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+
+    # Users
+    # Process wide cache of users by ID, 0 disables the cache
+    USER_CACHE_TTL_SECONDS: int = 0
+    USER_CACHE_SIZE: int = 10000
+    # Friends of friends are cached per user to rank search results, 0 disables the cache
+    USER_NETWORK_CACHE_TTL_SECONDS: int = 60
+    # In-memory autocompletion of usernames in search
+    USER_AUTOCOMPLETE: bool = False
+    # Rebuild interval if Mongo doesn't support change streams (no replica set)
+    USER_AUTOCOMPLETE_REFRESH_SECONDS: int = 300
+
+    # Stats
+    # Public stats responses are cached per process, 0 disables the cache
+    STATS_CACHE_TTL_SECONDS: int = 300
+
+    # Search
+    # Maximum time per source (users, groups, ...), slower sources return no results
+    SEARCH_SOURCE_TIMEOUT_SECONDS: float = 0.5
+
+    # Notifications
+    # Pending events per stream, oldest events are dropped for slow clients
+    NOTIFICATION_STREAM_QUEUE_SIZE: int = 100
+    NOTIFICATION_STREAM_KEEPALIVE_SECONDS: float = 15
+    # Fans out new notifications to the streams of all API workers. Defaults to the
+    # RabbitMQ of Celery, "local" only reaches streams of the same process.
+    NOTIFICATION_BROKER_URL: str = ''
+    # Notifications per insert_many call on bulk insert
+    NOTIFICATION_INSERT_CHUNK_SIZE: int = 1000
+
+    # Task outbox
+    # Tasks waiting to be published to the broker per API worker
+    TASK_OUTBOX_SIZE: int = 10000
+    TASK_OUTBOX_BATCH_SIZE: int = 100
+    # Store tasks in Mongo until published, recover tasks of which the lease expired
+    TASK_OUTBOX_DURABLE: bool = False
+    TASK_OUTBOX_RECOVER_SECONDS: int = 60
+    # Maximum time to publish pending tasks on shutdown
+    TASK_OUTBOX_DRAIN_SECONDS: float = 5
 
     # Mongo
     MONGO_HOST: str = 'localhost'
     MONGO_DATABASE: str = 'kinkyharbor'
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 0
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_SOCKET_TIMEOUT_MS: int = 0
+    # Comma separated list, e.g. "zstd,snappy,zlib"
+    MONGO_COMPRESSORS: str = ''
+    # Skip migrations (index creation) on startup, run them with harbor.repository.mongo.migrate
+    MONGO_SKIP_MIGRATIONS: bool = False
+
+    @validator('JWT_ALG')
+    @classmethod
+    def supported_jwt_alg(cls, jwt_alg):
+        '''Check if JWT algorithm is supported'''
+        supported = set(get_default_algorithms()) - {'none'}
+        if jwt_alg not in supported:
+            raise ValueError(
+                f'Unsupported JWT algorithm "{jwt_alg}". '
+                f'Supported: {", ".join(sorted(supported))}')
+        return jwt_alg
 
 
 @lru_cache(maxsize=None)
@@ -46,12 +135,3 @@ def get_settings():
         sys.settrace(debug.trace_calls)
 
     return settings
-
-
-@lru_cache(maxsize=None)
-def get_jwt_key(key: str):
-    '''Return ECDSA keys from files for JWT signing.'''
-    filename = f'{key}.pem'
-    path = get_settings().JWT_KEY_PATH
-    with open(path / filename, mode='r') as key_file:
-        return key_file.read()
@@ -2,12 +2,13 @@
 
 from abc import ABC, abstractmethod
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import AsyncIterator, Callable, List, Dict, Optional, Set, Tuple
 
 from starlette.requests import Request
 
 from harbor.domain.common import ObjectIdStr
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
+from harbor.domain.outbox import OutboxTask
 from harbor.domain.stats import Reading
 from harbor.domain.token import RefreshToken, VerificationToken
 from harbor.domain.token import TokenVerifyRequest as VerifTokenReq
@@ -30,24 +31,47 @@ def get_repos(request: Request) -> RepoDict:
 class NotificationRepo(Repo):
     '''Repository for notifications'''
     @abstractmethod
-    async def get_recent(self, user_id: str) -> List[Notification]:
-        '''Returns all recent notifications for a user
+    async def get_recent(self, user_id: str,
+                         limit: int = None,
+                         before: NotificationCursor = None) -> List[Notification]:
+        '''Returns all recent notifications for a user, newest first
 
-        A recent notification is either not read yet or is maximum one week old
+        A recent notification is either not read yet or is maximum one week old.
+        Only notifications older than cursor "before" are returned.
         '''
 
     @abstractmethod
-    async def get_historic(self, user_id: str, from_: datetime, to: datetime) -> List[Notification]:
-        '''Returns notifications for a user for a range in time'''
+    async def get_historic(self, user_id: str, from_: datetime, to: datetime,
+                           limit: int = None,
+                           before: NotificationCursor = None) -> List[Notification]:
+        '''Returns notifications for a user for a range in time, newest first
+
+        Only notifications older than cursor "before" are returned.
+        '''
+
+    @abstractmethod
+    async def iter_historic(self, user_id: str, from_: datetime,
+                            to: datetime) -> AsyncIterator[Notification]:
+        '''Yields notifications for a user for a range in time, newest first'''
+        yield
 
     @abstractmethod
-    async def get_search(self, user_id: str, search_string: str) -> List[Notification]:
-        '''Searches in all notifications of a user'''
+    async def get_search(self, user_id: str, search_string: str,
+                         limit: int = None, offset: int = 0) -> List[Notification]:
+        '''Searches words in all notifications of a user, most relevant first'''
 
     @abstractmethod
     async def add(self, notification: Notification):
         '''Adds a notification for a user'''
 
+    @abstractmethod
+    async def add_many(self, notifications: List[Notification],
+                       chunk_size: int = None) -> List[ObjectIdStr]:
+        '''Adds multiple notifications in chunks
+
+        Returns IDs of inserted notifications
+        '''
+
     @abstractmethod
     async def set_read(self, user_id: str, notif_ids: List[str], value: bool = True) -> int:
         '''Sets "is_read" flag on multiple notifications
@@ -55,6 +79,19 @@ class NotificationRepo(Repo):
         Returns updated notification count
         '''
 
+    @abstractmethod
+    async def get_unread_count(self, user_id: str) -> int:
+        '''Returns the number of unread notifications of a user'''
+
+    @abstractmethod
+    async def reconcile_unread_counts(self) -> int:
+        '''Recounts unread notifications of all users in batches
+
+        Counters changed during reconciliation are left for the next run.
+
+        Returns number of corrected counters
+        '''
+
 
 class RefreshTokenRepo(Repo):
     '''Repository for refresh tokens'''
@@ -86,9 +123,51 @@ class StatsRepo(Repo):
                            to=timedelta()):
         '''Returns aggregated readings for a subject by month'''
 
+    @abstractmethod
+    async def get_aggregation(self,
+                              subject: str,
+                              timespan: int,
+                              operation="avg",
+                              from_=timedelta(days=-365),
+                              to=timedelta()):
+        '''Returns aggregated readings for a subject per week, month or year'''
+
     @abstractmethod
     async def upsert(self, reading: Reading):
-        '''Stores a reading'''
+        '''Stores a reading and calls upsert listeners'''
+
+    @abstractmethod
+    async def upsert_many(self, readings: List[Reading]):
+        '''Stores multiple readings at once and calls upsert listeners'''
+
+    @abstractmethod
+    def add_upsert_listener(self, listener: Callable[[Reading], None]):
+        '''Registers a function called after each upsert, e.g. to invalidate caches'''
+
+
+class TaskOutboxRepo(Repo):
+    '''Repository for Celery tasks waiting to be published'''
+    @abstractmethod
+    async def add(self, task: OutboxTask, claimer_id: str = None) -> ObjectIdStr:
+        '''Stores a task, claimed by claimer_id since its creation, and returns its ID'''
+
+    @abstractmethod
+    async def remove(self, task_ids: List[str]):
+        '''Removes published tasks'''
+
+    @abstractmethod
+    async def claim_stale(self, older_than: timedelta, limit: int,
+                          claimer_id: str = None) -> List[OutboxTask]:
+        '''Returns tasks of which the claim is older than "older_than" and claims them
+
+        Claims are leases. A live claimer refreshes the claims of its tasks,
+        so only tasks of a crashed or stalled process are returned. Returned
+        tasks are only returned again after "older_than" has passed again.
+        '''
+
+    @abstractmethod
+    async def refresh_claims(self, task_ids: List[str], claimer_id: str):
+        '''Renews the claims of tasks which are still claimed by claimer_id'''
 
 
 class UsernameTakenError(Exception):
@@ -99,6 +178,10 @@ class EmailTakenError(Exception):
     '''Email is already taken'''
 
 
+class ChangeFeedUnsupportedError(Exception):
+    '''Database doesn't support watching changes'''
+
+
 class UserRepo(Repo):
     '''Repository for users'''
     @abstractmethod
@@ -114,10 +197,32 @@ class UserRepo(Repo):
         '''Get single user by username'''
 
     @abstractmethod
-    async def get_search(self, user_id: str,
+    async def get_network(self, user: User) -> Tuple[Set[str], Set[str]]:
+        '''Returns IDs of friends and friends of friends of a user'''
+
+    @abstractmethod
+    async def get_search(self, user: User,
                          search_string: str,
                          limit: int = 10) -> List[BaseUser]:
-        '''Search users based on username'''
+        '''Search users based on username, ranked by the network of the requesting user'''
+
+    @abstractmethod
+    async def iter_verified(self) -> AsyncIterator[BaseUser]:
+        '''Yields all verified users with only minimal fields'''
+        yield
+
+    @abstractmethod
+    async def watch_verified(self, since: datetime = None
+                             ) -> AsyncIterator[Tuple[str, Optional[BaseUser]]]:
+        '''Yields changed users as (user ID, user) until cancelled
+
+        User is None if deleted or not verified. Changes are watched from
+        since if provided, e.g. the start of a load, else from now.
+
+        Raises:
+            ChangeFeedUnsupportedError: Database doesn't support watching changes
+        '''
+        yield
 
     @abstractmethod
     async def add(self,
@@ -135,6 +240,16 @@ class UserRepo(Repo):
     async def set_password(self, user_id: str, password_hash: str) -> User:
         '''Sets a new password for the user'''
 
+    @abstractmethod
+    async def upgrade_password_hash(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        '''Replaces password hash with a rehashed version of the same password
+
+        Hash is only replaced if it wasn't changed in the meantime.
+
+        Returns
+            bool: Hash is replaced
+        '''
+
     @abstractmethod
     async def set_flag(self, user_id: str, flag: UserFlags, value: bool) -> User:
         '''Sets a flag on the user to True or False
@@ -1,16 +1,37 @@
 '''This module provides common functions to access the database.'''
 
 import asyncio
+import logging
 from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
 
+from bson import ObjectId
 from motor import motor_asyncio as motor
+from pymongo.errors import PyMongoError
 
 from harbor.helpers.settings import get_settings
 
+# Collection which tracks applied schema versions per collection
+SCHEMA_COLLECTION = 'schema_versions'
+
 
 def create_db_client():
     '''Returns instance of database client'''
-    return motor.AsyncIOMotorClient(get_settings().MONGO_HOST, tz_aware=True)
+    settings = get_settings()
+    options = {
+        'tz_aware': True,
+        'maxPoolSize': settings.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': settings.MONGO_MIN_POOL_SIZE,
+        'connectTimeoutMS': settings.MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS:
+        options['maxIdleTimeMS'] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_SOCKET_TIMEOUT_MS:
+        options['socketTimeoutMS'] = settings.MONGO_SOCKET_TIMEOUT_MS
+    if settings.MONGO_COMPRESSORS:
+        options['compressors'] = settings.MONGO_COMPRESSORS
+    return motor.AsyncIOMotorClient(settings.MONGO_HOST, **options)
 
 
 def get_default_db(client: motor.AsyncIOMotorClient):
@@ -18,21 +39,99 @@ def get_default_db(client: motor.AsyncIOMotorClient):
     return client[get_settings().MONGO_DATABASE]
 
 
+def object_id_range(from_: timedelta, to: timedelta):
+    '''Returns filter on "_id" for documents created in a range relative to now
+
+    ObjectIds start with their creation time, so the default index on "_id"
+    is used instead of scanning a date field.
+    '''
+    now = datetime.now(timezone.utc)
+    return {
+        '$gte': ObjectId.from_datetime(now + from_),
+        '$lt': ObjectId.from_datetime(now + to),
+    }
+
+
+async def log_pool_stats(client: motor.AsyncIOMotorClient):
+    '''Logs pool options of the client and connection counts of the server'''
+    pool_options = client.options.pool_options
+    logging.info(
+        '%s: Mongo pool: max size %s, min size %s, connect timeout %ss, compressors %s',
+        __name__,
+        pool_options.max_pool_size,
+        pool_options.min_pool_size,
+        pool_options.connect_timeout,
+        get_settings().MONGO_COMPRESSORS or 'none',
+    )
+
+    try:
+        status = await client.admin.command('serverStatus')
+        logging.info('%s: Mongo server connections: %r', __name__, status.get('connections'))
+    except PyMongoError as error:
+        logging.info('%s: Mongo server connections unavailable: %s', __name__, error)
+
+
 class MongoBaseRepo(ABC):
-    '''Base class for Mongo repositories'''
+    '''Base class for Mongo repositories
+
+    Repositories share the provided client and its connection pool.
+    Without client, the repository creates and owns a client of its own.
 
-    def __init__(self):
-        self.client = create_db_client()
+    Bump SCHEMA_VERSION when ensure_indexes changes, so the migration is
+    applied again on existing databases.
+    '''
+
+    COLLECTION: str
+    SCHEMA_VERSION = 1
+
+    def __init__(self, client: motor.AsyncIOMotorClient = None):
+        self.owns_client = client is None
+        self.client = client or create_db_client()
         self.db = get_default_db(self.client)
 
     @abstractmethod
     async def __aenter__(self):
         pass
 
+    @abstractmethod
+    async def ensure_indexes(self):
+        '''Creates required indexes'''
+
+    async def migrate(self, force: bool = False) -> bool:
+        '''Creates indexes if not applied yet for current schema version
+
+        Returns
+            bool: Migration is applied
+        '''
+        versions = self.db[SCHEMA_COLLECTION]
+        if not force:
+            applied = await versions.find_one({'_id': self.COLLECTION})
+            if applied and applied['version'] >= self.SCHEMA_VERSION:
+                return False
+
+        await self.ensure_indexes()
+        await versions.update_one(
+            {'_id': self.COLLECTION},
+            {'$set': {
+                'version': self.SCHEMA_VERSION,
+                'applied_on': datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+        logging.info('%s: Collection "%s" migrated to schema version %s',
+                     __name__, self.COLLECTION, self.SCHEMA_VERSION)
+        return True
+
+    async def prepare(self):
+        '''Applies pending migrations unless skipped by settings'''
+        if not get_settings().MONGO_SKIP_MIGRATIONS:
+            await self.migrate()
+
     async def close(self):
-        '''Closes client connection'''
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self.client.close)
+        '''Closes client connection if owned by the repository'''
+        if self.owns_client:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.client.close)
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.close()
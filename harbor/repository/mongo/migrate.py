@@ -0,0 +1,60 @@
+'''Applies pending Mongo migrations out of band
+
+Usage: python -m harbor.repository.mongo.migrate [--force]
+
+Run this before starting API pods and workers with MONGO_SKIP_MIGRATIONS=True.
+'''
+
+import argparse
+import asyncio
+import logging
+from typing import Dict
+
+from harbor.repository.mongo.common import create_db_client
+from harbor.repository.mongo.notifications import NotificationMongoRepo
+from harbor.repository.mongo.outbox import TaskOutboxMongoRepo
+from harbor.repository.mongo.refresh_tokens import RefreshTokenMongoRepo
+from harbor.repository.mongo.stats import StatsMongoRepo
+from harbor.repository.mongo.users import UserMongoRepo
+from harbor.repository.mongo.verif_tokens import VerifTokenMongoRepo
+
+REPO_CLASSES = (
+    NotificationMongoRepo,
+    RefreshTokenMongoRepo,
+    StatsMongoRepo,
+    TaskOutboxMongoRepo,
+    UserMongoRepo,
+    VerifTokenMongoRepo,
+)
+
+
+async def migrate_all(force: bool = False) -> Dict[str, bool]:
+    '''Migrates all collections concurrently
+
+    Returns
+        Dict[str, bool]: Per collection if migration is applied
+    '''
+    client = create_db_client()
+    try:
+        repos = [repo_class(client) for repo_class in REPO_CLASSES]
+        results = await asyncio.gather(*(repo.migrate(force) for repo in repos))
+        return {repo.COLLECTION: result for (repo, result) in zip(repos, results)}
+    finally:
+        client.close()
+
+
+def main():
+    '''Entry point of the migrate command'''
+    parser = argparse.ArgumentParser(description='Applies pending Mongo migrations')
+    parser.add_argument('--force', action='store_true',
+                        help='Apply migrations, even if already applied')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    results = asyncio.get_event_loop().run_until_complete(migrate_all(args.force))
+    for (collection, applied) in sorted(results.items()):
+        print(f'{collection}: {"migrated" if applied else "up to date"}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,53 +1,128 @@
 '''This module contains CRUD operations for notifications'''
 
+import logging
+from collections import Counter
 from datetime import datetime, timezone, timedelta
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional
 
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import parse_obj_as
-from pymongo import ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, TEXT, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
 
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
+from harbor.helpers.hub import publish_notifications
+from harbor.helpers.settings import get_settings
 from harbor.repository.base import NotificationRepo
-from harbor.repository.mongo.common import MongoBaseRepo
+from harbor.repository.mongo.common import MongoBaseRepo, object_id_range
 
 
 class NotificationMongoRepo(MongoBaseRepo, NotificationRepo):
     '''Repository for notifications in Mongo'''
 
     COLLECTION = 'notifications'
+    COUNTER_COLLECTION = 'notification_counters'
+    SCHEMA_VERSION = 4
 
-    def __init__(self):
-        super().__init__()
+    # Newest first, ID breaks ties between equal timestamps
+    SORT = [('created_on', DESCENDING), ('_id', DESCENDING)]
+
+    # Users per batch when reconciling unread counters
+    RECONCILE_BATCH_SIZE = 1000
+
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
         self.col = self.db[self.COLLECTION]
+        self.counters = self.db[self.COUNTER_COLLECTION]
 
     async def __aenter__(self):
-        await self.ensure_indexes()
+        await self.prepare()
         return self
 
     async def ensure_indexes(self):
         '''Creates required indexes.'''
         await self.col.create_index([
             ("user_id", ASCENDING),
-            ("created_on", DESCENDING)
+            ("created_on", DESCENDING),
+            ("_id", DESCENDING),
         ])
 
-    async def get_recent(self, user_id: str) -> List[Notification]:
-        one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
-        notif_list = await self.col.find(
-            filter={
-                'user_id': {'$eq': ObjectId(user_id)},
-                '$or': [
-                    {'is_read': {'$eq': False}},
-                    {'created_on': {'$gte': one_week_ago}},
-                ]
+        # Full text search per user, matches in title weigh more
+        await self.col.create_index(
+            [
+                ("user_id", ASCENDING),
+                ("title", TEXT),
+                ("description", TEXT),
+            ],
+            weights={'title': 3, 'description': 1},
+            default_language='none',
+        )
+
+        # Counting unread notifications per user
+        await self.col.create_index([
+            ("user_id", ASCENDING),
+            ("is_read", ASCENDING),
+        ])
+
+        # Replaced by index above (Schema version 1)
+        try:
+            await self.col.drop_index([
+                ("user_id", ASCENDING),
+                ("created_on", DESCENDING),
+            ])
+        except OperationFailure:
+            pass
+
+    @staticmethod
+    def _before_filter(before: NotificationCursor) -> dict:
+        '''Returns filter for notifications older than the cursor'''
+        return {'$or': [
+            {'created_on': {'$lt': before.created_on}},
+            {
+                'created_on': {'$eq': before.created_on},
+                '_id': {'$lt': ObjectId(before.id)},
             },
-            sort=[('created_on', DESCENDING)],
+        ]}
+
+    async def _find_page(self, filters: List[dict], limit: int = None,
+                         before: NotificationCursor = None) -> List[Notification]:
+        '''Returns a page of notifications matching all filters'''
+        if before:
+            filters.append(self._before_filter(before))
+        notif_list = await self.col.find(
+            filter={'$and': filters},
+            sort=self.SORT,
+            limit=limit or 0,
         ).to_list(None)
         return parse_obj_as(List[Notification], notif_list)
 
-    async def get_historic(self, user_id: str, from_: datetime, to: datetime) -> List[Notification]:
-        notif_list = await self.col.find(
+    async def get_recent(self, user_id: str,
+                         limit: int = None,
+                         before: NotificationCursor = None) -> List[Notification]:
+        one_week_ago = datetime.now(timezone.utc) - timedelta(days=7)
+        return await self._find_page([
+            {'user_id': {'$eq': ObjectId(user_id)}},
+            {'$or': [
+                {'is_read': {'$eq': False}},
+                {'created_on': {'$gte': one_week_ago}},
+            ]},
+        ], limit, before)
+
+    async def get_historic(self, user_id: str, from_: datetime, to: datetime,
+                           limit: int = None,
+                           before: NotificationCursor = None) -> List[Notification]:
+        return await self._find_page([
+            {'user_id': {'$eq': ObjectId(user_id)}},
+            {'created_on': {
+                '$gte': from_,
+                '$lte': to,
+            }},
+        ], limit, before)
+
+    async def iter_historic(self, user_id: str, from_: datetime,
+                            to: datetime) -> AsyncIterator[Notification]:
+        cursor = self.col.find(
             filter={
                 'user_id': {'$eq': ObjectId(user_id)},
                 'created_on': {
@@ -55,20 +130,24 @@ class NotificationMongoRepo(MongoBaseRepo, NotificationRepo):
                     '$lte': to,
                 },
             },
-            sort=[('created_on', DESCENDING)],
-        ).to_list(None)
-        return parse_obj_as(List[Notification], notif_list)
+            sort=self.SORT,
+            batch_size=500,
+        )
+        async for notif_dict in cursor:
+            yield Notification(**notif_dict)
 
-    async def get_search(self, user_id: str, search_string: str) -> List[Notification]:
+    async def get_search(self, user_id: str, search_string: str,
+                         limit: int = None, offset: int = 0) -> List[Notification]:
+        score = {'$meta': 'textScore'}
         notif_list = await self.col.find(
             filter={
                 'user_id': {'$eq': ObjectId(user_id)},
-                '$or': [
-                    {'title': {'$regex': f'.*{search_string}.*', '$options': 'i'}},
-                    {'description': {'$regex': f'.*{search_string}.*', '$options': 'i'}},
-                ]
+                '$text': {'$search': search_string},
             },
-            sort=[('created_on', DESCENDING)],
+            projection={'score': score},
+            sort=[('score', score), ('created_on', DESCENDING)],
+            skip=offset,
+            limit=limit or 0,
         ).to_list(None)
         return parse_obj_as(List[Notification], notif_list)
 
@@ -76,8 +155,52 @@ class NotificationMongoRepo(MongoBaseRepo, NotificationRepo):
         notif_dict = notification.dict(exclude_none=True)
         notif_dict['user_id'] = ObjectId(notification.user_id)
         result = await self.col.insert_one(notif_dict)
+        if not notification.is_read:
+            await self._inc_unread(notif_dict['user_id'], 1)
+        publish_notifications([notification.copy(update={'id': str(result.inserted_id)})])
         return result.inserted_id
 
+    async def add_many(self, notifications: List[Notification],
+                       chunk_size: int = None) -> List[str]:
+        chunk_size = chunk_size or get_settings().NOTIFICATION_INSERT_CHUNK_SIZE
+        inserted_ids = []
+        for start in range(0, len(notifications), chunk_size):
+            chunk = notifications[start:start + chunk_size]
+            inserted = await self._insert_chunk(chunk)
+            inserted_ids.extend(notif.id for notif in inserted)
+
+            # Update counters with one write per user
+            unread = Counter(notif.user_id for notif in inserted if not notif.is_read)
+            if unread:
+                await self.counters.bulk_write([
+                    UpdateOne({'_id': ObjectId(user_id)}, {'$inc': {'unread': count}}, upsert=True)
+                    for (user_id, count) in unread.items()
+                ], ordered=False)
+
+            # One broker call per chunk, without waiting for the broker
+            publish_notifications(inserted)
+        return inserted_ids
+
+    async def _insert_chunk(self, chunk: List[Notification]) -> List[Notification]:
+        '''Inserts notifications unordered, returns inserted notifications with ID'''
+        # IDs are generated upfront to know which documents are inserted on partial failure
+        chunk = [notif.copy(update={'id': str(ObjectId())}) for notif in chunk]
+        docs = []
+        for notif in chunk:
+            notif_dict = notif.dict(exclude_none=True, by_alias=True)
+            notif_dict['_id'] = ObjectId(notif.id)
+            notif_dict['user_id'] = ObjectId(notif.user_id)
+            docs.append(notif_dict)
+
+        try:
+            await self.col.insert_many(docs, ordered=False)
+        except BulkWriteError as error:
+            failed = {write_error['index'] for write_error in error.details['writeErrors']}
+            logging.error('%s: Failed to insert %s of %s notifications',
+                          __name__, len(failed), len(chunk))
+            chunk = [notif for (i, notif) in enumerate(chunk) if i not in failed]
+        return chunk
+
     async def set_read(self, user_id: str, notif_ids: List[str], value: bool = True) -> int:
         notif_ids = [ObjectId(notif_id) for notif_id in notif_ids]
         result = await self.col.update_many(
@@ -87,11 +210,118 @@ class NotificationMongoRepo(MongoBaseRepo, NotificationRepo):
             },
             {'$set': {'is_read': value}},
         )
+
+        # Only notifications of which the flag actually changed are modified
+        if result.modified_count:
+            delta = -result.modified_count if value else result.modified_count
+            await self._inc_unread(ObjectId(user_id), delta)
         return result.matched_count
 
+    async def count_added(self, from_=timedelta(days=-1), to=timedelta()) -> int:
+        '''Returns count of notifications added in the time range'''
+        return await self.col.count_documents(
+            {'_id': object_id_range(from_, to)})
+
+    async def _inc_unread(self, user_id: ObjectId, delta: int):
+        '''Adds delta to the unread counter of a user'''
+        await self.counters.update_one(
+            {'_id': user_id},
+            {'$inc': {'unread': delta}},
+            upsert=True,
+        )
+
+    async def get_unread_count(self, user_id: str) -> int:
+        counter = await self.counters.find_one({'_id': ObjectId(user_id)})
+        if counter is None:
+            return 0
+        return max(counter['unread'], 0)
+
+    async def reconcile_unread_counts(self) -> int:
+        corrected = 0
+
+        # Stored counters, including those of users without unread notifications
+        last_id = None
+        while True:
+            counters = await self.counters.find(
+                filter={'_id': {'$gt': last_id}} if last_id else {},
+                sort=[('_id', ASCENDING)],
+                limit=self.RECONCILE_BATCH_SIZE,
+            ).to_list(None)
+            if not counters:
+                break
+            last_id = counters[-1]['_id']
+            corrected += await self._reconcile_batch(
+                {counter['_id']: counter.get('unread') for counter in counters})
+
+        # Users with unread notifications but without counter, e.g. on an existing database
+        last_id = None
+        while True:
+            match = {'is_read': False}
+            if last_id:
+                match['user_id'] = {'$gt': last_id}
+            rows = await self.col.aggregate([
+                {'$match': match},
+                {'$sort': {'user_id': ASCENDING}},
+                {'$limit': self.RECONCILE_BATCH_SIZE},
+                {'$group': {'_id': '$user_id'}},
+            ]).to_list(None)
+            if not rows:
+                break
+            user_ids = sorted(row['_id'] for row in rows)
+            last_id = user_ids[-1]
+            existing = set(await self.counters.distinct('_id', {'_id': {'$in': user_ids}}))
+            missing = [user_id for user_id in user_ids if user_id not in existing]
+            if missing:
+                corrected += await self._reconcile_batch(dict.fromkeys(missing))
+        return corrected
+
+    async def _reconcile_batch(self, stored: Dict[ObjectId, Optional[int]]) -> int:
+        '''Replaces counters which differ from the unread notifications of their user
+
+        A counter is only replaced if it still has the stored value (None if
+        missing). Counters changed in the meantime are skipped and corrected on
+        the next run, so concurrent increments aren't overwritten.
+
+        Returns number of corrected counters
+        '''
+        actual = {}
+        async for row in self.col.aggregate([
+                {'$match': {'user_id': {'$in': list(stored)}, 'is_read': False}},
+                {'$group': {'_id': '$user_id', 'unread': {'$sum': 1}}},
+        ]):
+            actual[row['_id']] = row['unread']
+
+        updates = []
+        for (user_id, unread) in stored.items():
+            count = actual.get(user_id, 0)
+            if unread == count or (unread is None and not count):
+                continue
+            if unread is None:
+                # Fails with a duplicate key if the counter was created in the meantime
+                updates.append(UpdateOne({'_id': user_id, 'unread': {'$exists': False}},
+                                          {'$set': {'unread': count}}, upsert=True))
+            else:
+                updates.append(UpdateOne({'_id': user_id, 'unread': unread},
+                                          {'$set': {'unread': count}}))
+        if not updates:
+            return 0
+
+        try:
+            result = (await self.counters.bulk_write(updates, ordered=False)).bulk_api_result
+        except BulkWriteError as error:
+            # Only counters created in the meantime are expected to fail
+            if any(write_error['code'] != 11000 for write_error in error.details['writeErrors']):
+                raise
+            result = error.details
+        corrected = result['nModified'] + result['nUpserted']
+        if corrected < len(updates):
+            logging.info('%s: Skipped %s unread counters changed during reconciliation',
+                         __name__, len(updates) - corrected)
+        return corrected
+
 
-async def create_repo() -> NotificationMongoRepo:
+async def create_repo(client: AsyncIOMotorClient = None) -> NotificationMongoRepo:
     '''Returns a new instance of the repo'''
-    repo = NotificationMongoRepo()
-    await repo.ensure_indexes()
+    repo = NotificationMongoRepo(client)
+    await repo.prepare()
     return repo
@@ -0,0 +1,73 @@
+'''This module contains operations for the task outbox'''
+
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from harbor.domain.common import ObjectIdStr
+from harbor.domain.outbox import OutboxTask
+from harbor.repository.base import TaskOutboxRepo
+from harbor.repository.mongo.common import MongoBaseRepo
+
+
+class TaskOutboxMongoRepo(MongoBaseRepo, TaskOutboxRepo):
+    '''Repository for Celery tasks waiting to be published in Mongo'''
+
+    COLLECTION = 'task_outbox'
+
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
+        self.col = self.db[self.COLLECTION]
+
+    async def __aenter__(self):
+        await self.prepare()
+        return self
+
+    async def ensure_indexes(self):
+        '''Creates required indexes.'''
+        await self.col.create_index('claimed_on')
+
+    async def add(self, task: OutboxTask, claimer_id: str = None) -> ObjectIdStr:
+        task_dict = task.dict(exclude_none=True)
+        task_dict['claimed_on'] = task.created_on
+        task_dict['claimed_by'] = claimer_id
+        result = await self.col.insert_one(task_dict)
+        return str(result.inserted_id)
+
+    async def remove(self, task_ids: List[str]):
+        await self.col.delete_many({'_id': {'$in': [ObjectId(task_id) for task_id in task_ids]}})
+
+    async def claim_stale(self, older_than: timedelta, limit: int,
+                          claimer_id: str = None) -> List[OutboxTask]:
+        now = datetime.now(timezone.utc)
+        tasks = []
+        while len(tasks) < limit:
+            # Atomic, so a task is only claimed by one process
+            task_dict = await self.col.find_one_and_update(
+                {'claimed_on': {'$lt': now - older_than}},
+                {'$set': {'claimed_on': now, 'claimed_by': claimer_id}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if task_dict is None:
+                break
+            tasks.append(OutboxTask(**task_dict))
+        return tasks
+
+    async def refresh_claims(self, task_ids: List[str], claimer_id: str):
+        await self.col.update_many(
+            {
+                '_id': {'$in': [ObjectId(task_id) for task_id in task_ids]},
+                'claimed_by': claimer_id,
+            },
+            {'$set': {'claimed_on': datetime.now(timezone.utc)}},
+        )
+
+
+async def create_repo(client: AsyncIOMotorClient = None) -> TaskOutboxMongoRepo:
+    '''Returns a new instance of the repo'''
+    repo = TaskOutboxMongoRepo(client)
+    await repo.prepare()
+    return repo
@@ -1,6 +1,7 @@
 '''This module contains CRUD operations for refresh tokens'''
 
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
 
 from harbor.domain.common import ObjectIdStr
 from harbor.domain.token import RefreshToken
@@ -13,12 +14,12 @@ class RefreshTokenMongoRepo(MongoBaseRepo, RefreshTokenRepo):
 
     COLLECTION = 'refresh_tokens'
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
         self.col = self.db[self.COLLECTION]
 
     async def __aenter__(self):
-        await self.ensure_indexes()
+        await self.prepare()
         return self
 
     async def ensure_indexes(self):
@@ -44,8 +45,8 @@ class RefreshTokenMongoRepo(MongoBaseRepo, RefreshTokenRepo):
             return await self.create_token(token.user_id)
 
 
-async def create_repo() -> RefreshTokenMongoRepo:
+async def create_repo(client: AsyncIOMotorClient = None) -> RefreshTokenMongoRepo:
     '''Returns a new instance of the repo'''
-    repo = RefreshTokenMongoRepo()
-    await repo.ensure_indexes()
+    repo = RefreshTokenMongoRepo(client)
+    await repo.prepare()
     return repo
@@ -1,8 +1,10 @@
 '''This module contains operations for statistics'''
 
-from datetime import datetime, timedelta, timezone, date
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List
 
-from pymongo import ASCENDING, DESCENDING
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 
 from harbor.domain.stats import (
     Reading,
@@ -16,16 +18,25 @@ from harbor.repository.mongo.common import MongoBaseRepo
 
 
 class StatsMongoRepo(MongoBaseRepo, StatsRepo):
-    '''Repository for statistics in Mongo'''
+    '''Repository for statistics in Mongo
+
+    Readings are aggregated per subject in rollups of a week, month and
+    year. Rollups store sum, count, min and max of the readings in the bucket
+    and are recomputed on each upsert.
+    '''
 
     COLLECTION = 'statistics'
+    ROLLUP_COLLECTION = 'statistics_rollups'
+    SCHEMA_VERSION = 2
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
         self.col = self.db[self.COLLECTION]
+        self.rollups = self.db[self.ROLLUP_COLLECTION]
+        self.upsert_listeners = []
 
     async def __aenter__(self):
-        await self.ensure_indexes()
+        await self.prepare()
         return self
 
     async def ensure_indexes(self):
@@ -34,6 +45,14 @@ class StatsMongoRepo(MongoBaseRepo, StatsRepo):
             ("datetime", DESCENDING),
             ("subject", ASCENDING)
         ], unique=True)
+        await self.rollups.create_index([
+            ("subject", ASCENDING),
+            ("timespan", ASCENDING),
+            ("start", ASCENDING),
+        ], unique=True)
+
+        # Build rollups of readings stored before schema version 2
+        await self.rebuild_rollups()
 
     async def get_latest(self, subject: ReadingSubject) -> Reading:
         '''Returns latest reading for a subject'''
@@ -51,39 +70,42 @@ class StatsMongoRepo(MongoBaseRepo, StatsRepo):
                            from_=timedelta(days=-365),
                            to=timedelta()):
         '''Returns aggregated readings for a subject by month'''
-        datetime_from = datetime.now(timezone.utc) + from_
+        return await self.get_aggregation(subject, AggTimespan.MONTH, operation, from_, to)
+
+    async def get_aggregation(self,
+                              subject: ReadingSubject,
+                              timespan: AggTimespan,
+                              operation=AggOper.AVERAGE,
+                              from_=timedelta(days=-365),
+                              to=timedelta()):
+        '''Returns aggregated readings for a subject per week, month or year'''
+        timespan = AggTimespan(timespan)
+        operation = AggOper(operation)
+        datetime_from = timespan.bucket_start(datetime.now(timezone.utc) + from_)
         datetime_to = datetime.now(timezone.utc) + to
-        pipeline = [
-            {'$match': {
-                'subject': {'$eq': subject},
-                'datetime': {
-                    '$gte': datetime_from,
-                    '$lte': datetime_to,
-                },
-            }},
-            {'$group': {
-                '_id': {'$dateToString': {'format': '%m.%Y', 'date': "$datetime"}},
-                'value': {
-                    f'${operation}': "$value",
-                }}},
-        ]
-
-        # Convert results into dictionary of date and value
+        cursor = self.rollups.find({
+            'subject': {'$eq': subject},
+            'timespan': {'$eq': timespan.value},
+            'start': {
+                '$gte': datetime_from,
+                '$lte': datetime_to,
+            },
+        })
+
+        # Convert rollups into dictionary of date and value
         values = {}
-        async for doc in self.col.aggregate(pipeline):
-            date_parts = doc['_id'].split('.')
-            value_date = date(
-                day=1,
-                month=int(date_parts[0]),
-                year=int(date_parts[1]),
-            )
-            values[value_date] = doc['value']
+        async for rollup in cursor:
+            if operation == AggOper.AVERAGE:
+                value = rollup['sum'] / rollup['count']
+            else:
+                value = rollup[operation.value]
+            values[rollup['start'].date()] = value
 
         # Return ReadingAggregation object
         return ReadingAgg(
             subject=subject,
-            timespan=AggTimespan.MONTH,
-            operation=AggOper.AVERAGE,
+            timespan=timespan,
+            operation=operation,
             values=values,
         )
 
@@ -94,10 +116,73 @@ class StatsMongoRepo(MongoBaseRepo, StatsRepo):
             {'$set': reading_dict},
             upsert=True,
         )
+        await self._after_upsert(reading)
+
+    async def upsert_many(self, readings: List[Reading]):
+        if not readings:
+            return
+        await self.col.bulk_write([
+            UpdateOne(
+                {'datetime': reading.datetime, 'subject': reading.subject},
+                {'$set': reading.dict(exclude_none=True)},
+                upsert=True,
+            )
+            for reading in readings
+        ], ordered=False)
+        for reading in readings:
+            await self._after_upsert(reading)
+
+    async def _after_upsert(self, reading: Reading):
+        '''Updates rollups of a stored reading and calls upsert listeners'''
+        for timespan in AggTimespan:
+            await self.update_rollup(reading.subject, timespan, reading.datetime)
+        for listener in self.upsert_listeners:
+            listener(reading)
+
+    def add_upsert_listener(self, listener: Callable[[Reading], None]):
+        self.upsert_listeners.append(listener)
+
+    async def update_rollup(self, subject: ReadingSubject, timespan: AggTimespan,
+                            value_datetime: datetime):
+        '''Recomputes the rollup of the bucket containing value_datetime'''
+        start = timespan.bucket_start(value_datetime)
+        pipeline = [
+            {'$match': {
+                'subject': {'$eq': subject},
+                'datetime': {
+                    '$gte': start,
+                    '$lt': timespan.bucket_end(value_datetime),
+                },
+            }},
+            {'$group': {
+                '_id': None,
+                'sum': {'$sum': '$value'},
+                'count': {'$sum': 1},
+                'min': {'$min': '$value'},
+                'max': {'$max': '$value'},
+            }},
+        ]
+        async for result in self.col.aggregate(pipeline):
+            await self.rollups.update_one(
+                {'subject': subject, 'timespan': timespan.value, 'start': start},
+                {'$set': {key: result[key] for key in ('sum', 'count', 'min', 'max')}},
+                upsert=True,
+            )
+
+    async def rebuild_rollups(self):
+        '''Recomputes all rollups from the stored readings'''
+        buckets = set()
+        async for reading_dict in self.col.find(projection={'subject': True, 'datetime': True}):
+            for timespan in AggTimespan:
+                start = timespan.bucket_start(reading_dict['datetime'])
+                buckets.add((reading_dict['subject'], timespan, start))
+
+        for (subject, timespan, start) in buckets:
+            await self.update_rollup(subject, timespan, start)
 
 
-async def create_repo() -> StatsMongoRepo:
+async def create_repo(client: AsyncIOMotorClient = None) -> StatsMongoRepo:
     '''Returns a new instance of the repo'''
-    repo = StatsMongoRepo()
-    await repo.ensure_indexes()
+    repo = StatsMongoRepo(client)
+    await repo.prepare()
     return repo
@@ -2,41 +2,83 @@
 # pylint: disable=no-member
 
 import logging
+import re
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Set, Tuple
 
 from bson.objectid import ObjectId
-from pymongo import ReturnDocument
-from pymongo.errors import DuplicateKeyError
+from bson.timestamp import Timestamp
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from pydantic import parse_obj_as
 
 from harbor.domain.user import BaseUser, User, UserWithPassword, UserFlags, UserInfo
-from harbor.repository.base import UserRepo, UsernameTakenError, EmailTakenError
-from harbor.repository.mongo.common import MongoBaseRepo
+from harbor.helpers.cache import TTLCache
+from harbor.helpers.settings import get_settings
+from harbor.repository.base import (
+    ChangeFeedUnsupportedError,
+    EmailTakenError,
+    UserRepo,
+    UsernameTakenError,
+)
+from harbor.repository.mongo.common import MongoBaseRepo, object_id_range
+
+
+def trigrams(text: str) -> List[str]:
+    '''Returns unique substrings of 3 characters, e.g. "harbor" => har, arb, rbo, bor'''
+    return sorted({text[i:i + 3] for i in range(len(text) - 2)})
 
 
 class UserMongoRepo(MongoBaseRepo, UserRepo):
     '''Repository for users in Mongo'''
 
     COLLECTION = 'users'
+    SCHEMA_VERSION = 2
+
+    # Maximum friends of friends considered to rank search results
+    MAX_NETWORK_SIZE = 10000
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
         self.col = self.db[self.COLLECTION]
+        settings = get_settings()
+        self.cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+        self.network_cache = TTLCache(settings.USER_CACHE_SIZE,
+                                      settings.USER_NETWORK_CACHE_TTL_SECONDS)
 
     async def __aenter__(self):
-        await self.ensure_indexes()
+        await self.prepare()
         return self
 
     async def ensure_indexes(self):
         '''Creates required indexes'''
         await self.col.create_index('username', unique=True)
         await self.col.create_index('email', unique=True)
+        await self.col.create_index('search_keys')
+
+        # Add search keys to users created before schema version 2
+        updates = []
+        async for user_dict in self.col.find(
+                {'search_keys': {'$exists': False}},
+                projection={'username': True}):
+            updates.append(UpdateOne(
+                {'_id': user_dict['_id']},
+                {'$set': {'search_keys': trigrams(user_dict['username'])}},
+            ))
+        if updates:
+            await self.col.bulk_write(updates, ordered=False)
 
     async def get(self, user_id: str) -> User:
+        user = self.cache.get(str(user_id))
+        if user:
+            return user.copy(deep=True)
+
         user_dict = await self.col.find_one(ObjectId(user_id))
         if user_dict:
-            return User(**user_dict)
+            user = User(**user_dict)
+            self.cache.set(str(user_id), user.copy(deep=True))
+            return user
 
     async def get_by_login(self, login: str) -> UserWithPassword:
         user_dict = await self.col.find_one({'$or': [{'username': login}, {'email': login}]})
@@ -48,21 +90,134 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
         if user_dict:
             return User(**user_dict)
 
-    async def get_search(self, user_id: str,
+    async def get_network(self, user: User) -> Tuple[Set[str], Set[str]]:
+        '''Returns IDs of friends and friends of friends of a user
+
+        Friends of friends are limited to MAX_NETWORK_SIZE users. Networks are
+        cached per user until the friends of the user change or TTL is passed.
+        '''
+        if not user.friends:
+            return (set(), set())
+
+        friends = set(user.friends)
+        cached = self.network_cache.get(str(user.id))
+        if cached and cached[0] == friends:
+            return cached
+
+        friends_of_friends = set()
+        cursor = self.col.find(
+            filter={'_id': {'$in': [ObjectId(friend_id) for friend_id in friends]}},
+            projection={'friends': True},
+        )
+        async for friend in cursor:
+            friends_of_friends.update(friend.get('friends', []))
+            if len(friends_of_friends) >= self.MAX_NETWORK_SIZE:
+                break
+        friends_of_friends -= friends | {str(user.id)}
+        self.network_cache.set(str(user.id), (friends, friends_of_friends))
+        return (friends, friends_of_friends)
+
+    async def get_search(self, user: User,
                          search_string: str,
                          limit: int = 10) -> List[BaseUser]:
+        query = search_string.lower()
+        escaped = re.escape(query)
+        (friends, friends_of_friends) = await self.get_network(user)
+
+        # Exact and prefix matches are served by the username index,
+        # substring matches are found by their trigrams
+        match_filters = [{'username': {'$regex': '^' + escaped}}]
+        if len(query) >= 3:
+            match_filters.append({
+                'search_keys': {'$all': trigrams(query)},
+                'username': {'$regex': escaped},
+            })
+
+        # Matches in network of user, friends first
+        user_list = []
+        network = [ObjectId(network_id) for network_id in friends | friends_of_friends]
+        if network:
+            friend_ids = [ObjectId(friend_id) for friend_id in friends]
+            user_list = await self.col.aggregate([
+                {'$match': {
+                    '_id': {'$in': network},
+                    'is_verified': True,
+                    '$or': match_filters,
+                }},
+                {'$project': {
+                    'display_name': True,
+                    'username': True,
+                    'network_rank': {'$cond': [{'$in': ['$_id', friend_ids]}, 0, 1]},
+                    'match_rank': {'$switch': {
+                        'branches': [
+                            {'case': {'$eq': ['$username', query]}, 'then': 0},
+                            {'case': {'$eq': [{'$indexOfCP': ['$username', query]}, 0]},
+                             'then': 1},
+                        ],
+                        'default': 2,
+                    }},
+                }},
+                {'$sort': {'network_rank': 1, 'match_rank': 1, 'username': 1}},
+                {'$limit': limit},
+            ]).to_list(None)
+
+        # Fill up with other users
+        if len(user_list) < limit:
+            exclude_ids = [ObjectId(user.id)] + [match['_id'] for match in user_list]
+            user_list += await self._search_others(
+                exclude_ids, query, match_filters, limit - len(user_list))
+        return parse_obj_as(List[BaseUser], user_list)
+
+    async def _search_others(self, exclude_ids: List[ObjectId], query: str,
+                             match_filters: List[Dict], limit: int) -> List[Dict]:
+        '''Returns matching users, exact match first, then prefix, then substring'''
+        user_list = []
+        for match_filter in match_filters:
+            if len(user_list) >= limit:
+                break
+            user_list += await self.col.find(
+                filter={
+                    **match_filter,
+                    '_id': {'$nin': exclude_ids + [user['_id'] for user in user_list]},
+                    'is_verified': True,
+                },
+                projection={'display_name', 'username'},
+                sort=[('username', ASCENDING)],
+                limit=limit - len(user_list),
+            ).to_list(None)
+
+        user_list.sort(key=lambda user: (user['username'] != query,
+                                         not user['username'].startswith(query)))
+        return user_list
+
+    async def iter_verified(self) -> AsyncIterator[BaseUser]:
         cursor = self.col.find(
-            filter={
-                'username': {'$regex': search_string.lower()},
-                '_id': {'$not': {'$eq': ObjectId(user_id)}},
-                'is_verified': True,
-            },
+            filter={'is_verified': True},
             projection={'display_name', 'username'},
-            limit=limit,
+            batch_size=1000,
         )
+        async for user_dict in cursor:
+            yield BaseUser(**user_dict)
 
-        user_list = await cursor.to_list(None)
-        return parse_obj_as(List[BaseUser], user_list)
+    async def watch_verified(self, since: datetime = None
+                             ) -> AsyncIterator[Tuple[str, Optional[BaseUser]]]:
+        pipeline = [{'$match': {
+            'operationType': {'$in': ['insert', 'update', 'replace', 'delete']},
+        }}]
+        start_at = Timestamp(since, 0) if since else None
+        try:
+            async with self.col.watch(pipeline, full_document='updateLookup',
+                                      start_at_operation_time=start_at) as stream:
+                async for change in stream:
+                    user_id = str(change['documentKey']['_id'])
+                    user_dict = change.get('fullDocument')
+                    if user_dict and user_dict.get('is_verified'):
+                        yield (user_id, BaseUser(**user_dict))
+                    else:
+                        yield (user_id, None)
+        except OperationFailure as error:
+            # Change streams require a replica set
+            raise ChangeFeedUnsupportedError(str(error)) from error
 
     async def count_active_users(self, from_=timedelta(days=-30), to=timedelta()):
         '''Returns active user count'''
@@ -75,6 +230,11 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
             }
         })
 
+    async def count_registrations(self, from_=timedelta(days=-1), to=timedelta()):
+        '''Returns count of users registered in the time range'''
+        return await self.col.count_documents(
+            {'_id': object_id_range(from_, to)})
+
     async def add(self,
                   *,  # Force keywords only
                   display_name: str,
@@ -88,6 +248,7 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
         # Try to insert new user into database
         try:
             user_dict = user.dict(exclude_none=True)
+            user_dict['search_keys'] = trigrams(user.username)
             result = await self.col.insert_one(user_dict)
         except DuplicateKeyError as dup_error:
             if 'username' in str(dup_error):
@@ -105,8 +266,17 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
             {'_id': ObjectId(user_id)},
             {'$set': {'password_hash': password_hash}},
         )
+        self.cache.delete(str(user_id))
         return User(**user_dict)
 
+    async def upgrade_password_hash(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        result = await self.col.update_one(
+            {'_id': ObjectId(user_id), 'password_hash': old_hash},
+            {'$set': {'password_hash': new_hash}},
+        )
+        self.cache.delete(str(user_id))
+        return result.modified_count == 1
+
     async def set_flag(self, user_id: str, flag: UserFlags, value: bool) -> User:
         user_dict = await self.col.find_one_and_update(
             {'_id': ObjectId(user_id)},
@@ -114,6 +284,7 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
             return_document=ReturnDocument.AFTER,
         )
         assert user_dict is not None, f'User should aways exist. User "{user_id}" not found'
+        self.cache.delete(str(user_id))
         return User(**user_dict)
 
     async def set_info(self, user_id: str, user_info: UserInfo) -> User:
@@ -123,17 +294,20 @@ class UserMongoRepo(MongoBaseRepo, UserRepo):
             {'$set': user_info_dict},
             return_document=ReturnDocument.AFTER,
         )
+        self.cache.delete(str(user_id))
         return User(**user_dict)
 
     async def update_last_login(self, user_id: str):
-        return await self.col.find_one_and_update(
+        result = await self.col.find_one_and_update(
             {'_id': ObjectId(user_id)},
             {'$set': {'last_login': datetime.now(timezone.utc)}}
         )
+        self.cache.delete(str(user_id))
+        return result
 
 
-async def create_repo() -> UserMongoRepo:
+async def create_repo(client: AsyncIOMotorClient = None) -> UserMongoRepo:
     '''Returns a new instance of the repo'''
-    repo = UserMongoRepo()
-    await repo.ensure_indexes()
+    repo = UserMongoRepo(client)
+    await repo.prepare()
     return repo
@@ -2,6 +2,7 @@
 # pylint: disable=no-member
 
 from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import ReturnDocument
 
 from harbor.domain.token import VerificationToken, TokenVerifyRequest
@@ -15,12 +16,12 @@ class VerifTokenMongoRepo(MongoBaseRepo, VerifTokenRepo):
 
     COLLECTION = 'verif_tokens'
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, client: AsyncIOMotorClient = None):
+        super().__init__(client)
         self.col = self.db[self.COLLECTION]
 
     async def __aenter__(self):
-        await self.ensure_indexes()
+        await self.prepare()
         return self
 
     async def ensure_indexes(self):
@@ -62,8 +63,8 @@ class VerifTokenMongoRepo(MongoBaseRepo, VerifTokenRepo):
                 return VerificationToken(**db_token_dict)
 
 
-async def create_repo() -> VerifTokenMongoRepo:
+async def create_repo(client: AsyncIOMotorClient = None) -> VerifTokenMongoRepo:
     '''Returns a new instance of the repo'''
-    repo = VerifTokenMongoRepo()
-    await repo.ensure_indexes()
+    repo = VerifTokenMongoRepo(client)
+    await repo.prepare()
     return repo
@@ -1,11 +1,13 @@
 '''This module contains all authentication related routes'''
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.security import OAuth2PasswordBearer
 from starlette.status import HTTP_401_UNAUTHORIZED
 
 from harbor.domain.token import AccessTokenData
+from harbor.domain.user import User
 from harbor.helpers import auth
+from harbor.repository.base import RepoDict, get_repos
 from harbor.rest.auth import (
     login as router_login,
     password_reset as router_pw_reset,
@@ -37,3 +39,57 @@ async def validate_access_token(token: str = Depends(
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+async def get_current_user(token_data: AccessTokenData = Depends(validate_access_token),
+                           repos: RepoDict = Depends(get_repos)) -> User:
+    '''Returns the user of the access token
+
+    FastAPI caches dependencies per request. So the user is fetched at most
+    once per request, regardless of the amount of dependants.
+
+    Raises
+        HTTPException: User of token doesn't exist (401, e.g. deleted user)
+    '''
+    user = await repos['user'].get(token_data.user_id)
+    if not user:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+async def validate_access_token_or_query(
+        header_token: str = Depends(OAuth2PasswordBearer(tokenUrl='/auth/login/token/',
+                                                         auto_error=False)),
+        access_token: str = Query(None, description='For clients which can\'t send headers'),
+) -> AccessTokenData:
+    '''Validates access token of header "Authorization" or query parameter "access_token"
+
+    Browsers can't send headers with EventSource. Only use for such routes,
+    query parameters end up in access logs.
+
+    Raises
+        HTTPException: No or invalid token provided
+    '''
+    token = header_token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await validate_access_token(token)
+
+
+async def get_current_user_or_query(
+        token_data: AccessTokenData = Depends(validate_access_token_or_query),
+        repos: RepoDict = Depends(get_repos)) -> User:
+    '''Returns the user of the access token of header or query parameter
+
+    Raises
+        HTTPException: No or invalid token provided or user doesn't exist
+    '''
+    return await get_current_user(token_data, repos)
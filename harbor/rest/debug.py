@@ -8,8 +8,11 @@ from pydantic import BaseModel
 
 from harbor.domain.notification import Notification
 from harbor.domain.token import AccessTokenData
+from harbor.helpers import auth
+from harbor.helpers.hub import get_hub
 from harbor.repository.base import RepoDict, get_repos
 from harbor.rest.auth.base import validate_access_token
+from harbor.worker.outbox import get_task_outbox
 
 router = APIRouter()
 
@@ -48,3 +51,31 @@ async def create_notification(form: CreateNotificationForm,
     )
     notif.id = await repos['notification'].add(notif)
     return notif
+
+
+@router.get('/password-hashing/',
+            summary='Get password hashing metrics')
+async def password_hashing_metrics():
+    '''Returns metrics of the password hashing pool'''
+    return auth.HASH_METRICS.dict()
+
+
+@router.get('/token-cache/',
+            summary='Get access token cache metrics')
+async def token_cache_metrics():
+    '''Returns hit and miss counters of the verified access token cache'''
+    return auth.get_token_cache().dict()
+
+
+@router.get('/notification-hub/',
+            summary='Get notification hub metrics')
+async def notification_hub_metrics():
+    '''Returns open notification streams of this worker'''
+    return get_hub().dict()
+
+
+@router.get('/task-outbox/',
+            summary='Get task outbox metrics')
+async def task_outbox_metrics():
+    '''Returns queue depth and publish latency of the task outbox of this worker'''
+    return get_task_outbox().dict()
@@ -1,37 +1,122 @@
 '''This module handles all routes for notifications operations'''
 
-from datetime import datetime
-from typing import List
+import asyncio
+from datetime import datetime, timezone
+from typing import AsyncIterator, List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel, Field
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from starlette.status import HTTP_400_BAD_REQUEST
 
 from harbor.domain.common import ObjectIdStr, message_responses
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
 from harbor.domain.token import AccessTokenData
-from harbor.rest.auth.base import validate_access_token
+from harbor.domain.user import User
+from harbor.helpers.hub import get_hub
+from harbor.helpers.settings import get_settings
+from harbor.rest.auth.base import (
+    get_current_user,
+    get_current_user_or_query,
+    validate_access_token_or_query,
+)
 from harbor.repository.base import RepoDict, get_repos
 from harbor.use_cases.notifications import (
+    export as uc_export,
     get_recent as uc_recent,
     get_historic as uc_historic,
+    get_unread_count as uc_unread,
     mark_as_read as uc_mark_read,
+    search as uc_search,
 )
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 100
+
+
+def invalid_cursor_response() -> JSONResponse:
+    '''Returns response for a cursor which can't be decoded'''
+    return JSONResponse(
+        status_code=HTTP_400_BAD_REQUEST,
+        content={
+            'code': 'invalid_cursor',
+            'msg': 'Invalid pagination cursor',
+        },
+    )
+
+
+def set_next_cursor(response: Response, notifs: List[Notification], limit: Optional[int]):
+    '''Sets header "X-Next-Cursor" if more notifications might be available'''
+    if limit and len(notifs) >= limit:
+        cursor = NotificationCursor.from_notification(notifs[-1])
+        response.headers['X-Next-Cursor'] = cursor.encode()
+
 
 @router.get('/',
             summary='Get recent notifications',
             response_model=List[Notification],
-            response_model_by_alias=False)
-async def get_recent(token_data: AccessTokenData = Depends(validate_access_token),
+            response_model_by_alias=False,
+            responses=message_responses({
+                400: 'Invalid pagination cursor',
+            }))
+async def get_recent(response: Response,
+                     limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     before: str = Query(None, title='Cursor from header X-Next-Cursor'),
+                     user: User = Depends(get_current_user),
                      repos: RepoDict = Depends(get_repos)):
-    '''A recent notification is either not read yet or is maximum one week old'''
+    '''A recent notification is either not read yet or is maximum one week old.
+
+    Notifications are sorted newest first. If a limit is provided and the page
+    is full, header "X-Next-Cursor" contains the cursor for the next page.
+    '''
+    try:
+        cursor = NotificationCursor.decode(before) if before else None
+    except ValueError:
+        return invalid_cursor_response()
+
     uc = uc_recent.GetRecentUsecase(notif_repo=repos['notification'])
     uc_req = uc_recent.GetRecentRequest(
-        user_id=token_data.user_id,
+        user_id=user.id,
+        limit=limit,
+        before=cursor,
+    )
+    notifs = await uc.execute(uc_req)
+    set_next_cursor(response, notifs, limit)
+    return notifs
+
+
+@router.get('/search/',
+            summary='Search notifications',
+            response_model=List[Notification],
+            response_model_by_alias=False)
+async def search(q: str = Query(..., min_length=1, max_length=200),
+                 limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                 offset: int = Query(0, ge=0),
+                 user: User = Depends(get_current_user),
+                 repos: RepoDict = Depends(get_repos)):
+    '''Searches words in title and description, most relevant first.
+    Use quotes to search a phrase and a leading "-" to exclude a word.
+    '''
+    uc = uc_search.SearchUsecase(notif_repo=repos['notification'])
+    uc_req = uc_search.SearchRequest(
+        user_id=user.id,
+        query=q,
+        limit=limit,
+        offset=offset,
+    )
+    return await uc.execute(uc_req)
+
+
+@router.get('/unread-count/',
+            summary='Get number of unread notifications',
+            response_model=uc_unread.GetUnreadCountResponse)
+async def get_unread_count(user: User = Depends(get_current_user),
+                           repos: RepoDict = Depends(get_repos)):
+    '''Returns the number of unread notifications, e.g. to show a badge'''
+    uc = uc_unread.GetUnreadCountUsecase(notif_repo=repos['notification'])
+    uc_req = uc_unread.GetUnreadCountRequest(
+        user_id=user.id,
     )
     return await uc.execute(uc_req)
 
@@ -40,6 +125,8 @@ class GetHistoricNotificationsForm(BaseModel):
     '''Form to request historic notifications'''
     from_: datetime = Field(..., alias="from")
     to: datetime
+    limit: int = Field(None, ge=1, le=MAX_PAGE_SIZE)
+    before: str = Field(None, title='Cursor from header X-Next-Cursor')
 
 
 @router.post('/get-historic/',
@@ -47,25 +134,37 @@ class GetHistoricNotificationsForm(BaseModel):
              response_model=List[Notification],
              response_model_by_alias=False,
              responses=message_responses({
-                 400: 'Maximum time range of 90 days exceeded',
+                 400: 'Maximum time range of 90 days exceeded or invalid cursor',
              }))
 async def get_historic(form: GetHistoricNotificationsForm,
-                       token_data: AccessTokenData = Depends(
-                           validate_access_token),
+                       response: Response,
+                       user: User = Depends(get_current_user),
                        repos: RepoDict = Depends(get_repos)):
     '''Returns all notifications between 2 timestamps.
     Maximum allowed time range is 90 days.
     Timestamps are in UTC.
+
+    Notifications are sorted newest first. If a limit is provided and the page
+    is full, header "X-Next-Cursor" contains the cursor for the next page.
     '''
+    try:
+        cursor = NotificationCursor.decode(form.before) if form.before else None
+    except ValueError:
+        return invalid_cursor_response()
+
     uc = uc_historic.GetHistoricUsecase(notif_repo=repos['notification'])
     uc_req = uc_historic.GetHistoricRequest(
-        user_id=token_data.user_id,
+        user_id=user.id,
         from_=form.from_,
         to=form.to,
+        limit=form.limit,
+        before=cursor,
     )
 
     try:
-        return await uc.execute(uc_req)
+        notifs = await uc.execute(uc_req)
+        set_next_cursor(response, notifs, form.limit)
+        return notifs
 
     except uc_historic.MaxTimeRangeExceeded:
         return JSONResponse(
@@ -77,6 +176,97 @@ async def get_historic(form: GetHistoricNotificationsForm,
         )
 
 
+async def ndjson_lines(notifs: AsyncIterator[Notification]) -> AsyncIterator[str]:
+    '''Yields notifications as newline delimited JSON'''
+    async for notif in notifs:
+        yield notif.json() + '\n'
+
+
+@router.get('/export/',
+            summary='Export historic notifications',
+            response_class=StreamingResponse,
+            responses={
+                200: {'content': {'application/x-ndjson': {}}},
+                **message_responses({400: 'Maximum time range of 366 days exceeded'}),
+            })
+async def export(from_: datetime = Query(..., alias='from'),
+                 to: datetime = Query(...),
+                 user: User = Depends(get_current_user),
+                 repos: RepoDict = Depends(get_repos)):
+    '''Streams all notifications between 2 timestamps as newline delimited JSON.
+    Maximum allowed time range is 366 days.
+    Timestamps are in UTC.
+    '''
+    uc = uc_export.ExportUsecase(notif_repo=repos['notification'])
+    uc_req = uc_export.ExportRequest(
+        user_id=user.id,
+        from_=from_,
+        to=to,
+    )
+
+    try:
+        notifs = uc.execute(uc_req)
+    except uc_historic.MaxTimeRangeExceeded:
+        return JSONResponse(
+            status_code=HTTP_400_BAD_REQUEST,
+            content={
+                'code': 'max_time_range_exceeded',
+                'msg': 'Maximum time range of 366 days exceeded',
+            },
+        )
+
+    return StreamingResponse(ndjson_lines(notifs), media_type='application/x-ndjson')
+
+
+async def notification_events(user_id: str, expires_on: datetime = None) -> AsyncIterator[str]:
+    '''Yields new notifications of a user as Server-Sent Events
+
+    Ends with event "expired" when expires_on has passed.
+    '''
+    keepalive = get_settings().NOTIFICATION_STREAM_KEEPALIVE_SECONDS
+    async with get_hub().subscribe(user_id) as queue:
+        yield ': connected\n\n'
+        while True:
+            timeout = keepalive
+            if expires_on:
+                remaining = (expires_on - datetime.now(timezone.utc)).total_seconds()
+                if remaining <= 0:
+                    yield 'event: expired\ndata: {}\n\n'
+                    return
+                timeout = min(timeout, remaining)
+
+            try:
+                payload = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                # Keep proxies from closing idle connections
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: notification\ndata: {payload}\n\n'
+
+
+@router.get('/stream/',
+            summary='Stream new notifications',
+            response_class=StreamingResponse,
+            responses={200: {'content': {'text/event-stream': {}}}})
+async def stream(token_data: AccessTokenData = Depends(validate_access_token_or_query),
+                 user: User = Depends(get_current_user_or_query)):
+    '''Pushes new notifications as Server-Sent Events (event "notification").
+    Replaces polling of the recent notifications.
+
+    EventSource can't send headers, so the access token can also be passed as
+    query parameter "access_token". The stream ends with event "expired" when
+    the access token expires. Reconnect with a refreshed token.
+    '''
+    return StreamingResponse(
+        notification_events(user.id, token_data.expires_on),
+        media_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        },
+    )
+
+
 class MarkNotificationAsForm(BaseModel):
     '''Form to mark notifications as read or unread'''
     notification_ids: List[ObjectIdStr]
@@ -92,13 +282,13 @@ class MarkNotificationAsResponse(BaseModel):
              summary="Mark multiple notifications as read or unread",
              response_model=MarkNotificationAsResponse)
 async def mark_as(form: MarkNotificationAsForm,
-                  token_data: AccessTokenData = Depends(validate_access_token),
+                  user: User = Depends(get_current_user),
                   repos: RepoDict = Depends(get_repos)):
     '''Mark multiple notifications as read or unread'''
     # Prepare use case and request
     uc = uc_mark_read.MarkAsReadUsecase(notif_repo=repos['notification'])
     uc_req = uc_mark_read.MarkAsReadRequest(
-        user_id=token_data.user_id,
+        user_id=user.id,
         notification_ids=form.notification_ids,
         is_read=(not form.unread)
     )
@@ -2,8 +2,10 @@
 
 from fastapi import APIRouter, Depends
 
-from harbor.domain.token import AccessTokenData
-from harbor.rest.auth.base import validate_access_token
+from harbor.domain.user import User
+from harbor.helpers.autocomplete import get_user_index
+from harbor.helpers.settings import get_settings
+from harbor.rest.auth.base import get_current_user
 from harbor.repository.base import RepoDict, get_repos
 from harbor.use_cases.search import generic as uc_gen_search
 
@@ -15,12 +17,19 @@ router = APIRouter()
             response_model=uc_gen_search.GenericSearchResponse,
             response_model_by_alias=False)
 async def search(q: str,
-                 token_data: AccessTokenData = Depends(validate_access_token),
+                 user: User = Depends(get_current_user),
                  repos: RepoDict = Depends(get_repos)):
-    '''Search for people, pages, groups and events'''
-    uc = uc_gen_search.GenericSearchUseCase(user_repo=repos['user'])
+    '''Search for people, pages, groups and events.
+    Sources which didn't respond in time are listed in "timed_out".
+    '''
+    settings = get_settings()
+    uc = uc_gen_search.GenericSearchUseCase(
+        user_repo=repos['user'],
+        user_index=get_user_index() if settings.USER_AUTOCOMPLETE else None,
+        timeout=settings.SEARCH_SOURCE_TIMEOUT_SECONDS,
+    )
     uc_req = uc_gen_search.GenericSearchRequest(
         query=q,
-        user_id=token_data.user_id,
+        user=user,
     )
     return await uc.execute(uc_req)
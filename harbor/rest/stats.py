@@ -1,17 +1,70 @@
 '''This module handles all routes for stats operations'''
 
+import hashlib
+import json
 from datetime import date
+from functools import lru_cache
 from typing import Dict
 
 from fastapi import APIRouter, Depends
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.status import HTTP_304_NOT_MODIFIED
 
+from harbor.domain.stats import Reading
+from harbor.helpers.cache import TTLCache
+from harbor.helpers.settings import get_settings
 from harbor.repository.base import RepoDict, get_repos
 from harbor.use_cases.stats import get_active_user_count as uc_count
 
 router = APIRouter()
 
 
+@lru_cache(maxsize=None)
+def get_response_cache() -> TTLCache:
+    '''Returns cache of serialized responses with their ETag'''
+    return TTLCache(maxsize=16, ttl=get_settings().STATS_CACHE_TTL_SECONDS)
+
+
+def invalidate_response_cache(_: Reading = None):
+    '''Drops cached responses, e.g. after a new reading is stored'''
+    get_response_cache().clear()
+
+
+def weak_etag(etag: str) -> str:
+    '''Returns opaque tag of an entity tag, for weak comparison'''
+    etag = etag.strip()
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    '''Returns whether an If-None-Match header matches the ETag (RFC 7232 weak comparison)'''
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    if '*' in tags:
+        return True
+    return weak_etag(etag) in {weak_etag(tag) for tag in tags if tag}
+
+
+def cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    '''Returns JSON response with caching headers, or 304 if client is up to date'''
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={get_settings().STATS_CACHE_TTL_SECONDS}',
+    }
+    if etag_matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+def serialize(response: BaseModel):
+    '''Returns JSON body and ETag of a response'''
+    body = json.dumps(jsonable_encoder(response), separators=(',', ':')).encode()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+    return (body, etag)
+
+
 class ActiveUserCountResponse(BaseModel):
     '''Response for active user count'''
     now: int
@@ -22,14 +75,21 @@ class ActiveUserCountResponse(BaseModel):
             summary='Get active user count',
             response_model=ActiveUserCountResponse,
             response_model_by_alias=False)
-async def active_users(repos: RepoDict = Depends(get_repos)):
+async def active_users(request: Request, repos: RepoDict = Depends(get_repos)):
     '''Returns current and historic active user count.
     We consider users as active, if their last login is less than one month ago.
     Historic counts are the averages per month for the past year.
     '''
-    uc = uc_count.GetActiveUserCountUsecase(stats_repo=repos['stats'])
-    res = await uc.execute()
-    return ActiveUserCountResponse(
-        now=res.now,
-        history=res.history.values,
-    )
+    cache = get_response_cache()
+    cached = cache.get('active-users')
+    if cached is None:
+        uc = uc_count.GetActiveUserCountUsecase(stats_repo=repos['stats'])
+        res = await uc.execute()
+        cached = serialize(ActiveUserCountResponse(
+            now=res.now,
+            history=res.history.values,
+        ))
+        cache.set('active-users', cached)
+
+    (body, etag) = cached
+    return cached_json_response(request, body, etag)
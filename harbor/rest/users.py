@@ -8,7 +8,7 @@ from harbor.domain.common import message_responses
 from harbor.domain.token import AccessTokenData
 from harbor.domain.user import User, FRIEND_FIELDS, STRANGER_FIELDS
 from harbor.repository.base import RepoDict, get_repos
-from harbor.rest.auth.base import validate_access_token
+from harbor.rest.auth.base import get_current_user, validate_access_token
 from harbor.use_cases.user import (
     profile_get as uc_get_profile,
     profile_update as uc_update_profile,
@@ -21,13 +21,13 @@ router = APIRouter()
             summary='Get own profile',
             response_model=uc_get_profile.GetProfileResponse,
             response_model_by_alias=False)
-async def get_user_me(token_data: AccessTokenData = Depends(validate_access_token),
+async def get_user_me(user: User = Depends(get_current_user),
                       repos: RepoDict = Depends(get_repos)):
     '''Get your own user data.'''
     uc = uc_get_profile.GetProfileUseCase(user_repo=repos['user'])
-    uc_req = uc_get_profile.GetProfileByIDRequest(
-        requester=token_data.user_id,
-        user_id=token_data.user_id,
+    uc_req = uc_get_profile.GetProfileOfUserRequest(
+        requester=user.id,
+        user=user,
     )
     return await uc.execute(uc_req)
 
@@ -43,13 +43,12 @@ class UpdateProfileForm(BaseModel):
               response_model=User,
               response_model_by_alias=False)
 async def set_user_me(form: UpdateProfileForm,
-                      token_data: AccessTokenData = Depends(
-                          validate_access_token),
+                      user: User = Depends(get_current_user),
                       repos: RepoDict = Depends(get_repos)):
     '''Set your own user data.'''
     uc = uc_update_profile.UpdateProfileUseCase(user_repo=repos['user'])
     uc_req = uc_update_profile.UpdateProfileRequest(
-        user_id=token_data.user_id,
+        user_id=user.id,
         **form.dict(),
     )
     return await uc.execute(uc_req)
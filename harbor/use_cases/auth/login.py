@@ -50,11 +50,15 @@ class LoginUseCase:
         # Check if matching user was found
         if not user:
             # Prevent timing attack
-            auth.get_password_hash(req.password)
+            await auth.get_password_hash_async(req.password)
             raise InvalidCredsError()
 
         # Check if password is correct
-        if not auth.verify_password(req.password, user.password_hash):
+        (valid, new_hash) = await auth.verify_and_update_password_async(
+            req.password,
+            user.password_hash,
+        )
+        if not valid:
             raise InvalidCredsError()
 
         # Check if user is not locked
@@ -64,6 +68,10 @@ class LoginUseCase:
         # Authentication successful
         await self.user_repo.update_last_login(user.id)
 
+        # Upgrade outdated password hash
+        if new_hash:
+            await self.user_repo.upgrade_password_hash(user.id, user.password_hash, new_hash)
+
         # Generate tokens
         access_token = await auth.create_access_token(user_id=user.id)
         refresh_token = await self.rt_repo.create_token(user.id)
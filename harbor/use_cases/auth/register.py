@@ -7,7 +7,7 @@ from harbor.domain.token import VerificationPurposeEnum as VerifPur
 from harbor.helpers import auth, debug, email, const
 from harbor.repository import base as repo_base
 from harbor.repository.base import UserRepo, VerifTokenRepo
-from harbor.worker.app import queue_task
+from harbor.worker.mail_buffer import queue_mail
 
 
 class RegisterRequest(BaseModel):
@@ -57,7 +57,7 @@ class RegisterUseCase:
             user = await self.user_repo.add(
                 display_name=req.display_name,
                 email=req.email,
-                password_hash=auth.get_password_hash(req.password)
+                password_hash=await auth.get_password_hash_async(req.password)
             )
 
         except repo_base.UsernameTakenError:
@@ -81,7 +81,7 @@ class RegisterUseCase:
             )
 
         # Send mail and confirm success
-        queue_task('harbor.worker.tasks.email.send_mail', [msg.dict()])
+        queue_mail(msg)
 
         # Return success
         return True
@@ -54,7 +54,7 @@ class ExecResetPasswordUseCase:
             raise InvalidTokenError
 
         # Set new password
-        password_hash = auth.get_password_hash(req.password)
+        password_hash = await auth.get_password_hash_async(req.password)
         user = await self.user_repo.set_password(valid.user_id, password_hash)
 
         # Mark account as verified
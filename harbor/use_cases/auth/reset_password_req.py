@@ -5,7 +5,7 @@ from pydantic import BaseModel, EmailStr
 from harbor.domain.token import VerificationPurposeEnum as VerifPur
 from harbor.helpers import email, debug
 from harbor.repository.base import UserRepo, VerifTokenRepo
-from harbor.worker.app import queue_task
+from harbor.worker.mail_buffer import queue_mail
 
 
 class RequestPasswordResetRequest(BaseModel):
@@ -36,4 +36,4 @@ class RequestPasswordResetUseCase:
                 token.user_id,
                 token.secret
             )
-            queue_task('harbor.worker.tasks.email.send_mail', [msg.dict()])
+            queue_mail(msg)
@@ -0,0 +1,41 @@
+'''User exports their historic notifications'''
+
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from pydantic import BaseModel
+
+from harbor.domain.common import ObjectIdStr
+from harbor.domain.notification import Notification
+from harbor.helpers import debug
+from harbor.repository.base import NotificationRepo
+from harbor.use_cases.notifications.get_historic import MaxTimeRangeExceeded
+
+
+class ExportRequest(BaseModel):
+    '''Request to export historic notifications'''
+    user_id: ObjectIdStr
+    from_: datetime
+    to: datetime
+
+
+class ExportUsecase:
+    '''User exports their historic notifications'''
+
+    def __init__(self, notif_repo: NotificationRepo):
+        self.notif_repo = notif_repo
+
+    def execute(self, req: ExportRequest) -> AsyncIterator[Notification]:
+        '''Returns iterator over historic notifications, newest first
+
+        Raises
+            MaxTimeRangeExceeded: Time range exceeds 1 year
+        '''
+        # Log call for debugging
+        debug.log_call(__name__, "execute", req.dict())
+
+        # Check if time range is valid
+        if (req.to - req.from_) > timedelta(days=366):
+            raise MaxTimeRangeExceeded('max 366 days')
+
+        return self.notif_repo.iter_historic(req.user_id, req.from_, req.to)
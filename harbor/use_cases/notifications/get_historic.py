@@ -6,7 +6,7 @@ from typing import List
 from pydantic import BaseModel
 
 from harbor.domain.common import ObjectIdStr
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
 from harbor.helpers import debug
 from harbor.repository.base import NotificationRepo
 
@@ -16,6 +16,8 @@ class GetHistoricRequest(BaseModel):
     user_id: ObjectIdStr
     from_: datetime
     to: datetime
+    limit: int = None
+    before: NotificationCursor = None
 
 
 class MaxTimeRangeExceeded(Exception):
@@ -37,4 +39,10 @@ class GetHistoricUsecase:
         if (req.to - req.from_) > timedelta(days=90):
             raise MaxTimeRangeExceeded('max 90 days')
 
-        return await self.notif_repo.get_historic(req.user_id, req.from_, req.to)
+        return await self.notif_repo.get_historic(
+            req.user_id,
+            req.from_,
+            req.to,
+            limit=req.limit,
+            before=req.before,
+        )
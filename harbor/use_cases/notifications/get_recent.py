@@ -5,7 +5,7 @@ from typing import List
 from pydantic import BaseModel
 
 from harbor.domain.common import ObjectIdStr
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
 from harbor.helpers import debug
 from harbor.repository.base import NotificationRepo
 
@@ -13,6 +13,8 @@ from harbor.repository.base import NotificationRepo
 class GetRecentRequest(BaseModel):
     '''Request for recent notifications'''
     user_id: ObjectIdStr
+    limit: int = None
+    before: NotificationCursor = None
 
 
 class GetRecentUsecase:
@@ -27,4 +29,8 @@ class GetRecentUsecase:
         debug.log_call(__name__, "execute", req.dict())
 
         # Get recent notifications
-        return await self.notif_repo.get_recent(req.user_id)
+        return await self.notif_repo.get_recent(
+            req.user_id,
+            limit=req.limit,
+            before=req.before,
+        )
@@ -0,0 +1,33 @@
+'''User requests their number of unread notifications'''
+
+from pydantic import BaseModel
+
+from harbor.domain.common import ObjectIdStr
+from harbor.helpers import debug
+from harbor.repository.base import NotificationRepo
+
+
+class GetUnreadCountRequest(BaseModel):
+    '''Request for the number of unread notifications'''
+    user_id: ObjectIdStr
+
+
+class GetUnreadCountResponse(BaseModel):
+    '''Response with the number of unread notifications'''
+    count: int
+
+
+class GetUnreadCountUsecase:
+    '''User requests their number of unread notifications'''
+
+    def __init__(self, notif_repo: NotificationRepo):
+        self.notif_repo = notif_repo
+
+    async def execute(self, req: GetUnreadCountRequest) -> GetUnreadCountResponse:
+        '''Get number of unread notifications'''
+        # Log call for debugging
+        debug.log_call(__name__, "execute", req.dict())
+
+        # Read counter
+        count = await self.notif_repo.get_unread_count(req.user_id)
+        return GetUnreadCountResponse(count=count)
@@ -0,0 +1,38 @@
+'''User searches their notifications'''
+
+from typing import List
+
+from pydantic import BaseModel, conint, constr
+
+from harbor.domain.common import ObjectIdStr
+from harbor.domain.notification import Notification
+from harbor.helpers import debug
+from harbor.repository.base import NotificationRepo
+
+
+class SearchRequest(BaseModel):
+    '''Request to search notifications'''
+    user_id: ObjectIdStr
+    query: constr(min_length=1, max_length=200)
+    limit: conint(ge=1, le=100) = 20
+    offset: conint(ge=0) = 0
+
+
+class SearchUsecase:
+    '''User searches their notifications'''
+
+    def __init__(self, notif_repo: NotificationRepo):
+        self.notif_repo = notif_repo
+
+    async def execute(self, req: SearchRequest) -> List[Notification]:
+        '''Search notifications, most relevant first'''
+        # Log call for debugging
+        debug.log_call(__name__, "execute", req.dict())
+
+        # Search notifications
+        return await self.notif_repo.get_search(
+            req.user_id,
+            req.query,
+            limit=req.limit,
+            offset=req.offset,
+        )
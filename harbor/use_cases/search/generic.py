@@ -1,19 +1,21 @@
 '''User wants to search'''
 
-from typing import List
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
 
 from pydantic import BaseModel, constr
 
-from harbor.domain.common import ObjectIdStr
-from harbor.domain.user import BaseUser
+from harbor.domain.user import BaseUser, User
 from harbor.helpers import debug
+from harbor.helpers.autocomplete import AutocompleteIndex
 from harbor.repository.base import UserRepo
 
 
 class GenericSearchRequest(BaseModel):
     '''Request for generic search usecase'''
     query: constr(min_length=1)
-    user_id: ObjectIdStr
+    user: User
 
 
 class GenericSearchResponse(BaseModel):
@@ -22,23 +24,82 @@ class GenericSearchResponse(BaseModel):
     groups: List
     pages: List
     events: List
+    timed_out: List[str] = []
+
+
+SearchSource = Callable[[GenericSearchRequest], Awaitable[List]]
 
 
 class GenericSearchUseCase:
-    '''User wants to search'''
+    '''User wants to search
+
+    All sources are searched concurrently. A source which doesn't respond
+    within the timeout returns no results and is listed in "timed_out".
+    '''
 
-    def __init__(self, user_repo: UserRepo):
+    USERS_LIMIT = 10
+
+    def __init__(self, user_repo: UserRepo,
+                 user_index: AutocompleteIndex = None,
+                 timeout: float = None,
+                 sources: Dict[str, SearchSource] = None):
         self.user_repo = user_repo
+        self.user_index = user_index
+        self.timeout = timeout
+        self.sources = {'users': self.search_users}
+        self.sources.update(sources or {})
+
+    async def search_users(self, req: GenericSearchRequest) -> List[BaseUser]:
+        '''Searches users by prefix in memory, falls back to the repository
+
+        Both rank friends first, then friends of friends, then other users.
+        '''
+        if self.user_index is None or not self.user_index.ready:
+            return await self.user_repo.get_search(req.user, req.query)
+
+        (friends, friends_of_friends) = await self.user_repo.get_network(req.user)
+        ranks = dict.fromkeys(friends_of_friends, 1)
+        ranks.update(dict.fromkeys(friends, 0))
+        users = self.user_index.search(req.query, self.USERS_LIMIT,
+                                       exclude_id=req.user.id, ranks=ranks)
+        if not users and len(req.query) >= 3:
+            # Substring matches are only found by the repository
+            return await self.user_repo.get_search(req.user, req.query)
+        return users
+
+    async def search_source(self, name: str, req: GenericSearchRequest) -> List:
+        '''Searches a single source within the timeout
+
+        Raises
+            asyncio.TimeoutError: Source didn't respond in time
+        '''
+        try:
+            return await asyncio.wait_for(self.sources[name](req), self.timeout)
+        except asyncio.TimeoutError:
+            logging.warning('%s: Search source "%s" timed out after %ss',
+                            __name__, name, self.timeout)
+            raise
 
     async def execute(self, req: GenericSearchRequest) -> GenericSearchResponse:
         '''Searches across users, groups, pages and events'''
         # Log call for debugging
         debug.log_call(__name__, "execute", req.dict())
 
-        # Execute search and return results
-        return GenericSearchResponse(
-            users=await self.user_repo.get_search(req.user_id, req.query),
-            groups=[],
-            pages=[],
-            events=[],
+        # Search all sources concurrently
+        names = list(self.sources)
+        results = await asyncio.gather(
+            *(self.search_source(name, req) for name in names),
+            return_exceptions=True,
         )
+
+        # Collect results, re-raise unexpected errors
+        response = {'groups': [], 'pages': [], 'events': [], 'timed_out': []}
+        for (name, result) in zip(names, results):
+            if isinstance(result, asyncio.TimeoutError):
+                response[name] = []
+                response['timed_out'].append(name)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                response[name] = result
+        return GenericSearchResponse(**response)
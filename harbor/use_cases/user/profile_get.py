@@ -25,7 +25,14 @@ class GetProfileByUsernameRequest(GetProfileRequestBase):
     username: str
 
 
-GetProfileRequest = Union[GetProfileByIDRequest, GetProfileByUsernameRequest]
+class GetProfileOfUserRequest(GetProfileRequestBase):
+    '''Request a user profile of an already fetched user'''
+    user: User
+
+
+GetProfileRequest = Union[GetProfileByIDRequest,
+                          GetProfileByUsernameRequest,
+                          GetProfileOfUserRequest]
 
 
 class UserNotFoundError(Exception):
@@ -55,6 +62,10 @@ class GetProfileUseCase:
             user = await self.user_repo.get(req.user_id)
         elif isinstance(req, GetProfileByUsernameRequest):
             user = await self.user_repo.get_by_username(req.username.lower())
+        elif isinstance(req, GetProfileOfUserRequest):
+            user = req.user
+        else:
+            raise TypeError(f'Unsupported profile request: {type(req).__name__}')
 
         # User not found
         if not user:
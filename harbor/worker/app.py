@@ -1,6 +1,7 @@
 '''This module creates a new Celery application'''
 
 import logging
+from typing import Any, List, Tuple
 
 from celery import Celery
 
@@ -12,9 +13,13 @@ app = Celery(
     include=[
         'harbor.worker.scheduler',
         'harbor.worker.tasks.email',
+        'harbor.worker.tasks.notifications',
         'harbor.worker.tasks.stats',
     ])
 
+# Wait for the broker to confirm published tasks
+app.conf.broker_transport_options = {'confirm_publish': True}
+
 
 def queue_task(task_name, args):
     '''Queue a Celery task'''
@@ -30,5 +35,16 @@ def queue_task(task_name, args):
     logging.debug(message, task_name)
 
 
+def publish_tasks(tasks: List[Tuple[str, List[Any]]]):
+    '''Publish multiple Celery tasks over one broker connection
+
+    Blocks until all tasks are confirmed by the broker.
+    '''
+    with app.producer_or_acquire() as producer:
+        for (task_name, args) in tasks:
+            app.send_task(task_name, args=args, producer=producer)
+    logging.debug('%s Celery tasks successfully added to queue', len(tasks))
+
+
 if __name__ == '__main__':
     app.start()
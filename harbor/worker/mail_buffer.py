@@ -0,0 +1,88 @@
+'''This module coalesces outgoing mails into batch tasks
+
+Mails are held for a short delay and queued as one "send_mail_batch" task,
+which the worker delivers over a single SMTP session. This saves a broker
+message and an SMTP handshake per mail during registration waves.
+Callers don't wait for the batch, so a request takes the same time whether
+it sends a mail or not. Batches which can't be queued are logged.
+'''
+
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Dict, List, Set
+
+from harbor.domain.email import EmailMsg
+from harbor.helpers.settings import get_settings
+from harbor.worker.outbox import enqueue_task
+
+
+class MailBuffer:
+    '''Groups mails queued within a delay into batches'''
+
+    def __init__(self, max_size: int, max_delay: float):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.pending: List[Dict] = []
+        self.flush_handle: asyncio.TimerHandle = None
+        self.flushing: Set[asyncio.Future] = set()
+
+    def add(self, msg: EmailMsg):
+        '''Adds a mail, which is queued when the batch is full or the delay expires
+
+        Returns immediately, the batch is queued in the background.
+        '''
+        self.pending.append(msg.dict())
+        if len(self.pending) >= self.max_size or self.max_delay <= 0:
+            self.flush_in_background()
+        elif self.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self.flush_handle = loop.call_later(self.max_delay, self.flush_in_background)
+
+    def flush_in_background(self):
+        '''Queues all pending mails as a single batch task without waiting'''
+        batch = self.take_pending()
+        if batch:
+            future = asyncio.ensure_future(self.queue_batch(batch))
+            self.flushing.add(future)
+            future.add_done_callback(self.flushing.discard)
+
+    async def flush(self):
+        '''Queues all pending mails as a single batch task'''
+        batch = self.take_pending()
+        if batch:
+            await self.queue_batch(batch)
+
+    def take_pending(self) -> List[Dict]:
+        '''Returns and removes pending mails, cancels the delayed flush'''
+        if self.flush_handle:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        (batch, self.pending) = (self.pending, [])
+        return batch
+
+    @staticmethod
+    async def queue_batch(batch: List[Dict]):
+        '''Queues a batch task, errors are logged and the mails are dropped'''
+        try:
+            await enqueue_task('harbor.worker.tasks.email.send_mail_batch', [batch])
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s: Failed to queue batch of %s mails', __name__, len(batch))
+
+    async def close(self):
+        '''Queues pending mails and waits for batches queued in the background'''
+        await self.flush()
+        if self.flushing:
+            await asyncio.wait(set(self.flushing))
+
+
+@lru_cache(maxsize=None)
+def get_mail_buffer() -> MailBuffer:
+    '''Returns the mail buffer of this process'''
+    settings = get_settings()
+    return MailBuffer(settings.EMAIL_BATCH_SIZE, settings.EMAIL_BATCH_DELAY_SECONDS)
+
+
+def queue_mail(msg: EmailMsg):
+    '''Queues a mail for sending in the next batch, without waiting for the batch'''
+    get_mail_buffer().add(msg)
@@ -0,0 +1,280 @@
+'''This module queues Celery tasks without blocking the event loop
+
+Tasks are put in a bounded in-process outbox. A background task publishes
+them in batches over one broker connection, in a thread, and waits for
+publisher confirms. If the broker is unavailable, tasks are delayed and
+retried instead of failing the request.
+
+With a durable outbox, tasks are stored in Mongo first and removed after
+publishing. Stored tasks are claimed with a lease, which the outbox renews
+while they wait to be published. Tasks of which the lease expired, e.g. of
+a crashed process, are claimed and published by another API worker. Tasks
+are then delivered at least once. Without durability, tasks which weren't
+published on close are stored, so another API worker publishes them.
+'''
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from harbor.domain.outbox import OutboxTask
+from harbor.helpers.settings import get_settings
+from harbor.repository.base import TaskOutboxRepo
+from harbor.worker.app import publish_tasks, queue_task
+
+PublishFunc = Callable[[List[Tuple[str, List[Any]]]], None]
+
+
+class TaskOutboxFullError(Exception):
+    '''Too many tasks are waiting to be published'''
+
+
+@dataclass
+class TaskOutboxMetrics:
+    '''Counters of a task outbox'''
+    published: int = 0
+    publish_errors: int = 0
+    recovered: int = 0
+    saved_on_close: int = 0
+    last_publish_seconds: float = 0.0
+    last_latency_seconds: float = 0.0
+
+
+class TaskClaims:
+    '''Stored tasks claimed by an outbox
+
+    A claim is a lease which expires after "lease", unless it's renewed.
+    '''
+
+    def __init__(self, lease: timedelta):
+        self.lease = lease
+        self.repo: TaskOutboxRepo = None
+        self.durable = False
+        self.claimer_id = uuid.uuid4().hex
+        self.task_ids: Set[str] = set()
+
+    async def refresh(self):
+        '''Renews the claims of tasks waiting to be published'''
+        if self.task_ids:
+            await self.repo.refresh_claims(list(self.task_ids), self.claimer_id)
+
+    async def claim_stale(self, limit: int) -> List[OutboxTask]:
+        '''Claims tasks of which the lease expired'''
+        tasks = await self.repo.claim_stale(self.lease, limit, self.claimer_id)
+        return [task for task in tasks if task.id not in self.task_ids]
+
+    async def remove(self, task_ids: List[str]):
+        '''Removes published tasks'''
+        self.task_ids.difference_update(task_ids)
+        await self.repo.remove(task_ids)
+
+
+class TaskOutbox:
+    '''Bounded queue of tasks, published in the background'''
+
+    def __init__(self, max_size: int = 10000, batch_size: int = 100,
+                 publish: PublishFunc = publish_tasks,
+                 recover_after: timedelta = timedelta(seconds=60)):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.publish_func = publish
+        self.claims = TaskClaims(recover_after)
+        self.queue: asyncio.Queue = None
+        self.workers: List[asyncio.Task] = []
+        self.metrics = TaskOutboxMetrics()
+
+    @property
+    def running(self) -> bool:
+        '''Outbox is started and not closed'''
+        return bool(self.workers)
+
+    async def start(self, repo: TaskOutboxRepo = None, durable: bool = True):
+        '''Starts publishing
+
+        With repo, stale tasks of the repo are published, and tasks which
+        weren't published on close are stored. With durable, tasks are
+        stored in repo until published.
+        '''
+        self.claims.repo = repo
+        self.claims.durable = durable and repo is not None
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self.workers = [asyncio.ensure_future(self.publish_forever())]
+        if repo:
+            self.workers.append(asyncio.ensure_future(self.recover_forever()))
+
+    async def close(self, timeout: float = 5):
+        '''Publishes pending tasks within timeout and stops publishing
+
+        Tasks which weren't published in time are left to other processes.
+        '''
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning('%s: Closed with %s unpublished tasks', __name__, self.queue.qsize())
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        unpublished = []
+        while not self.queue.empty():
+            unpublished.append(self.queue.get_nowait())
+            self.queue.task_done()
+        await self.save_unpublished(unpublished)
+
+    async def enqueue(self, task_name: str, args: List[Any]):
+        '''Adds a task to the outbox
+
+        Raises:
+            TaskOutboxFullError: Outbox is full and tasks aren't stored in repo
+        '''
+        task = OutboxTask(task_name=task_name, args=list(args))
+        if self.claims.durable:
+            task.id = await self.claims.repo.add(task, self.claims.claimer_id)
+        try:
+            self.queue.put_nowait(task)
+        except asyncio.QueueFull as error:
+            if task.id:
+                # Stored task will be recovered
+                logging.warning('%s: Outbox is full, task "%s" is delayed', __name__, task_name)
+                return
+            raise TaskOutboxFullError(
+                f'{self.max_size} tasks waiting to be published') from error
+        if task.id:
+            self.claims.task_ids.add(task.id)
+
+    async def publish_forever(self):
+        '''Publishes tasks in batches until cancelled'''
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.publish(batch)
+            except asyncio.CancelledError:
+                await self.save_unpublished(batch)
+                raise
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def publish(self, batch: List[OutboxTask]):
+        '''Publishes a batch, retries with backoff until it succeeds or is cancelled'''
+        loop = asyncio.get_running_loop()
+        tasks = [(task.task_name, task.args) for task in batch]
+        delay = 0.5
+        while True:
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.publish_func, tasks)
+                break
+            except Exception:  # pylint: disable=broad-except
+                self.metrics.publish_errors += 1
+                logging.exception('%s: Failed to publish %s tasks, retry in %ss',
+                                  __name__, len(batch), delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+        # Update metrics
+        self.metrics.published += len(batch)
+        self.metrics.last_publish_seconds = time.perf_counter() - start
+        oldest = min(task.created_on for task in batch)
+        self.metrics.last_latency_seconds = (datetime.now(timezone.utc) - oldest).total_seconds()
+
+        # Remove published tasks from repo
+        task_ids = [task.id for task in batch if task.id]
+        if task_ids:
+            try:
+                await self.claims.remove(task_ids)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('%s: Failed to remove %s published tasks',
+                                  __name__, len(task_ids))
+
+    async def save_unpublished(self, tasks: List[OutboxTask]):
+        '''Stores tasks which weren't published on close, so another process publishes them
+
+        Stored tasks are already in the repo, their claims expire.
+        '''
+        tasks = [task for task in tasks if not task.id]
+        if not tasks:
+            return
+        if self.claims.repo is None:
+            logging.error('%s: Dropped %s unpublished tasks: %s', __name__, len(tasks),
+                          [task.task_name for task in tasks])
+            return
+        try:
+            for task in tasks:
+                await self.claims.repo.add(task)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception('%s: Failed to store %s unpublished tasks', __name__, len(tasks))
+            return
+        self.metrics.saved_on_close += len(tasks)
+        logging.warning('%s: Stored %s unpublished tasks for recovery', __name__, len(tasks))
+
+    async def recover_forever(self):
+        '''Renews claims and queues stale tasks of the repo until cancelled
+
+        Runs twice per lease, so claims are renewed before they expire.
+        '''
+        while True:
+            try:
+                await self.claims.refresh()
+                await self.recover()
+            except Exception:  # pylint: disable=broad-except
+                logging.exception('%s: Failed to recover tasks', __name__)
+            await asyncio.sleep(self.claims.lease.total_seconds() / 2)
+
+    async def recover(self):
+        '''Queues tasks of which the claim expired'''
+        free = self.max_size - self.queue.qsize()
+        if free <= 0:
+            return
+        for task in await self.claims.claim_stale(min(free, self.batch_size)):
+            self.queue.put_nowait(task)
+            self.claims.task_ids.add(task.id)
+            self.metrics.recovered += 1
+
+    def dict(self) -> Dict:
+        '''Returns metrics as dictionary'''
+        return {
+            'running': self.running,
+            'durable': self.claims.durable,
+            'depth': self.queue.qsize() if self.queue else 0,
+            'max_size': self.max_size,
+            **asdict(self.metrics),
+        }
+
+
+@lru_cache(maxsize=None)
+def get_task_outbox() -> TaskOutbox:
+    '''Returns process wide task outbox'''
+    settings = get_settings()
+    return TaskOutbox(
+        max_size=settings.TASK_OUTBOX_SIZE,
+        batch_size=settings.TASK_OUTBOX_BATCH_SIZE,
+        recover_after=timedelta(seconds=settings.TASK_OUTBOX_RECOVER_SECONDS),
+    )
+
+
+async def enqueue_task(task_name: str, args: List[Any]):
+    '''Queues a Celery task without blocking the event loop
+
+    Without started outbox, e.g. in scripts, the task is published directly
+    in a thread.
+
+    Raises:
+        TaskOutboxFullError: Outbox is full
+    '''
+    outbox = get_task_outbox()
+    if outbox.running:
+        await outbox.enqueue(task_name, args)
+    else:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, queue_task, task_name, args)
@@ -0,0 +1,126 @@
+'''This module provides the async runtime of a worker process
+
+Each worker process keeps one event loop, one database client and one set
+of repositories for its whole lifetime. They are created when Celery starts
+the process, so async tasks don't pay for connecting on every run. Without
+prefork pool, the runtime is started on the first task.
+'''
+
+import asyncio
+import logging
+import threading
+from functools import lru_cache
+from typing import Awaitable, Callable
+
+from celery.signals import worker_process_init, worker_process_shutdown
+
+from harbor.helpers.hub import get_hub
+from harbor.repository.base import RepoDict
+from harbor.repository.mongo import (
+    common as mongo_common,
+    notifications as mongo_notif,
+    stats as mongo_stats,
+    users as mongo_user,
+)
+from harbor.worker.app import app
+
+
+class WorkerRuntime:
+    '''Long-lived event loop and repositories of a worker process'''
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop = None
+        self.client = None
+        self.repos: RepoDict = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        '''Creates the event loop, database client and repositories
+
+        Indexes aren't created here, as Celery kills processes which don't
+        start in time. They are created by the API on startup or by the
+        migrate command (python -m harbor.repository.mongo.migrate).
+        '''
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+        if self.client is None:
+            self.client = mongo_common.create_db_client()
+        self.repos = {
+            'notification': mongo_notif.NotificationMongoRepo(self.client),
+            'stats': mongo_stats.StatsMongoRepo(self.client),
+            'user': mongo_user.UserMongoRepo(self.client),
+        }
+        logging.info('%s: Worker runtime started', __name__)
+
+    def run(self, coroutine_func: Callable[..., Awaitable], *args, **kwargs):
+        '''Runs coroutine_func(repos, *args, **kwargs) on the event loop of the process
+
+        Tasks of a threads pool are run one at a time. Notifications published
+        in the background by the task are sent before it returns.
+        '''
+        with self.lock:
+            if not self.repos:
+                self.start()
+            try:
+                return self.loop.run_until_complete(coroutine_func(self.repos, *args, **kwargs))
+            finally:
+                self.loop.run_until_complete(get_hub().wait_published())
+
+    def close(self):
+        '''Closes database client and event loop'''
+        if self.client:
+            self.client.close()
+        if self.loop:
+            self.loop.close()
+        self.loop = None
+        self.client = None
+        self.repos = {}
+
+
+@lru_cache(maxsize=None)
+def get_runtime() -> WorkerRuntime:
+    '''Returns the runtime of this worker process'''
+    return WorkerRuntime()
+
+
+@worker_process_init.connect
+def start_runtime(**_):
+    '''Starts the runtime when a worker process starts'''
+    try:
+        get_runtime().start()
+    except Exception:  # pylint: disable=broad-except
+        logging.exception('%s: Failed to start worker runtime, retry on first task', __name__)
+
+
+@worker_process_shutdown.connect
+def close_runtime(**_):
+    '''Closes the runtime when a worker process stops'''
+    get_runtime().close()
+
+
+def async_task(func: Callable = None, **options):
+    '''Turns a coroutine function into a Celery task
+
+    The coroutine runs on the event loop of the worker process and receives
+    the shared repositories as first argument. Options are passed to app.task.
+
+    Usage:
+        @async_task
+        async def my_task(repos: RepoDict, arg1, arg2):
+            ...
+    '''
+    def decorator(coroutine_func: Callable):
+        def run(*args, **kwargs):
+            return get_runtime().run(coroutine_func, *args, **kwargs)
+
+        # Task name and docs are derived from the coroutine function
+        run.__name__ = coroutine_func.__name__
+        run.__qualname__ = coroutine_func.__qualname__
+        run.__module__ = coroutine_func.__module__
+        run.__doc__ = coroutine_func.__doc__
+        return app.task(**options)(run)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -8,10 +8,14 @@ from harbor.worker.app import app
 
 
 app.conf.beat_schedule = {
-    'count-users-at-midnight': {
-        'task': 'harbor.worker.tasks.stats.count_active_users',
+    'collect-readings-at-midnight': {
+        'task': 'harbor.worker.tasks.stats.collect_readings',
         'schedule': crontab(minute="0", hour="0"),
     },
+    'reconcile-unread-counts-hourly': {
+        'task': 'harbor.worker.tasks.notifications.reconcile_unread_counts',
+        'schedule': crontab(minute="30"),
+    },
 }
 
 
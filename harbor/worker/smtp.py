@@ -0,0 +1,166 @@
+'''This module provides a pool of SMTP connections per worker process
+
+Connecting, STARTTLS and login are done once per connection instead of once
+per mail. Idle connections are checked with NOOP before reuse and replaced
+if the server dropped them. Connections are closed after a maximum number of
+messages, as most mail servers limit messages per session.
+'''
+
+import logging
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from functools import lru_cache
+
+from celery.signals import worker_process_shutdown
+
+from harbor.domain.email import EmailSecurity
+from harbor.helpers.settings import get_settings
+
+
+class PooledConnection:
+    '''SMTP connection with usage statistics'''
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        '''Closes connection, ignoring errors of dropped connections'''
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+
+class SMTPPool:
+    '''Pool of logged in SMTP connections
+
+    Settings are read once on creation of the pool.
+    '''
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.idle = queue.LifoQueue(maxsize=self.settings.EMAIL_POOL_SIZE)
+        self.lock = threading.Lock()
+        self.connects = 0
+
+    def connect(self) -> PooledConnection:
+        '''Opens a new logged in connection'''
+        settings = self.settings
+
+        # Use SMTP_SSL class if TLS/SSL is enabled
+        if settings.EMAIL_SECURITY == EmailSecurity.TLS_SSL:
+            SMTP = smtplib.SMTP_SSL
+        else:
+            SMTP = smtplib.SMTP
+
+        smtp = SMTP(settings.EMAIL_HOSTNAME, settings.EMAIL_PORT)
+        try:
+            # Start STARTTLS if enabled
+            if settings.EMAIL_SECURITY == EmailSecurity.STARTTLS:
+                smtp.starttls()
+                smtp.ehlo()
+
+            # Login if required
+            password = settings.EMAIL_PASSWORD.get_secret_value()
+            if settings.EMAIL_USERNAME or password:
+                smtp.login(settings.EMAIL_USERNAME, password)
+        except BaseException:
+            smtp.close()
+            raise
+
+        with self.lock:
+            self.connects += 1
+        return PooledConnection(smtp)
+
+    def is_alive(self, conn: PooledConnection) -> bool:
+        '''Checks with NOOP if a connection which was idle too long is still open'''
+        if time.monotonic() - conn.last_used < self.settings.EMAIL_KEEPALIVE_SECONDS:
+            return True
+        try:
+            return conn.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self) -> PooledConnection:
+        '''Returns an open idle connection or a new one'''
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                return self.connect()
+            if self.is_alive(conn):
+                return conn
+            conn.close()
+
+    def release(self, conn: PooledConnection):
+        '''Returns a connection to the pool or closes it if used up or pool is full'''
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.settings.EMAIL_MAX_MESSAGES_PER_CONNECTION:
+            conn.close()
+            return
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        '''Provides a pooled connection
+
+        Connection is discarded if the server disconnected or a socket error
+        occurs. It's reused after errors on a single message, like a refused
+        recipient.
+        '''
+        conn = self.acquire()
+        try:
+            yield conn
+        except smtplib.SMTPServerDisconnected:
+            conn.close()
+            raise
+        except smtplib.SMTPException:
+            self.release(conn)
+            raise
+        except OSError:
+            conn.close()
+            raise
+        self.release(conn)
+
+    def send_message(self, msg: EmailMessage):
+        '''Sends a message, reconnects once if the connection was dropped'''
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    conn.smtp.send_message(msg)
+                    conn.sent += 1
+                    return
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as error:
+                if attempt:
+                    raise
+                logging.info('%s: SMTP connection dropped, reconnecting: %s', __name__, error)
+
+    def close(self):
+        '''Closes all idle connections'''
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+@lru_cache(maxsize=None)
+def get_smtp_pool() -> SMTPPool:
+    '''Returns the SMTP pool of this process'''
+    return SMTPPool()
+
+
+@worker_process_shutdown.connect
+def close_smtp_pool(**_):
+    '''Closes pooled SMTP connections when a worker process stops'''
+    if get_smtp_pool.cache_info().currsize:
+        get_smtp_pool().close()
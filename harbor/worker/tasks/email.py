@@ -1,14 +1,16 @@
 '''This module contains email tasks for Celery'''
 # pylint: disable=no-member
 
+import logging
 import smtplib
 from email.headerregistry import Address
 from email.message import EmailMessage
-from typing import Dict
+from typing import Dict, List
 
-from harbor.domain.email import EmailMsg, EmailSecurity
+from harbor.domain.email import EmailMsg
 from harbor.helpers.settings import get_settings
 from harbor.worker.app import app
+from harbor.worker.smtp import get_smtp_pool
 
 
 def get_address(name: str, email: str) -> Address:
@@ -17,45 +19,86 @@ def get_address(name: str, email: str) -> Address:
     return Address(name, email_parts[0], email_parts[1])
 
 
+def build_message(msg: EmailMsg) -> EmailMessage:
+    '''Returns a multipart text and HTML message'''
+    settings = get_settings()
+    smtp_msg = EmailMessage()
+    smtp_msg['Subject'] = msg.subject
+    smtp_msg['From'] = get_address(settings.EMAIL_FROM.name,
+                                   settings.EMAIL_FROM.email)
+    smtp_msg['To'] = get_address(msg.to_name, msg.to_email)
+    smtp_msg.set_content(msg.text)
+    smtp_msg.add_alternative(msg.html, subtype='html')
+    return smtp_msg
+
+
 @app.task
 def send_mail(msg_dict: Dict):
-    '''Sends a mail
+    '''Sends a mail over a pooled SMTP connection
 
     Arguments
         msg: EmailMsg formatted as Dict
     '''
-    # Parse message
     msg = EmailMsg(**msg_dict)
+    get_smtp_pool().send_message(build_message(msg))
+
+
+def is_temporary(error: Exception) -> bool:
+    '''Returns True if sending might succeed later'''
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for (code, _) in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
 
-    # Get settings
+@app.task
+def send_mail_batch(msg_dicts: List[Dict], attempt: int = 0) -> Dict:
+    '''Sends mails over a single pooled SMTP session
+
+    A failing mail doesn't fail the batch. Mails which failed temporarily are
+    retried in a new batch with backoff. Mails which failed permanently are
+    logged and dropped. If the server is unreachable, remaining mails are
+    retried without trying them one by one.
+
+    Arguments
+        msg_dicts: List of EmailMsg formatted as Dict
+        attempt: Number of previous attempts
+
+    Returns
+        Dict: Count of sent, retried and failed mails
+    '''
     settings = get_settings()
+    pool = get_smtp_pool()
+    report = {'sent': 0, 'retried': 0, 'failed': 0}
+    retry = []
+    for (index, msg_dict) in enumerate(msg_dicts):
+        try:
+            pool.send_message(build_message(EmailMsg(**msg_dict)))
+        except (smtplib.SMTPException, OSError, ValueError) as error:
+            if not is_temporary(error) or attempt >= settings.EMAIL_BATCH_MAX_RETRIES:
+                report['failed'] += 1
+                logging.error('%s: Failed to send mail "%s" to %s: %r', __name__,
+                              msg_dict.get('subject'), msg_dict.get('to_email'), error)
+            elif isinstance(error, (smtplib.SMTPResponseException,
+                                    smtplib.SMTPRecipientsRefused)):
+                retry.append(msg_dict)
+            else:
+                # Server is unavailable
+                logging.warning('%s: SMTP server unavailable: %r', __name__, error)
+                retry.extend(msg_dicts[index:])
+                break
+        else:
+            report['sent'] += 1
 
-    # Build message
-    smtp_msg = EmailMessage()
-    smtp_msg['Subject'] = msg.subject
-    smtp_msg['From'] = get_address(settings.EMAIL_FROM.name,
-                                   settings.EMAIL_FROM.email)
-    smtp_msg['To'] = get_address(msg.to_name, msg.to_email)
-    smtp_msg.set_content(msg.text)
-    smtp_msg.add_alternative(msg.html, subtype='html')
+    if retry:
+        report['retried'] = len(retry)
+        send_mail_batch.apply_async(
+            (retry, attempt + 1),
+            countdown=settings.EMAIL_RETRY_DELAY_SECONDS * 2 ** attempt,
+        )
 
-    # Use SMTP_SSL class if TLS/SSL is enabled
-    if settings.EMAIL_SECURITY == EmailSecurity.TLS_SSL:
-        SMTP = smtplib.SMTP_SSL
-    else:
-        SMTP = smtplib.SMTP
-
-    with SMTP(settings.EMAIL_HOSTNAME, settings.EMAIL_PORT) as smtp:
-        # Start STARTTLS if enabled
-        if settings.EMAIL_SECURITY == EmailSecurity.STARTTLS:
-            smtp.starttls()
-            smtp.ehlo()
-
-        # Login if required
-        username = settings.EMAIL_USERNAME
-        password = settings.EMAIL_PASSWORD.get_secret_value()
-        if username or password:
-            smtp.login(username, password)
-
-        # Send message
-        smtp.send_message(smtp_msg)
+    logging.info('%s: Mail batch attempt %s: %r', __name__, attempt, report)
+    return report
@@ -0,0 +1,54 @@
+'''This module contains notification tasks for Celery'''
+
+import logging
+import time
+from typing import Dict, List
+
+from harbor.domain.common import ObjectIdStr
+from harbor.domain.notification import NotificationTemplate
+from harbor.helpers.settings import get_settings
+from harbor.repository.base import RepoDict
+from harbor.worker.runtime import async_task
+
+
+@async_task
+async def reconcile_unread_counts(repos: RepoDict):
+    '''Repairs drifted unread notification counters'''
+    corrected = await repos['notification'].reconcile_unread_counts()
+    logging.info('%s: Corrected %s unread notification counters', __name__, corrected)
+    return corrected
+
+
+@async_task
+async def fan_out_notification(repos: RepoDict,
+                               recipient_ids: List[ObjectIdStr],
+                               template_dict: Dict,
+                               batch_size: int = None) -> Dict:
+    '''Sends a notification to many users in batches
+
+    Arguments
+        recipient_ids: User IDs of recipients
+        template_dict: NotificationTemplate formatted as Dict
+        batch_size: Notifications per insert, defaults to NOTIFICATION_INSERT_CHUNK_SIZE
+
+    Returns
+        Dict: Inserted notifications, duration and throughput
+    '''
+    template = NotificationTemplate(**template_dict)
+    batch_size = batch_size or get_settings().NOTIFICATION_INSERT_CHUNK_SIZE
+    inserted = 0
+    start = time.perf_counter()
+    for offset in range(0, len(recipient_ids), batch_size):
+        batch = recipient_ids[offset:offset + batch_size]
+        notifs = [template.for_user(user_id) for user_id in batch]
+        inserted += len(await repos['notification'].add_many(notifs, chunk_size=batch_size))
+    seconds = time.perf_counter() - start
+
+    report = {
+        'recipients': len(recipient_ids),
+        'inserted': inserted,
+        'seconds': round(seconds, 3),
+        'per_second': round(inserted / seconds) if seconds else inserted,
+    }
+    logging.info('%s: Fan out notification "%s": %s', __name__, template.title, report)
+    return report
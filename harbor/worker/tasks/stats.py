@@ -1,39 +1,131 @@
-'''This module contains stats tasks for Celery'''
+'''This module contains stats tasks for Celery
+
+Each reading subject has a collector, registered with the "collector"
+decorator. A collector receives the repositories and returns the value
+of its reading. All collectors of a beat tick run concurrently on the
+repositories of the worker runtime and their readings are stored with a
+single bulk write.
+'''
 
 import asyncio
-from datetime import datetime, timezone
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple
 
 from harbor.domain.stats import Reading, ReadingSubject
-from harbor.repository.mongo.stats import StatsMongoRepo
-from harbor.repository.mongo.users import UserMongoRepo
-from harbor.worker.app import app
+from harbor.repository.base import RepoDict
+from harbor.worker.runtime import async_task
 
 
-async def async_count_active_users():
-    '''Count and store active users'''
-    # Fetch active users
-    count = 0
-    async with UserMongoRepo() as user_repo:
-        count = await user_repo.count_active_users()
-        print(count)
+class Collector(NamedTuple):
+    '''Function which returns the value of a reading and its unit'''
+    func: Callable[[RepoDict], Awaitable[int]]
+    unit: str
 
-    # Create reading
-    today = datetime.now(timezone.utc)
-    reading = Reading(
-        datetime=datetime(today.year, today.month, today.day),
-        subject=ReadingSubject.ACTIVE_USERS,
-        value=count,
-        unit="users",
+
+COLLECTORS: Dict[ReadingSubject, Collector] = {}
+
+
+def collector(subject: ReadingSubject, unit: str):
+    '''Registers decorated function as collector for a reading subject'''
+    def register(func: Callable[[RepoDict], Awaitable[int]]):
+        COLLECTORS[subject] = Collector(func, unit)
+        return func
+    return register
+
+
+@collector(ReadingSubject.ACTIVE_USERS, unit='users')
+async def count_active_users(repos: RepoDict):
+    '''Counts users which logged in during the last 30 days'''
+    return await repos['user'].count_active_users()
+
+
+@collector(ReadingSubject.LOGINS, unit='users')
+async def count_logins(repos: RepoDict):
+    '''Counts users which logged in during the last day'''
+    return await repos['user'].count_active_users(from_=timedelta(days=-1))
+
+
+@collector(ReadingSubject.REGISTRATIONS, unit='users')
+async def count_registrations(repos: RepoDict):
+    '''Counts users which registered during the last day'''
+    return await repos['user'].count_registrations(from_=timedelta(days=-1))
+
+
+@collector(ReadingSubject.NOTIFICATIONS_SENT, unit='notifications')
+async def count_notifications_sent(repos: RepoDict):
+    '''Counts notifications sent during the last day'''
+    return await repos['notification'].count_added(from_=timedelta(days=-1))
+
+
+async def run_collector(subject: ReadingSubject, repos: RepoDict):
+    '''Runs a single collector
+
+    Returns
+        Tuple: Value of the reading and duration in seconds
+    '''
+    start = time.perf_counter()
+    value = await COLLECTORS[subject].func(repos)
+    return (value, time.perf_counter() - start)
+
+
+@async_task
+async def collect_readings(repos: RepoDict, subjects: Iterable[str] = None) -> Dict:
+    '''Runs collectors concurrently and stores their readings
+
+    See async_collect_readings.
+    '''
+    return await async_collect_readings(repos, subjects)
+
+
+# Deprecated: Runs tasks queued under the name used before collect_readings,
+# e.g. during a rolling deploy. Remove in the next release.
+@async_task(name='harbor.worker.tasks.stats.count_active_users')
+async def count_active_users_task(repos: RepoDict) -> Dict:
+    '''Counts and stores active users'''
+    return await async_collect_readings(repos, [ReadingSubject.ACTIVE_USERS.value])
+
+
+async def async_collect_readings(repos: RepoDict, subjects: Iterable[str] = None) -> Dict:
+    '''Runs collectors concurrently and stores their readings
+
+    A failing collector is logged and skipped, other readings are stored.
+
+    Arguments
+        subjects: Reading subjects to collect, defaults to all registered
+
+    Returns
+        Dict: Value and duration in seconds or error per subject
+    '''
+    subjects = [ReadingSubject(subject) for subject in subjects or COLLECTORS]
+    results = await asyncio.gather(
+        *(run_collector(subject, repos) for subject in subjects),
+        return_exceptions=True,
     )
 
-    # Save reading
-    async with StatsMongoRepo() as stats_repo:
-        await stats_repo.upsert(reading)
+    # Create readings
+    today = datetime.now(timezone.utc)
+    readings = []
+    report = {}
+    for (subject, result) in zip(subjects, results):
+        if isinstance(result, Exception):
+            logging.error('%s: Collector "%s" failed', __name__, subject.value,
+                          exc_info=result)
+            report[subject.value] = {'error': repr(result)}
+            continue
 
+        (value, seconds) = result
+        logging.info('%s: Collected "%s" in %.3fs: %s',
+                     __name__, subject.value, seconds, value)
+        report[subject.value] = {'value': value, 'seconds': seconds}
+        readings.append(Reading(
+            datetime=datetime(today.year, today.month, today.day),
+            subject=subject,
+            value=value,
+            unit=COLLECTORS[subject].unit,
+        ))
 
-@app.task
-def count_active_users():
-    '''Count and store active users'''
-    # Make synchronous
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(async_count_active_users())
+    # Save readings
+    await repos['stats'].upsert_many(readings)
+    return report
@@ -0,0 +1,42 @@
+'''Unit tests for notification domain'''
+
+from datetime import datetime, timezone
+
+import pytest
+
+from harbor.domain.notification import NotificationCursor
+
+
+def test_success_cursor_roundtrip():
+    '''Should decode an encoded cursor to the same position'''
+    cursor = NotificationCursor(
+        created_on=datetime(2020, 4, 26, 19, 39, 36, 6000, timezone.utc),
+        id='5ea5d4cb8322e417540fb555',
+    )
+    encoded = cursor.encode()
+    assert encoded == '1587929976006-5ea5d4cb8322e417540fb555'
+    assert NotificationCursor.decode(encoded) == cursor
+
+
+def test_success_cursor_naive_datetime():
+    '''Should treat naive datetimes from MongoDB as UTC'''
+    cursor = NotificationCursor(
+        created_on=datetime(2020, 4, 26, 19, 39, 36, 6000),
+        id='5ea5d4cb8322e417540fb555',
+    )
+    assert cursor.encode() == '1587929976006-5ea5d4cb8322e417540fb555'
+
+
+@pytest.mark.parametrize('encoded', [
+    '',
+    'invalid',
+    '1587929976006',
+    'abc-5ea5d4cb8322e417540fb555',
+    '1587929976006-invalid',
+    '1587929976006-5ea5d4cb8322e417540fb555-1',
+    '99999999999999999999-5ea5d4cb8322e417540fb555',
+])
+def test_fail_cursor_decode(encoded):
+    '''Should raise ValueError on invalid cursors'''
+    with pytest.raises(ValueError):
+        NotificationCursor.decode(encoded)
@@ -0,0 +1,26 @@
+'''Unit tests for stats domain'''
+
+from datetime import datetime, timezone
+
+import pytest
+
+from harbor.domain.stats import ReadingAggregationTimespan as AggTimespan
+
+
+@pytest.mark.parametrize('timespan,value,start,end', [
+    (AggTimespan.WEEK, datetime(2020, 5, 10, 15, 9), datetime(2020, 5, 4), datetime(2020, 5, 11)),
+    (AggTimespan.WEEK, datetime(2020, 5, 11), datetime(2020, 5, 11), datetime(2020, 5, 18)),
+    (AggTimespan.MONTH, datetime(2020, 5, 10, 15, 9), datetime(2020, 5, 1), datetime(2020, 6, 1)),
+    (AggTimespan.MONTH, datetime(2020, 12, 31), datetime(2020, 12, 1), datetime(2021, 1, 1)),
+    (AggTimespan.YEAR, datetime(2020, 5, 10, 15, 9), datetime(2020, 1, 1), datetime(2021, 1, 1)),
+])
+def test_bucket_start_end(timespan, value, start, end):
+    '''Should return start and end of the bucket containing value'''
+    assert timespan.bucket_start(value) == start
+    assert timespan.bucket_end(value) == end
+
+
+def test_bucket_keeps_timezone():
+    '''Should keep timezone of aware datetimes'''
+    value = datetime(2020, 5, 10, 15, 9, tzinfo=timezone.utc)
+    assert AggTimespan.MONTH.bucket_start(value) == datetime(2020, 5, 1, tzinfo=timezone.utc)
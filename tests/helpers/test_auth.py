@@ -6,25 +6,59 @@ from unittest import mock
 
 import jwt
 import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
 
 from harbor.domain.token import AccessTokenData
 from harbor.helpers import auth
 from harbor.helpers.settings import get_settings
 
 
+@pytest.fixture(autouse=True)
+def fixture_clear_token_cache():
+    '''Clears the verified token cache between tests'''
+    auth.get_token_cache().clear()
+    yield
+    auth.get_token_cache().clear()
+
+
 def test_password_hash_roundtrip():
     '''Should be able to hash password and compare if equal'''
     hash_ = auth.get_password_hash("SecurePassword")
     assert auth.verify_password("SecurePassword", hash_)
 
 
+@pytest.mark.asyncio
+async def test_password_hash_async_roundtrip():
+    '''Should be able to hash password and compare in the hash pool'''
+    try:
+        hash_ = await auth.get_password_hash_async("SecurePassword")
+        assert await auth.verify_password_async("SecurePassword", hash_)
+        assert not await auth.verify_password_async("WrongPassword", hash_)
+    finally:
+        auth.shutdown_hash_executor()
+
+
+@pytest.mark.asyncio
+async def test_password_hash_async_busy(monkeypatch):
+    '''Should refuse hashing jobs if queue is full'''
+    monkeypatch.setattr(auth, 'HASH_METRICS', auth.HashMetrics())
+    settings = get_settings()
+    auth.HASH_METRICS.in_flight = (settings.PASSWORD_HASH_WORKERS +
+                                   settings.PASSWORD_HASH_QUEUE_SIZE)
+
+    with pytest.raises(auth.PasswordHasherBusyError):
+        await auth.get_password_hash_async("SecurePassword")
+    assert auth.HASH_METRICS.rejected == 1
+
+
 @pytest.mark.asyncio
 @mock.patch('harbor.helpers.auth.jwt.encode')
-@mock.patch('harbor.helpers.auth.get_jwt_key')
-async def test_create_access_token_with_defaults(get_jwt_key, jwt_encode, freezer):
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_create_access_token_with_defaults(get_keyring, jwt_encode, freezer):
     '''Should return an access token'''
     # Create mocks
-    get_jwt_key.return_value = 'test-private-key'
+    get_keyring.return_value.get_signing_key.return_value = ('test-kid', 'test-private-key')
     jwt_encode.return_value = 'test-access-token'
 
     # Get settings
@@ -35,7 +69,6 @@ async def test_create_access_token_with_defaults(get_jwt_key, jwt_encode, freeze
 
     # Assert results
     assert token == 'test-access-token'
-    get_jwt_key.assert_called_with('private')
     jwt_encode.assert_called_with(
         {
             'sub': 'user:test-user-id',
@@ -44,16 +77,17 @@ async def test_create_access_token_with_defaults(get_jwt_key, jwt_encode, freeze
         },
         'test-private-key',
         algorithm=settings.JWT_ALG,
+        headers={'kid': 'test-kid'},
     )
 
 
 @pytest.mark.asyncio
 @mock.patch('harbor.helpers.auth.jwt.encode')
-@mock.patch('harbor.helpers.auth.get_jwt_key')
-async def test_create_access_token_with_expire(get_jwt_key, jwt_encode, freezer):
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_create_access_token_with_expire(get_keyring, jwt_encode, freezer):
     '''Should return an access token'''
     # Create mocks
-    get_jwt_key.return_value = 'test-private-key'
+    get_keyring.return_value.get_signing_key.return_value = ('test-kid', 'test-private-key')
     jwt_encode.return_value = 'test-access-token'
 
     # Get settings
@@ -65,7 +99,6 @@ async def test_create_access_token_with_expire(get_jwt_key, jwt_encode, freezer)
 
     # Assert results
     assert token == 'test-access-token'
-    get_jwt_key.assert_called_with('private')
     jwt_encode.assert_called_with(
         {
             'sub': 'user:test-user-id',
@@ -73,16 +106,17 @@ async def test_create_access_token_with_expire(get_jwt_key, jwt_encode, freezer)
         },
         'test-private-key',
         algorithm=settings.JWT_ALG,
+        headers={'kid': 'test-kid'},
     )
 
 
 @pytest.mark.asyncio
 @mock.patch('harbor.helpers.auth.jwt.decode')
-@mock.patch('harbor.helpers.auth.get_jwt_key')
-async def test_success_validate_access_token(get_jwt_key, jwt_decode):
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_success_validate_access_token(get_keyring, jwt_decode):
     '''Should return an access token'''
     # Create mocks
-    get_jwt_key.return_value = 'test-public-key'
+    get_keyring.return_value.get_verify_key.return_value = 'test-public-key'
     jwt_decode.return_value = {'sub': 'user:507f1f77bcf86cd799439011'}
 
     # Get settings
@@ -92,7 +126,7 @@ async def test_success_validate_access_token(get_jwt_key, jwt_decode):
     data = await auth.validate_access_token(token='test-jwt-token')
 
     # Assert results
-    get_jwt_key.assert_called_with('public')
+    get_keyring.return_value.get_verify_key.assert_called_with('test-jwt-token')
     jwt_decode.assert_called_with(
         'test-jwt-token',
         'test-public-key',
@@ -105,11 +139,11 @@ async def test_success_validate_access_token(get_jwt_key, jwt_decode):
 
 @pytest.mark.asyncio
 @mock.patch('harbor.helpers.auth.jwt.decode')
-@mock.patch('harbor.helpers.auth.get_jwt_key')
-async def test_fail_invalid_token_jwt_error(get_jwt_key, jwt_decode):
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_fail_invalid_token_jwt_error(get_keyring, jwt_decode):
     '''Should throw InvalidTokenError'''
     # Create mocks
-    get_jwt_key.return_value = 'test-public-key'
+    get_keyring.return_value.get_verify_key.return_value = 'test-public-key'
     jwt_decode.side_effect = jwt.PyJWTError
 
     # Get settings
@@ -120,7 +154,7 @@ async def test_fail_invalid_token_jwt_error(get_jwt_key, jwt_decode):
         await auth.validate_access_token(token='test-jwt-token')
 
     # Assert results
-    get_jwt_key.assert_called_with('public')
+    get_keyring.return_value.get_verify_key.assert_called_with('test-jwt-token')
     jwt_decode.assert_called_with(
         'test-jwt-token',
         'test-public-key',
@@ -134,11 +168,11 @@ async def test_fail_invalid_token_jwt_error(get_jwt_key, jwt_decode):
     {'sub': 'user:invalid'},
 ])
 @mock.patch('harbor.helpers.auth.jwt.decode')
-@mock.patch('harbor.helpers.auth.get_jwt_key')
-async def test_fail_invalid_token_other(get_jwt_key, jwt_decode, payload):
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_fail_invalid_token_other(get_keyring, jwt_decode, payload):
     '''Should throw InvalidTokenError'''
     # Create mocks
-    get_jwt_key.return_value = 'test-public-key'
+    get_keyring.return_value.get_verify_key.return_value = 'test-public-key'
     jwt_decode.return_value = payload
 
     # Get settings
@@ -149,9 +183,125 @@ async def test_fail_invalid_token_other(get_jwt_key, jwt_decode, payload):
         await auth.validate_access_token(token='test-jwt-token')
 
     # Assert results
-    get_jwt_key.assert_called_with('public')
+    get_keyring.return_value.get_verify_key.assert_called_with('test-jwt-token')
     jwt_decode.assert_called_with(
         'test-jwt-token',
         'test-public-key',
         algorithms=[settings.JWT_ALG],
     )
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.helpers.auth.jwt.decode')
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_validate_access_token_cached(get_keyring, jwt_decode):
+    '''Should only verify the token once until it expires'''
+    # Create mocks
+    get_keyring.return_value.get_verify_key.return_value = 'test-public-key'
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    jwt_decode.return_value = {
+        'sub': 'user:507f1f77bcf86cd799439011',
+        'exp': int(expires_at.timestamp()),
+    }
+
+    # Call function twice
+    data = await auth.validate_access_token(token='test-jwt-token')
+    data2 = await auth.validate_access_token(token='test-jwt-token')
+
+    # Assert results
+    assert data == data2 == AccessTokenData(
+        user_id='507f1f77bcf86cd799439011',
+        expires_on=datetime.fromtimestamp(int(expires_at.timestamp()), timezone.utc),
+    )
+    jwt_decode.assert_called_once()
+    assert auth.get_token_cache().hits == 1
+    assert auth.get_token_cache().misses == 1
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.helpers.auth.jwt.decode')
+@mock.patch('harbor.helpers.auth.get_keyring')
+async def test_validate_access_token_cached_copy(get_keyring, jwt_decode):
+    '''Should not share cached token data with callers'''
+    # Create mocks
+    get_keyring.return_value.get_verify_key.return_value = 'test-public-key'
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    jwt_decode.return_value = {
+        'sub': 'user:507f1f77bcf86cd799439011',
+        'exp': int(expires_at.timestamp()),
+    }
+
+    # Mutate results
+    data = await auth.validate_access_token(token='test-jwt-token')
+    data.user_id = '507f1f77bcf86cd799439012'
+    data2 = await auth.validate_access_token(token='test-jwt-token')
+    data2.user_id = '507f1f77bcf86cd799439013'
+    data3 = await auth.validate_access_token(token='test-jwt-token')
+
+    # Assert results
+    assert data3.user_id == '507f1f77bcf86cd799439011'
+
+
+def test_token_cache_expiry_and_eviction(freezer):
+    '''Should drop expired tokens and evict least recently used tokens'''
+    cache = auth.VerifiedTokenCache(maxsize=2)
+    data = AccessTokenData(user_id='507f1f77bcf86cd799439011')
+    now = datetime.now(timezone.utc).timestamp()
+
+    # Expired token
+    cache.add('token-expired', data, now - 1)
+    assert cache.get('token-expired') is None
+
+    # Evict least recently used token
+    cache.add('token-1', data, now + 60)
+    cache.add('token-2', data, now + 60)
+    assert cache.get('token-1') == data
+    cache.add('token-3', data, now + 60)
+    assert cache.get('token-2') is None
+    assert cache.get('token-1') == data
+    assert cache.get('token-3') == data
+
+
+def write_key_pair(path, private_key):
+    '''Writes private and public key as PEM files'''
+    (path / 'private.pem').write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    (path / 'public.pem').write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('jwt_alg', ['ES512', 'EdDSA', 'HS256', 'HS512'])
+async def test_access_token_roundtrip(jwt_alg, monkeypatch, tmp_path):
+    '''Should sign and verify tokens with the configured algorithm'''
+    # Prepare keys
+    if jwt_alg == 'ES512':
+        write_key_pair(tmp_path, ec.generate_private_key(ec.SECP521R1()))
+    elif jwt_alg == 'EdDSA':
+        write_key_pair(tmp_path, ed25519.Ed25519PrivateKey.generate())
+    else:
+        (tmp_path / 'secret.key').write_text('test-hmac-secret-' + 'x' * 64)
+
+    # Configure algorithm
+    monkeypatch.setenv("JWT_ALG", jwt_alg)
+    monkeypatch.setenv("JWT_KEY_PATH", str(tmp_path))
+    monkeypatch.setenv("JWT_VERIFY_CACHE_SIZE", "0")
+    for cached in (get_settings, auth.get_keyring, auth.get_token_cache):
+        cached.cache_clear()
+
+    try:
+        # Sign and verify token
+        token = await auth.create_access_token(user_id='507f1f77bcf86cd799439011')
+        data = await auth.validate_access_token(token)
+        assert data.user_id == '507f1f77bcf86cd799439011'
+        assert data.expires_on > datetime.now(timezone.utc)
+        assert jwt.get_unverified_header(token) == {'alg': jwt_alg, 'kid': 'default', 'typ': 'JWT'}
+    finally:
+        monkeypatch.undo()
+        for cached in (get_settings, auth.get_keyring, auth.get_token_cache):
+            cached.cache_clear()
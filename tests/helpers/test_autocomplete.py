@@ -0,0 +1,160 @@
+'''Unit tests for autocomplete helpers'''
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from harbor.domain.user import BaseUser
+from harbor.helpers import autocomplete
+from harbor.helpers.settings import get_settings
+from harbor.repository.base import ChangeFeedUnsupportedError, UserRepo
+
+
+def make_user(num: int, display_name: str) -> BaseUser:
+    '''Returns a user with a predictable ID'''
+    return BaseUser(id=f'507f1f77bcf86cd7994390{num:02}', display_name=display_name)
+
+
+@pytest.fixture(name='index')
+def fixture_index():
+    '''Returns an index with test users'''
+    index = autocomplete.AutocompleteIndex()
+    index.build([
+        make_user(1, 'HarborMaster'),
+        make_user(2, 'harbor'),
+        make_user(3, 'Other'),
+        make_user(4, 'Harbinger'),
+    ])
+    return index
+
+
+def test_search_prefix(index):
+    '''Should return prefix matches sorted by username'''
+    result = index.search('HARB')
+    assert [user.username for user in result] == ['harbinger', 'harbor', 'harbormaster']
+    assert result[2] == make_user(1, 'HarborMaster')
+
+
+def test_search_limit_and_exclude(index):
+    '''Should exclude the requester and stop at the limit'''
+    result = index.search('harb', limit=2, exclude_id='507f1f77bcf86cd799439004')
+    assert [user.username for user in result] == ['harbor', 'harbormaster']
+    assert index.search('unknown') == []
+
+
+def test_search_ranks(index):
+    '''Should return ranked users first, lowest rank first'''
+    ranks = {
+        '507f1f77bcf86cd799439001': 0,
+        '507f1f77bcf86cd799439003': 0,
+        '507f1f77bcf86cd799439002': 1,
+        '507f1f77bcf86cd799439099': 0,
+    }
+    result = index.search('harb', ranks=ranks)
+    assert [user.username for user in result] == ['harbormaster', 'harbor', 'harbinger']
+    assert result[0] == make_user(1, 'HarborMaster')
+
+    result = index.search('harbor', ranks=ranks)
+    assert [user.username for user in result] == ['harbormaster', 'harbor']
+
+    result = index.search('harb', limit=1, exclude_id='507f1f77bcf86cd799439001', ranks=ranks)
+    assert [user.username for user in result] == ['harbor']
+
+
+def test_upsert_and_remove(index):
+    '''Should apply incremental changes'''
+    index.upsert(make_user(5, 'Harbour'))
+    index.upsert(make_user(2, 'Harb'))
+    index.remove('507f1f77bcf86cd799439001')
+    index.remove('507f1f77bcf86cd799439099')
+
+    result = index.search('harb')
+    assert [user.username for user in result] == ['harb', 'harbinger', 'harbour']
+    assert len(index) == 4
+    assert index.keys == sorted(index.keys)
+
+
+def test_interned_keys(index):
+    '''Should share strings between username and lowercase display name'''
+    pos = index.keys.index('harbor')
+    assert index.names[pos] is index.keys[pos]
+
+
+@pytest.mark.asyncio
+async def test_keep_fresh_change_feed():
+    '''Should load users and apply changes from the change feed since before the load'''
+    since = []
+
+    async def iter_verified():
+        yield make_user(1, 'Harbor')
+
+    async def watch_verified(start_at):
+        since.append(start_at)
+        yield ('507f1f77bcf86cd799439002', make_user(2, 'Harbinger'))
+        yield ('507f1f77bcf86cd799439001', None)
+        raise asyncio.CancelledError()
+
+    user_repo = mock.Mock(UserRepo)
+    user_repo.iter_verified = iter_verified
+    user_repo.watch_verified = watch_verified
+
+    index = autocomplete.AutocompleteIndex()
+    before = datetime.now(timezone.utc)
+    with pytest.raises(asyncio.CancelledError):
+        await autocomplete.keep_user_index_fresh(index, user_repo)
+    assert index.ready
+    assert [user.username for user in index.search('harb')] == ['harbinger']
+    assert since[0] <= before - autocomplete.WATCH_OVERLAP + timedelta(seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_keep_fresh_retry(monkeypatch):
+    '''Should mark index not ready, then reload and watch again if watching fails'''
+    errors = [RuntimeError('Test'), asyncio.CancelledError()]
+    ready_on_load = []
+
+    async def load_user_index(index, _):
+        ready_on_load.append(index.ready)
+        index.build([])
+
+    async def watch_verified(_):
+        raise errors.pop(0)
+        yield  # pylint: disable=unreachable
+
+    user_repo = mock.Mock(UserRepo)
+    user_repo.watch_verified = watch_verified
+    monkeypatch.setattr(autocomplete, 'load_user_index', load_user_index)
+    monkeypatch.setattr(autocomplete, 'RETRY_SECONDS', 0)
+
+    index = autocomplete.AutocompleteIndex()
+    with pytest.raises(asyncio.CancelledError):
+        await autocomplete.keep_user_index_fresh(index, user_repo)
+    assert ready_on_load == [False, False]
+    assert not errors
+
+
+@pytest.mark.asyncio
+async def test_keep_fresh_fallback(monkeypatch):
+    '''Should rebuild periodically if the change feed is unsupported'''
+    async def watch_verified(_):
+        raise ChangeFeedUnsupportedError('not a replica set')
+        yield  # pylint: disable=unreachable
+
+    user_repo = mock.Mock(UserRepo)
+    user_repo.watch_verified = watch_verified
+    monkeypatch.setenv("USER_AUTOCOMPLETE_REFRESH_SECONDS", "0")
+    get_settings.cache_clear()
+    load = mock.AsyncMock(side_effect=[None, None, asyncio.CancelledError])
+    monkeypatch.setattr(autocomplete, 'load_user_index', load)
+
+    try:
+        index = autocomplete.AutocompleteIndex()
+        with pytest.raises(asyncio.CancelledError):
+            await autocomplete.keep_user_index_fresh(index, user_repo)
+        assert load.call_count == 3
+        load.assert_called_with(index, user_repo)
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
@@ -0,0 +1,42 @@
+'''Unit tests for cache helpers'''
+
+from datetime import timedelta
+
+from harbor.helpers.cache import TTLCache
+
+
+def test_ttl_cache_expiry(freezer):
+    '''Should drop values after TTL'''
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+
+    freezer.tick(timedelta(seconds=61))
+    assert cache.get('key') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_cache_eviction():
+    '''Should evict least recently used values'''
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('key1', 'value1')
+    cache.set('key2', 'value2')
+    assert cache.get('key1') == 'value1'
+    cache.set('key3', 'value3')
+
+    assert cache.get('key2') is None
+    assert cache.get('key1') == 'value1'
+    assert cache.get('key3') == 'value3'
+
+
+def test_ttl_cache_delete_and_disabled():
+    '''Should delete values and store nothing if disabled'''
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('key', 'value')
+    cache.delete('key')
+    cache.delete('unknown')
+    assert cache.get('key') is None
+
+    disabled = TTLCache(maxsize=2, ttl=0)
+    disabled.set('key', 'value')
+    assert disabled.get('key') is None
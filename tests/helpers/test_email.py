@@ -1,5 +1,7 @@
 '''Unit tests for Email helpers'''
 
+import pytest
+
 from harbor.helpers import email
 
 
@@ -43,3 +45,57 @@ def test_prepare_reset_password():
     assert 'test-user-id' in msg.html
     assert 'test-secret' in msg.html
     assert '{' not in msg.html
+
+
+def test_precompile():
+    '''Should replace static placeholders and keep others'''
+    result = email.precompile('{{literal}} {url}/{path!r:>5} {token}',
+                              {'url': 'https://kh.test/{x}'})
+    assert result == '{{literal}} https://kh.test/{{x}}/{path!r:>5} {token}'
+    assert result.format(path='a', token='b') == "{literal} https://kh.test/{x}/  'a' b"
+
+
+def test_precompile_conversion():
+    '''Should apply conversions of static placeholders like str.format'''
+    template = '{name!r} {name!s:>6} {name!a}'
+    static = {'name': 'Zoë'}
+    assert email.precompile(template, static) == template.format(**static)
+    with pytest.raises(ValueError):
+        email.precompile('{name!x}', static)
+
+
+@pytest.fixture(name='engine')
+def fixture_engine(tmp_path):
+    '''Returns an engine with a template in English and Dutch'''
+    for (language, greeting) in (('en', 'Hello'), ('nl', 'Hallo')):
+        (tmp_path / f'test.{language}.subject').write_text(f'{greeting} {{name}}\n')
+        (tmp_path / f'test.{language}.txt').write_text(f'{greeting} {{name}}, visit {{url}}')
+        (tmp_path / f'test.{language}.html').write_text(
+            f'<p>{greeting} {{name}}, visit {{url}}</p>')
+    return email.TemplateEngine(tmp_path, static={'url': 'https://kh.test/?a=1&b=2'})
+
+
+@pytest.mark.parametrize('language,expected', [
+    ('nl', 'Hallo'),
+    ('en', 'Hello'),
+    ('fr', 'Hello'),
+    (None, 'Hello'),
+])
+def test_template_engine_language(engine, language, expected):
+    '''Should render the language variant or fall back to the default language'''
+    msg = engine.render('test', 'test-user', 'user@kh.test', {'name': 'Test'}, language)
+    assert msg.subject == f'{expected} Test'
+    assert msg.text == f'{expected} Test, visit https://kh.test/?a=1&b=2'
+
+
+def test_template_engine_escapes_html(engine):
+    '''Should escape values and static values in the HTML part only'''
+    msg = engine.render('test', 'test-user', 'user@kh.test', {'name': '<b>Test</b>'})
+    assert msg.text == 'Hello <b>Test</b>, visit https://kh.test/?a=1&b=2'
+    assert msg.html == '<p>Hello &lt;b&gt;Test&lt;/b&gt;, visit https://kh.test/?a=1&amp;b=2</p>'
+
+
+def test_template_engine_unknown(engine):
+    '''Should raise KeyError on unknown template'''
+    with pytest.raises(KeyError):
+        engine.get('unknown')
@@ -0,0 +1,151 @@
+'''Unit tests for notification hub helpers'''
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from harbor.domain.notification import Notification
+from harbor.helpers import hub
+from harbor.helpers.settings import get_settings
+
+
+@pytest.fixture(name='notif')
+def fixture_notif():
+    '''Returns a basic notification'''
+    return Notification(
+        id='5ea5d4cb8322e417540fb555',
+        user_id='5e7f656765f1b64f3f7f6900',
+        title='Test notif',
+        description='Test notif desc',
+        icon='https://kh.test/icon',
+        link='https://kh.test/link',
+    )
+
+
+@pytest.mark.asyncio
+async def test_publish_fan_out(notif):
+    '''Should deliver notifications to all streams of the user only'''
+    notif_hub = hub.NotificationHub()
+    await notif_hub.start()
+
+    async with notif_hub.subscribe('5e7f656765f1b64f3f7f6900') as queue1, \
+            notif_hub.subscribe('5e7f656765f1b64f3f7f6900') as queue2, \
+            notif_hub.subscribe('5e7f656765f1b64f3f7f6999') as queue_other:
+        assert notif_hub.dict() == {'users': 2, 'streams': 3, 'dropped': 0}
+        await notif_hub.publish(notif)
+
+        assert Notification.parse_raw(queue1.get_nowait()) == notif
+        assert Notification.parse_raw(queue2.get_nowait()) == notif
+        assert queue_other.empty()
+
+    # Streams are removed on exit
+    assert notif_hub.dict() == {'users': 0, 'streams': 0, 'dropped': 0}
+    await notif_hub.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_stream_drops_oldest():
+    '''Should drop the oldest message if a stream is full'''
+    notif_hub = hub.NotificationHub(queue_size=2)
+    async with notif_hub.subscribe('5e7f656765f1b64f3f7f6900') as queue:
+        for i in range(3):
+            await notif_hub.deliver('5e7f656765f1b64f3f7f6900', f'msg{i}')
+        assert [queue.get_nowait(), queue.get_nowait()] == ['msg1', 'msg2']
+    assert notif_hub.dropped == 1
+
+
+@pytest.mark.asyncio
+async def test_broker_delivers_to_hub(notif):
+    '''Should publish through the broker and deliver received messages'''
+    broker = mock.AsyncMock(hub.Broker)
+    notif_hub = hub.NotificationHub(broker=broker)
+    await notif_hub.start()
+    broker.start.assert_called_with(notif_hub.deliver)
+
+    await notif_hub.publish(notif)
+    broker.publish.assert_called_with('5e7f656765f1b64f3f7f6900', notif.json())
+
+
+@pytest.mark.asyncio
+async def test_publish_in_background(notif):
+    '''Should publish without waiting for the broker and ignore failures'''
+    published = asyncio.Event()
+
+    async def publish(*_):
+        await published.wait()
+        raise ConnectionError()
+
+    broker = mock.AsyncMock(hub.Broker)
+    broker.publish_many.side_effect = publish
+    notif_hub = hub.NotificationHub(broker=broker)
+
+    notif_hub.publish_in_background([notif])
+    assert len(notif_hub.publishing) == 1
+
+    published.set()
+    await notif_hub.wait_published()
+    broker.publish_many.assert_called_once_with([(notif.user_id, notif.json())])
+    assert not notif_hub.publishing
+
+
+@pytest.mark.asyncio
+async def test_broker_publish_many():
+    '''Should publish each message by default'''
+    broker = hub.InMemoryBroker()
+    broker.publish = mock.AsyncMock()
+    await broker.publish_many([('a', 'x'), ('b', 'y')])
+    assert broker.publish.call_args_list == [mock.call('a', 'x'), mock.call('b', 'y')]
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.helpers.hub.get_hub')
+async def test_publish_notifications(get_hub, notif):
+    '''Should publish on the process wide hub in the background'''
+    hub.publish_notifications([notif, notif])
+    get_hub.return_value.publish_in_background.assert_called_once_with([notif, notif])
+    hub.publish_notifications([])
+    get_hub.return_value.publish_in_background.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_amqp_broker_fan_out(notif):
+    '''Should deliver notifications published by any process to the hubs of all workers'''
+    # 2 API workers and a publishing Celery worker, sharing the in-memory transport
+    exchange = 'harbor.test-notifications'
+    hubs = [hub.NotificationHub(hub.AMQPBroker('memory://', exchange)) for _ in range(2)]
+    publisher = hub.NotificationHub(hub.AMQPBroker('memory://', exchange))
+    for notif_hub in hubs:
+        await notif_hub.start()
+
+    try:
+        async with hubs[0].subscribe(notif.user_id) as queue1, \
+                hubs[1].subscribe(notif.user_id) as queue2:
+            await asyncio.sleep(0.2)
+            await publisher.publish(notif)
+            await publisher.publish_many([notif, notif])
+
+            for queue in (queue1, queue2):
+                for _ in range(3):
+                    payload = await asyncio.wait_for(queue.get(), 5)
+                    assert Notification.parse_raw(payload) == notif
+    finally:
+        for notif_hub in hubs:
+            await notif_hub.close()
+
+
+@pytest.mark.parametrize('url,broker_class', [
+    ('', hub.AMQPBroker),
+    ('local', hub.InMemoryBroker),
+])
+def test_get_hub_broker(monkeypatch, url, broker_class):
+    '''Should fan out over RabbitMQ by default'''
+    monkeypatch.setenv('NOTIFICATION_BROKER_URL', url)
+    get_settings.cache_clear()
+    hub.get_hub.cache_clear()
+    try:
+        assert isinstance(hub.get_hub().broker, broker_class)
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
+        hub.get_hub.cache_clear()
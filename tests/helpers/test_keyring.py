@@ -0,0 +1,134 @@
+'''Unit tests for JWT keyring helper'''
+
+import os
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519
+
+from harbor.helpers import keyring
+
+
+def write_key_pair(path, kid, mtime):
+    '''Writes a new Ed25519 key pair for the key ID'''
+    private_key = ed25519.Ed25519PrivateKey.generate()
+    prefix = '' if kid == keyring.DEFAULT_KID else f'{kid}.'
+    private_file = path / f'{prefix}private.pem'
+    private_file.write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+    public_file = path / f'{prefix}public.pem'
+    public_file.write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+    for key_file in (private_file, public_file):
+        os.utime(key_file, (mtime, mtime))
+
+
+def sign(ring, payload, algorithm='EdDSA'):
+    '''Signs a payload with the current signing key'''
+    (kid, key) = ring.get_signing_key()
+    return jwt.encode(payload, key, algorithm=algorithm, headers={'kid': kid})
+
+
+@pytest.mark.parametrize('filename,expected', [
+    ('private.pem', ('default', 'private')),
+    ('2020-06.public.pem', ('2020-06', 'public')),
+    ('v1.2.secret.key', ('v1.2', 'secret')),
+    ('README', ('', '')),
+])
+def test_split_key_filename(filename, expected):
+    '''Should extract key ID and key type from filename'''
+    assert keyring.split_key_filename(filename) == expected
+
+
+def test_keyring_rotation(tmp_path):
+    '''Should sign with newest key and verify with all known keys'''
+    write_key_pair(tmp_path, keyring.DEFAULT_KID, 1000)
+    ring = keyring.JWTKeyring('EdDSA', tmp_path)
+    old_token = sign(ring, {'sub': 'old'})
+    assert ring.get_signing_key()[0] == keyring.DEFAULT_KID
+
+    # Nothing changed => No reload
+    assert not ring.reload()
+
+    # Add newer key
+    write_key_pair(tmp_path, '2020-06', 2000)
+    assert ring.reload()
+    new_token = sign(ring, {'sub': 'new'})
+    assert ring.get_signing_key()[0] == '2020-06'
+
+    # Both tokens are valid
+    for token in (old_token, new_token):
+        jwt.decode(token, ring.get_verify_key(token), algorithms=['EdDSA'])
+
+    # Retire old key
+    (tmp_path / 'private.pem').unlink()
+    (tmp_path / 'public.pem').unlink()
+    assert ring.reload()
+    with pytest.raises(keyring.UnknownKeyError):
+        ring.get_verify_key(old_token)
+
+
+def test_keyring_rotation_across_workers(tmp_path):
+    '''Should verify tokens of a new key before the next periodic reload'''
+    write_key_pair(tmp_path, keyring.DEFAULT_KID, 1000)
+    signing_ring = keyring.JWTKeyring('EdDSA', tmp_path)
+    verifying_ring = keyring.JWTKeyring('EdDSA', tmp_path)
+
+    # Only the signing worker reloaded the new key
+    write_key_pair(tmp_path, '2020-06', 2000)
+    assert signing_ring.reload()
+    token = sign(signing_ring, {'sub': 'new'})
+    assert jwt.decode(token, verifying_ring.get_verify_key(token),
+                      algorithms=['EdDSA']) == {'sub': 'new'}
+    assert verifying_ring.get_signing_key()[0] == keyring.DEFAULT_KID
+
+    # Lookups of unknown key IDs are rate limited
+    write_key_pair(tmp_path, '2020-07', 3000)
+    assert signing_ring.reload()
+    token = sign(signing_ring, {'sub': 'newer'})
+    with pytest.raises(keyring.UnknownKeyError):
+        verifying_ring.get_verify_key(token)
+    verifying_ring._unknown_kid_loaded_at -= keyring.JWTKeyring.UNKNOWN_KID_RELOAD_SECONDS
+    assert verifying_ring.get_verify_key(token)
+
+
+def test_keyring_private_key_without_public_key(tmp_path):
+    '''Should only sign with keys which can be verified'''
+    write_key_pair(tmp_path, keyring.DEFAULT_KID, 1000)
+    ring = keyring.JWTKeyring('EdDSA', tmp_path)
+
+    # Deploy private key before public key
+    write_key_pair(tmp_path, '2020-06', 2000)
+    (tmp_path / '2020-06.public.pem').unlink()
+    assert ring.reload()
+    assert ring.get_signing_key()[0] == keyring.DEFAULT_KID
+    token = sign(ring, {'sub': 'test'})
+    assert jwt.decode(token, ring.get_verify_key(token), algorithms=['EdDSA']) == {'sub': 'test'}
+
+
+def test_keyring_hmac_secret_file(tmp_path):
+    '''Should use secret files for HMAC algorithms'''
+    (tmp_path / 'secret.key').write_text('test-hmac-secret-' + 'x' * 64 + '\n')
+    ring = keyring.JWTKeyring('HS256', tmp_path)
+    token = sign(ring, {'sub': 'test'}, 'HS256')
+    assert jwt.decode(token, ring.get_verify_key(token), algorithms=['HS256']) == {'sub': 'test'}
+
+
+def test_keyring_hmac_secret_setting(tmp_path):
+    '''Should prefer shared secret from settings'''
+    ring = keyring.JWTKeyring('HS256', tmp_path, secret='test-hmac-secret-' + 'x' * 64)
+    token = jwt.encode({'sub': 'test'}, 'test-hmac-secret-' + 'x' * 64, algorithm='HS256')
+    assert jwt.decode(token, ring.get_verify_key(token), algorithms=['HS256']) == {'sub': 'test'}
+    assert not ring.reload()
+
+
+def test_keyring_without_keys(tmp_path):
+    '''Should fail if no signing key is available'''
+    with pytest.raises(FileNotFoundError):
+        keyring.JWTKeyring('EdDSA', tmp_path)
@@ -0,0 +1,105 @@
+'''Test cases for common Mongo module'''
+
+import uuid
+
+import pytest
+
+from harbor.helpers.settings import get_settings
+from harbor.repository.mongo import common
+
+
+@pytest.fixture(name='settings')
+def fixture_settings(monkeypatch):
+    '''Sets pool settings'''
+    monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "42")
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "3")
+    monkeypatch.setenv("MONGO_CONNECT_TIMEOUT_MS", "1500")
+    monkeypatch.setenv("MONGO_COMPRESSORS", "zlib")
+    get_settings.cache_clear()
+    yield get_settings()
+    monkeypatch.undo()
+    get_settings.cache_clear()
+
+
+@pytest.mark.usefixtures('settings')
+def test_create_db_client_pool_options():
+    '''Should configure the connection pool from settings'''
+    client = common.create_db_client()
+    pool_options = client.options.pool_options
+    assert pool_options.max_pool_size == 42
+    assert pool_options.min_pool_size == 3
+    assert pool_options.connect_timeout == 1.5
+    client.close()
+
+
+class DummyRepo(common.MongoBaseRepo):
+    '''Repository to test the base class'''
+
+    COLLECTION = 'dummy'
+
+    def __init__(self, client=None):
+        super().__init__(client)
+        self.index_calls = 0
+
+    async def __aenter__(self):
+        await self.prepare()
+        return self
+
+    async def ensure_indexes(self):
+        self.index_calls += 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('settings')
+async def test_repos_share_client():
+    '''Should only close clients owned by the repository'''
+    client = common.create_db_client()
+    repo = DummyRepo(client)
+    repo2 = DummyRepo(client)
+    assert repo.client is repo2.client
+    assert not repo.owns_client
+
+    own_repo = DummyRepo()
+    assert own_repo.owns_client
+    assert own_repo.client is not client
+
+    await repo.close()
+    await own_repo.close()
+    client.close()
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_migrate_once_per_schema_version(monkeypatch):
+    '''Should only create indexes if schema version isn't applied yet'''
+    appendix = str(uuid.uuid4()).replace('-', '')[:10]
+    monkeypatch.setenv("MONGO_DATABASE", f"test-kh-common-{appendix}")
+    get_settings.cache_clear()
+    repo = DummyRepo()
+
+    try:
+        assert await repo.migrate()
+        assert not await repo.migrate()
+        assert repo.index_calls == 1
+
+        # Forced or new schema version
+        assert await repo.migrate(force=True)
+        monkeypatch.setattr(repo, 'SCHEMA_VERSION', 2)
+        assert await repo.migrate()
+        assert repo.index_calls == 3
+    finally:
+        await repo.client.drop_database(repo.db)
+        await repo.close()
+
+
+@pytest.mark.asyncio
+async def test_skip_migrations(monkeypatch):
+    '''Should skip migrations on prepare if disabled'''
+    monkeypatch.setenv("MONGO_SKIP_MIGRATIONS", "True")
+    get_settings.cache_clear()
+    try:
+        async with DummyRepo() as repo:
+            assert repo.index_calls == 0
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
@@ -1,13 +1,14 @@
 '''Test cases for crud user module'''
-# pylint: disable=unused-argument
+# pylint: disable=unused-argument,protected-access
 
 import uuid
 from datetime import timedelta
 from typing import Dict
 
 import pytest
+from bson import ObjectId
 
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
 from harbor.helpers.settings import get_settings
 from harbor.repository.mongo.notifications import create_repo
 
@@ -98,6 +99,41 @@ async def test_historic_notifications(notif, notif_repo, is_read):
         assert notif_dict == result_dict
 
 
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_historic_notifications_pages(notif, notif_repo):
+    '''Tests to page through historic notifications with equal timestamps'''
+    # Store test notifications in database, two per timestamp
+    for i in range(6):
+        notif_copy = notif.copy()
+        notif_copy.title = f"Title{i}"
+        notif_copy.created_on -= timedelta(days=i // 2)
+        await notif_repo.add(notif_copy)
+
+    # Page through notifications
+    from_ = notif.created_on - timedelta(days=10)
+    to = notif.created_on
+    pages = []
+    before = None
+    while True:
+        page = await notif_repo.get_historic(
+            '5e7f656765f1b64f3f7f6900', from_, to, limit=4, before=before)
+        if not page:
+            break
+        pages.append(page)
+        before = NotificationCursor.from_notification(page[-1])
+
+    # Assert results
+    assert [len(page) for page in pages] == [4, 2]
+    titles = [result.title for page in pages for result in page]
+    assert sorted(titles) == [f"Title{i}" for i in range(6)]
+
+    streamed = [result async for result in notif_repo.iter_historic(
+        '5e7f656765f1b64f3f7f6900', from_, to)]
+    assert [result.id for result in streamed] == [
+        result.id for page in pages for result in page]
+
+
 @pytest.mark.mongo
 @pytest.mark.asyncio
 @pytest.mark.parametrize('is_read', [True, False])
@@ -135,6 +171,32 @@ async def test_search_notifications(notif, notif_repo, is_read, query, expected)
         assert notif_dict == result_dict
 
 
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_search_notifications_ranked(notif, notif_repo):
+    '''Tests to rank title matches first and page through results'''
+    # Store test notifications in database
+    for (title, description) in [
+            ("Other", "Harbor news"),
+            ("Harbor news", "Other"),
+            ("Other", "Other"),
+    ]:
+        notif_copy = notif.copy()
+        notif_copy.title = title
+        notif_copy.description = description
+        await notif_repo.add(notif_copy)
+
+    # Call repository
+    user_id = '5e7f656765f1b64f3f7f6900'
+    results = await notif_repo.get_search(user_id, 'harbor')
+    page2 = await notif_repo.get_search(user_id, 'harbor', limit=1, offset=1)
+
+    # Assert results
+    assert [result.title for result in results] == ["Harbor news", "Other"]
+    assert [result.description for result in page2] == ["Harbor news"]
+    assert await notif_repo.get_search(user_id, '.*') == []
+
+
 @pytest.mark.mongo
 @pytest.mark.asyncio
 @pytest.mark.parametrize('is_read', [True, False])
@@ -154,3 +216,68 @@ async def test_notification_set_read(notif, notif_repo, is_read):
     # Assert results
     for result in result_notifs:
         assert result.is_read == is_read
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_unread_count(notif, notif_repo):
+    '''Tests to maintain and reconcile the unread counter'''
+    user_id = '5e7f656765f1b64f3f7f6900'
+    assert await notif_repo.get_unread_count(user_id) == 0
+
+    # Add 3 unread and 1 read notifications
+    notif_ids = [await notif_repo.add(notif.copy()) for _ in range(3)]
+    read_notif = notif.copy()
+    read_notif.is_read = True
+    await notif_repo.add(read_notif)
+    assert await notif_repo.get_unread_count(user_id) == 3
+
+    # Mark as read twice, only changed notifications are counted
+    await notif_repo.set_read(user_id, notif_ids[:2], True)
+    await notif_repo.set_read(user_id, notif_ids[:2], True)
+    assert await notif_repo.get_unread_count(user_id) == 1
+
+    # Mark as unread
+    await notif_repo.set_read(user_id, notif_ids[:1], False)
+    assert await notif_repo.get_unread_count(user_id) == 2
+
+    # Repair drift
+    await notif_repo.counters.update_one({'_id': ObjectId(user_id)}, {'$set': {'unread': 99}})
+    assert await notif_repo.reconcile_unread_counts() == 1
+    assert await notif_repo.get_unread_count(user_id) == 2
+    assert await notif_repo.reconcile_unread_counts() == 0
+
+    # Skip counter changed since it was read
+    await notif_repo.counters.update_one({'_id': ObjectId(user_id)}, {'$set': {'unread': 99}})
+    assert await notif_repo._reconcile_batch({ObjectId(user_id): 98}) == 0
+    assert await notif_repo.get_unread_count(user_id) == 99
+
+    # Seed missing counter
+    await notif_repo.counters.delete_many({})
+    assert await notif_repo.reconcile_unread_counts() == 1
+    assert await notif_repo.get_unread_count(user_id) == 2
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_add_many(notif, notif_repo):
+    '''Tests to add notifications for multiple users in chunks'''
+    # Build notifications for 2 users
+    notifs = []
+    for i in range(5):
+        notif_copy = notif.copy()
+        notif_copy.user_id = f'5e7f656765f1b64f3f7f690{i % 2}'
+        notif_copy.is_read = i == 4
+        notifs.append(notif_copy)
+
+    # Call repository
+    notif_ids = await notif_repo.add_many(notifs, chunk_size=2)
+
+    # Assert results
+    assert len(set(notif_ids)) == 5
+    assert len(await notif_repo.get_recent('5e7f656765f1b64f3f7f6900')) == 3
+    assert len(await notif_repo.get_recent('5e7f656765f1b64f3f7f6901')) == 2
+    assert await notif_repo.get_unread_count('5e7f656765f1b64f3f7f6900') == 2
+    assert await notif_repo.get_unread_count('5e7f656765f1b64f3f7f6901') == 2
+    assert await notif_repo.count_added() == 5
+    assert await notif_repo.count_added(to=timedelta(days=-1)) == 0
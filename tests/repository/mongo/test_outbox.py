@@ -0,0 +1,60 @@
+'''Test cases for crud task outbox module'''
+# pylint: disable=unused-argument
+
+import uuid
+from datetime import timedelta
+
+import pytest
+
+from harbor.domain.outbox import OutboxTask
+from harbor.helpers.settings import get_settings
+from harbor.repository.mongo.outbox import create_repo
+
+
+@pytest.fixture(name='repo')
+async def fixture_repo(monkeypatch, event_loop):
+    '''Returns a temporary task outbox repo for testing'''
+    appendix = str(uuid.uuid4()).replace('-', '')[:10]
+    monkeypatch.setenv("MONGO_DATABASE", f"test-kh-task-outbox-{appendix}")
+    get_settings.cache_clear()
+    repo = await create_repo()
+    yield repo
+    repo.client.drop_database(repo.db)
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_outbox_roundtrip(repo):
+    '''Tests to store, claim and remove tasks'''
+    # Store tasks, one enqueued 2 minutes ago
+    stale = OutboxTask(task_name='test.task', args=[1])
+    stale.created_on -= timedelta(minutes=2)
+    stale_id = await repo.add(stale, 'crashed')
+    fresh_id = await repo.add(OutboxTask(task_name='test.task', args=[2]), 'live')
+
+    # Only stale task is claimed, and only once
+    claimed = await repo.claim_stale(timedelta(minutes=1), limit=10, claimer_id='other')
+    assert [task.id for task in claimed] == [stale_id]
+    assert claimed[0].args == [1]
+    assert await repo.claim_stale(timedelta(minutes=1), limit=10, claimer_id='other') == []
+    assert await repo.col.count_documents({'claimed_by': 'other'}) == 1
+
+    # Remove tasks
+    await repo.remove([stale_id, fresh_id])
+    assert await repo.col.count_documents({}) == 0
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_outbox_refresh_claims(repo):
+    '''Tests that renewed claims are not claimed by other processes'''
+    # Store tasks enqueued 2 minutes ago by a live and a crashed process
+    task = OutboxTask(task_name='test.task')
+    task.created_on -= timedelta(minutes=2)
+    live_id = await repo.add(task, 'live')
+    crashed_id = await repo.add(task, 'crashed')
+
+    # Only claims of the claimer are renewed
+    await repo.refresh_claims([live_id, crashed_id], 'live')
+    claimed = await repo.claim_stale(timedelta(minutes=1), limit=10, claimer_id='other')
+    assert [task.id for task in claimed] == [crashed_id]
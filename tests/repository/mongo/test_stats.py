@@ -103,3 +103,85 @@ async def test_stats_by_month(repo, reading):
 
     # Assert result
     assert result == expected
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+@pytest.mark.parametrize('timespan,operation,expected', [
+    (stats.ReadingAggregationTimespan.WEEK, stats.ReadingAggregationOperation.SUM, {
+        date(2020, 5, 4): 50,
+        date(2020, 5, 11): 60 + 70 + 80 + 90 + 100,
+    }),
+    (stats.ReadingAggregationTimespan.YEAR, stats.ReadingAggregationOperation.MINIMUM, {
+        date(2020, 1, 1): 50,
+    }),
+    (stats.ReadingAggregationTimespan.YEAR, stats.ReadingAggregationOperation.MAXIMUM, {
+        date(2020, 1, 1): 199,
+    }),
+])
+async def test_stats_rollups(repo, reading, timespan, operation, expected):
+    '''Tests to aggregate readings per week and year, including updates'''
+    # Insert readings, update the last one
+    await repo.upsert(reading)
+    last_reading = reading.copy()
+    await insert_readings(repo, last_reading)
+    last_reading.value = 199 if timespan == stats.ReadingAggregationTimespan.YEAR else 100
+    await repo.upsert(last_reading)
+
+    # Get aggregated result
+    time_since_reading = datetime.now(timezone.utc) - reading.datetime
+    result = await repo.get_aggregation(
+        subject=stats.ReadingSubject.ACTIVE_USERS,
+        timespan=timespan,
+        operation=operation,
+        from_=(-time_since_reading - timedelta(days=1)),
+        to=(-time_since_reading + timedelta(days=60)),
+    )
+
+    # Assert result
+    assert result.values == expected
+    assert result.operation == operation
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_stats_rebuild_rollups(repo, reading):
+    '''Tests to build rollups of existing readings'''
+    # Insert reading without rollups
+    await repo.col.insert_one(reading.dict())
+    await repo.migrate(force=True)
+
+    # Get aggregated result
+    time_since_reading = datetime.now(timezone.utc) - reading.datetime
+    result = await repo.get_by_month(
+        subject=stats.ReadingSubject.ACTIVE_USERS,
+        from_=(-time_since_reading - timedelta(days=1)),
+        to=-time_since_reading,
+    )
+    assert result.values == {date(2020, 5, 1): 50}
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_stats_upsert_listener(repo, reading):
+    '''Tests to notify listeners after an upsert'''
+    received = []
+    repo.add_upsert_listener(received.append)
+    await repo.upsert(reading)
+    assert received == [reading]
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_stats_upsert_many(repo, reading):
+    '''Tests to upsert multiple readings at once'''
+    readings = [
+        reading,
+        reading.copy(update={'subject': stats.ReadingSubject.REGISTRATIONS, 'value': 3}),
+    ]
+    await repo.upsert_many(readings)
+    await repo.upsert_many(readings)
+
+    assert await repo.col.count_documents({}) == 2
+    result = await repo.get_latest(stats.ReadingSubject.REGISTRATIONS)
+    assert result.value == 3
@@ -5,10 +5,20 @@ import uuid
 from datetime import datetime, timezone, timedelta
 
 import pytest
+from bson import ObjectId
 
 from harbor.domain.user import User, UserWithPassword, UserFlags, UserInfo
+from harbor.helpers.cache import TTLCache
 from harbor.helpers.settings import get_settings
-from harbor.repository.mongo.users import create_repo, UsernameTakenError, EmailTakenError
+from harbor.repository.mongo.users import (
+    create_repo,
+    trigrams,
+    UsernameTakenError,
+    EmailTakenError,
+)
+
+# Searching user which isn't stored
+REQUESTER = User(id='5e7f656765f1b64f3f7f6900', display_name='Requester')
 
 
 @pytest.fixture(name='repo')
@@ -83,7 +93,7 @@ async def test_user_verify_and_search(repo):
     assert expected2 == user2
 
     # Search users with own user
-    result = await repo.get_search(new_user.id, "test")
+    result = await repo.get_search(new_user, "test")
     result_user_ids = [user.id for user in result]
     assert len(result) == 1
     assert new_user.id not in result_user_ids
@@ -91,7 +101,7 @@ async def test_user_verify_and_search(repo):
     assert new_user3.id not in result_user_ids
 
     # Search users with other user
-    result = await repo.get_search(new_user3.id, "test")
+    result = await repo.get_search(new_user3, "test")
     result_user_ids = [user.id for user in result]
     assert len(result) == 2
     assert new_user.id in result_user_ids
@@ -111,12 +121,87 @@ async def test_user_search_limit(repo):
         await repo.set_flag(user_b.id, UserFlags.VERIFIED, True)
 
     # Search users
-    result = await repo.get_search('5e7f656765f1b64f3f7f6900', "TeStUsErA", 5)
+    result = await repo.get_search(REQUESTER, "TeStUsErA", 5)
     assert len(result) == 5
     assert all(("testusera" in user.username for user in result))
     assert not any(("testuserb" in user.username for user in result))
 
 
+def test_trigrams():
+    '''Should return unique substrings of 3 characters'''
+    assert trigrams("harbor") == ["arb", "bor", "har", "rbo"]
+    assert trigrams("aaaa") == ["aaa"]
+    assert trigrams("ab") == []
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_user_search_ranking(repo):
+    '''Tests ranking of exact, prefix and substring matches'''
+    # Insert users
+    for name in ["MyHarbor", "Harbor", "HarborMaster", "Other"]:
+        user = await repo.add(
+            display_name=name,
+            email=f"{name}@kh.test",
+            password_hash="test-password-hash",
+        )
+        await repo.set_flag(user.id, UserFlags.VERIFIED, True)
+
+    # Search users
+    result = await repo.get_search(REQUESTER, "Harbor")
+    assert [user.username for user in result] == ["harbor", "harbormaster", "myharbor"]
+
+    result = await repo.get_search(REQUESTER, "Harbor", limit=2)
+    assert [user.username for user in result] == ["harbor", "harbormaster"]
+
+    # Query is not a regex
+    assert await repo.get_search(REQUESTER, "harb.r") == []
+    assert await repo.get_search(REQUESTER, ".*") == []
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_user_search_friends_first(repo):
+    '''Tests ranking of friends and friends of friends in search'''
+    # Insert users
+    users = {}
+    for name in ["Me", "HarborA", "HarborB", "HarborC", "HarborD", "Friend"]:
+        user = await repo.add(
+            display_name=name,
+            email=f"{name}@kh.test",
+            password_hash="test-password-hash",
+        )
+        users[name] = await repo.set_flag(user.id, UserFlags.VERIFIED, True)
+
+    # Me => HarborC, Friend => HarborB
+    async def set_friends(name, *friends):
+        friend_ids = [users[friend].id for friend in friends]
+        await repo.col.update_one({'_id': ObjectId(users[name].id)},
+                                  {'$set': {'friends': friend_ids}})
+    await set_friends("Me", "HarborC", "Friend")
+    await set_friends("Friend", "Me", "HarborB")
+
+    # Assert network
+    users["Me"] = await repo.get(users["Me"].id)
+    (friends, friends_of_friends) = await repo.get_network(users["Me"])
+    assert friends == {users["HarborC"].id, users["Friend"].id}
+    assert friends_of_friends == {users["HarborB"].id}
+
+    # Search users
+    result = await repo.get_search(users["Me"], "harbor")
+    assert [user.username for user in result] == ["harborc", "harborb", "harbora", "harbord"]
+
+    result = await repo.get_search(users["Me"], "harbor", limit=1)
+    assert [user.username for user in result] == ["harborc"]
+
+    # Network is cached until the friends of the user change
+    await set_friends("Friend", "Me")
+    assert (await repo.get_network(users["Me"]))[1] == {users["HarborB"].id}
+    await set_friends("Me", "Friend")
+    users["Me"] = await repo.get(users["Me"].id)
+    assert await repo.get_network(users["Me"]) == ({users["Friend"].id}, set())
+
+
 @pytest.mark.mongo
 @pytest.mark.asyncio
 async def test_user_active_count(repo):
@@ -132,6 +217,17 @@ async def test_user_active_count(repo):
     assert result == 5
 
 
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_user_registration_count(repo):
+    '''Tests counting of recently registered users'''
+    for i in range(3):
+        await add_user(repo, i)
+
+    assert await repo.count_registrations() == 3
+    assert await repo.count_registrations(to=timedelta(days=-1)) == 0
+
+
 @pytest.mark.mongo
 @pytest.mark.asyncio
 async def test_user_add_duplicate_username(repo):
@@ -192,6 +288,23 @@ async def test_user_set_password(repo):
     assert User(**user2.dict()) == new_user2
 
 
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_user_upgrade_password_hash(repo):
+    '''Tests replacing an outdated password hash'''
+    new_user = await add_user(repo, "")
+
+    # Outdated hash doesn't match => Not replaced
+    assert not await repo.upgrade_password_hash(new_user.id, "other-hash", "rehashed")
+    user = await repo.get_by_login("user@kh.test")
+    assert user.password_hash == "test-password-hash"
+
+    # Current hash matches => Replaced
+    assert await repo.upgrade_password_hash(new_user.id, "test-password-hash", "rehashed")
+    user = await repo.get_by_login("user@kh.test")
+    assert user.password_hash == "rehashed"
+
+
 @pytest.mark.mongo
 @pytest.mark.asyncio
 async def test_user_set_info(repo):
@@ -233,3 +346,26 @@ async def test_user_update_last_login(repo):
     user = await repo.get(user.id)
     now = datetime.now(timezone.utc)
     assert now - timedelta(minutes=1) < user.last_login < now
+
+
+@pytest.mark.mongo
+@pytest.mark.asyncio
+async def test_user_cache_invalidation(repo):
+    '''Tests users are cached and invalidated on updates'''
+    repo.cache = TTLCache(maxsize=10, ttl=60)
+    new_user = await add_user(repo, "")
+
+    # Second fetch is served from cache
+    await repo.get(new_user.id)
+    user = await repo.get(new_user.id)
+    assert repo.cache.hits == 1
+    assert user == new_user
+
+    # Updates invalidate cache
+    await repo.set_info(new_user.id, UserInfo(bio='test-bio'))
+    user = await repo.get(new_user.id)
+    assert user.bio == 'test-bio'
+
+    await repo.set_flag(new_user.id, UserFlags.VERIFIED, True)
+    user = await repo.get(new_user.id)
+    assert user.is_verified
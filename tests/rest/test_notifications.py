@@ -1,23 +1,32 @@
 '''Unit tests for Notifications rest api'''
 # pylint: disable=unused-argument
 
-from datetime import datetime, timezone
+import asyncio
+from datetime import datetime, timedelta, timezone
 from typing import List
 from unittest import mock
 
 import pytest
+from fastapi import HTTPException
 from starlette.testclient import TestClient
 from pydantic import parse_obj_as
 
 from harbor.app import app
-from harbor.domain.notification import Notification
+from harbor.domain.notification import Notification, NotificationCursor
 from harbor.domain.token import AccessTokenData
+from harbor.domain.user import User
+from harbor.helpers.settings import get_settings
+from harbor.helpers.hub import get_hub
 from harbor.repository.base import get_repos
-from harbor.rest.auth.base import validate_access_token
+from harbor.rest.auth.base import get_current_user, validate_access_token_or_query
+from harbor.rest.notifications import notification_events
 from harbor.use_cases.notifications import (
+    export as uc_export,
     get_recent as uc_recent,
     get_historic as uc_historic,
+    get_unread_count as uc_unread,
     mark_as_read as uc_mark,
+    search as uc_search,
 )
 
 
@@ -28,17 +37,18 @@ def get_repos_override():
     return repos
 
 
-def validate_access_token_override():
-    '''Overrides access token validation'''
-    return AccessTokenData(user_id='5e7f656765f1b64f3f7f6900')
+def get_current_user_override():
+    '''Overrides user of access token'''
+    return User(id='5e7f656765f1b64f3f7f6900', display_name='TestUser')
 
 
 @pytest.fixture(name="client")
 def fixture_client():
     '''Returns a test client'''
     app.dependency_overrides[get_repos] = get_repos_override
-    app.dependency_overrides[validate_access_token] = validate_access_token_override
-    return TestClient(app)
+    app.dependency_overrides[get_current_user] = get_current_user_override
+    yield TestClient(app)
+    del app.dependency_overrides[get_current_user]
 
 
 @pytest.fixture(name="notifications")
@@ -63,6 +73,15 @@ def fixture_notifications():
     ]
 
 
+@pytest.fixture(name="stored_notifications")
+def fixture_stored_notifications(notifications):
+    '''Returns two test notifications with IDs'''
+    notifications[0].id = '5ea5d4cb8322e417540fb555'
+    notifications[1].id = '5ea5d4cb8322e417540fb666'
+    notifications[1].created_on = datetime(2020, 4, 26, 19, 39, 36, 6000, timezone.utc)
+    return notifications
+
+
 # =======================================
 # =         GET /notifications/         =
 # =======================================
@@ -83,6 +102,106 @@ def test_success_get_recent(uc_recent_mock, client, notifications, freezer):
     uc_recent_mock.assert_called_with(uc_req)
     assert response.url == 'http://testserver/notifications/'
     assert parse_obj_as(List[Notification], response.json()) == notifications
+    assert 'X-Next-Cursor' not in response.headers
+    assert response.status_code == 200
+
+
+@mock.patch.object(uc_recent.GetRecentUsecase, 'execute')
+def test_success_get_recent_page(uc_recent_mock, client, stored_notifications, freezer):
+    '''Should return a page of recent notifications with next cursor'''
+    # Mock use case response
+    uc_recent_mock.return_value = stored_notifications
+
+    # Send test request
+    response = client.get("/notifications/", params={
+        'limit': 2,
+        'before': '1587929976007-5ea5d4cb8322e417540fb444',
+    })
+
+    # Assert results
+    uc_req = uc_recent.GetRecentRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        limit=2,
+        before=NotificationCursor(
+            created_on=datetime(2020, 4, 26, 19, 39, 36, 7000, timezone.utc),
+            id='5ea5d4cb8322e417540fb444',
+        ),
+    )
+    uc_recent_mock.assert_called_with(uc_req)
+    assert parse_obj_as(List[Notification], response.json()) == stored_notifications
+    assert response.headers['X-Next-Cursor'] == '1587929976006-5ea5d4cb8322e417540fb666'
+    assert response.status_code == 200
+
+
+@mock.patch.object(uc_recent.GetRecentUsecase, 'execute')
+def test_fail_get_recent_invalid_cursor(uc_recent_mock, client):
+    '''Should return invalid cursor error'''
+    # Send test request
+    response = client.get("/notifications/", params={'before': 'invalid'})
+
+    # Assert results
+    uc_recent_mock.assert_not_called()
+    assert response.json()['code'] == 'invalid_cursor'
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('limit', [0, 101])
+def test_fail_get_recent_invalid_limit(client, limit):
+    '''Should return validation error for limits out of range'''
+    response = client.get("/notifications/", params={'limit': limit})
+    assert response.status_code == 422
+
+
+# =======================================
+# =      GET /notifications/search/     =
+# =======================================
+
+@mock.patch.object(uc_search.SearchUsecase, 'execute')
+def test_success_search(uc_search_mock, client, notifications, freezer):
+    '''Should return found notifications'''
+    # Mock use case response
+    uc_search_mock.return_value = notifications
+
+    # Send test request
+    response = client.get("/notifications/search/", params={'q': 'notif', 'offset': 20})
+
+    # Assert results
+    uc_req = uc_search.SearchRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        query='notif',
+        limit=20,
+        offset=20,
+    )
+    uc_search_mock.assert_called_with(uc_req)
+    assert parse_obj_as(List[Notification], response.json()) == notifications
+    assert response.status_code == 200
+
+
+def test_fail_search_empty_query(client):
+    '''Should return validation error for an empty query'''
+    response = client.get("/notifications/search/", params={'q': ''})
+    assert response.status_code == 422
+
+
+# =======================================
+# =   GET /notifications/unread-count/  =
+# =======================================
+
+@mock.patch.object(uc_unread.GetUnreadCountUsecase, 'execute')
+def test_success_get_unread_count(uc_unread_mock, client):
+    '''Should return the number of unread notifications'''
+    # Mock use case response
+    uc_unread_mock.return_value = uc_unread.GetUnreadCountResponse(count=5)
+
+    # Send test request
+    response = client.get("/notifications/unread-count/")
+
+    # Assert results
+    uc_req = uc_unread.GetUnreadCountRequest(
+        user_id='5e7f656765f1b64f3f7f6900'
+    )
+    uc_unread_mock.assert_called_with(uc_req)
+    assert response.json() == {'count': 5}
     assert response.status_code == 200
 
 
@@ -138,6 +257,178 @@ def test_fail_get_historic_max_time_range_exc(uc_historic_mock, client, notifica
     assert response.status_code == 400
 
 
+@mock.patch.object(uc_historic.GetHistoricUsecase, 'execute')
+def test_success_get_historic_page(uc_historic_mock, client, stored_notifications, freezer):
+    '''Should return a page of historic notifications with next cursor'''
+    # Mock use case response
+    uc_historic_mock.return_value = stored_notifications
+
+    # Send test request
+    response = client.post("/notifications/get-historic/", json={
+        "from": "2020-03-26T19:39:36.006Z",
+        "to": "2020-04-26T19:39:36.006Z",
+        "limit": 2,
+        "before": "1587929976007-5ea5d4cb8322e417540fb444",
+    })
+
+    # Assert results
+    uc_req = uc_historic.GetHistoricRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        from_=datetime(2020, 3, 26, 19, 39, 36, 6000, timezone.utc),
+        to=datetime(2020, 4, 26, 19, 39, 36, 6000, timezone.utc),
+        limit=2,
+        before=NotificationCursor(
+            created_on=datetime(2020, 4, 26, 19, 39, 36, 7000, timezone.utc),
+            id='5ea5d4cb8322e417540fb444',
+        ),
+    )
+    uc_historic_mock.assert_called_with(uc_req)
+    assert parse_obj_as(List[Notification], response.json()) == stored_notifications
+    assert response.headers['X-Next-Cursor'] == '1587929976006-5ea5d4cb8322e417540fb666'
+    assert response.status_code == 200
+
+
+@mock.patch.object(uc_historic.GetHistoricUsecase, 'execute')
+def test_fail_get_historic_invalid_cursor(uc_historic_mock, client):
+    '''Should return invalid cursor error'''
+    # Send test request
+    response = client.post("/notifications/get-historic/", json={
+        "from": "2020-03-26T19:39:36.006Z",
+        "to": "2020-04-26T19:39:36.006Z",
+        "before": "invalid",
+    })
+
+    # Assert results
+    uc_historic_mock.assert_not_called()
+    assert response.json()['code'] == 'invalid_cursor'
+    assert response.status_code == 400
+
+
+# =======================================
+# =      GET /notifications/export/     =
+# =======================================
+
+@mock.patch.object(uc_export.ExportUsecase, 'execute')
+def test_success_export(uc_export_mock, client, stored_notifications, freezer):
+    '''Should stream notifications as NDJSON'''
+    # Mock use case response
+    async def iter_notifications():
+        for notif in stored_notifications:
+            yield notif
+    uc_export_mock.return_value = iter_notifications()
+
+    # Send test request
+    response = client.get("/notifications/export/", params={
+        "from": "2020-03-26T19:39:36.006Z",
+        "to": "2020-04-26T19:39:36.006Z",
+    })
+
+    # Assert results
+    uc_req = uc_export.ExportRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        from_=datetime(2020, 3, 26, 19, 39, 36, 6000, timezone.utc),
+        to=datetime(2020, 4, 26, 19, 39, 36, 6000, timezone.utc),
+    )
+    uc_export_mock.assert_called_with(uc_req)
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = response.text.splitlines()
+    assert [Notification.parse_raw(line) for line in lines] == stored_notifications
+    assert response.status_code == 200
+
+
+@mock.patch.object(uc_export.ExportUsecase, 'execute')
+def test_fail_export_max_time_range_exc(uc_export_mock, client):
+    '''Should return max time range exceeded error'''
+    # Mock use case response
+    uc_export_mock.side_effect = uc_historic.MaxTimeRangeExceeded
+
+    # Send test request
+    response = client.get("/notifications/export/", params={
+        "from": "2018-04-26T19:39:36.006Z",
+        "to": "2020-04-26T19:39:36.006Z",
+    })
+
+    # Assert results
+    assert response.json()['code'] == 'max_time_range_exceeded'
+    assert response.status_code == 400
+
+
+# =======================================
+# =      GET /notifications/stream/     =
+# =======================================
+
+@pytest.mark.asyncio
+async def test_success_stream_events(stored_notifications, monkeypatch):
+    '''Should push published notifications as Server-Sent Events'''
+    monkeypatch.setenv("NOTIFICATION_STREAM_KEEPALIVE_SECONDS", "0.01")
+    get_settings.cache_clear()
+    get_hub.cache_clear()
+
+    try:
+        events = notification_events('5e7f656765f1b64f3f7f6900')
+        assert await events.__anext__() == ': connected\n\n'
+        assert get_hub().dict()['streams'] == 1
+
+        # Idle stream
+        assert await events.__anext__() == ': keep-alive\n\n'
+
+        # Published notification
+        await get_hub().start()
+        await get_hub().publish(stored_notifications[0])
+        event = await events.__anext__()
+        assert event == f'event: notification\ndata: {stored_notifications[0].json()}\n\n'
+
+        # Unsubscribe on disconnect
+        await events.aclose()
+        assert get_hub().dict()['streams'] == 0
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
+        get_hub.cache_clear()
+
+
+@pytest.mark.asyncio
+async def test_stream_events_expire(monkeypatch):
+    '''Should end the stream when the access token expires'''
+    monkeypatch.setenv("NOTIFICATION_STREAM_KEEPALIVE_SECONDS", "10")
+    get_settings.cache_clear()
+    get_hub.cache_clear()
+
+    try:
+        expires_on = datetime.now(timezone.utc) + timedelta(seconds=0.1)
+        events = notification_events('5e7f656765f1b64f3f7f6900', expires_on)
+        assert await events.__anext__() == ': connected\n\n'
+
+        # Wait until expiry instead of keep-alive interval
+        assert await asyncio.wait_for(events.__anext__(), 1) == ': keep-alive\n\n'
+        assert await events.__anext__() == 'event: expired\ndata: {}\n\n'
+        with pytest.raises(StopAsyncIteration):
+            await events.__anext__()
+        assert get_hub().dict()['streams'] == 0
+    finally:
+        monkeypatch.undo()
+        get_settings.cache_clear()
+        get_hub.cache_clear()
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.rest.auth.base.auth.validate_access_token')
+async def test_stream_token_query(validate):
+    '''Should accept the access token as query parameter'''
+    validate.return_value = AccessTokenData(user_id='5e7f656765f1b64f3f7f6900')
+    assert await validate_access_token_or_query(None, 'test-token') == validate.return_value
+    validate.assert_called_with('test-token')
+
+    # Header is preferred
+    await validate_access_token_or_query('test-header-token', 'test-token')
+    validate.assert_called_with('test-header-token')
+
+    # No token
+    with pytest.raises(HTTPException) as error:
+        await validate_access_token_or_query(None, None)
+    assert error.value.status_code == 401
+
+
 # =======================================
 # =  POST /notifications/mark-as-read/  =
 # =======================================
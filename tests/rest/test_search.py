@@ -6,10 +6,9 @@ import pytest
 from starlette.testclient import TestClient
 
 from harbor.app import app
-from harbor.domain.token import AccessTokenData
-from harbor.domain.user import BaseUser
+from harbor.domain.user import BaseUser, User
 from harbor.repository.base import get_repos
-from harbor.rest.auth.base import validate_access_token
+from harbor.rest.auth.base import get_current_user
 from harbor.use_cases.search import generic as uc
 
 
@@ -20,9 +19,9 @@ def get_repos_override():
     return repos
 
 
-def validate_access_token_override():
-    '''Overrides access token validation'''
-    return AccessTokenData(user_id='5e7f656765f1b64f3f7f6900')
+def get_current_user_override():
+    '''Overrides user of access token'''
+    return User(id='5e7f656765f1b64f3f7f6900', display_name='TestUser')
 
 
 @pytest.fixture(name="client")
@@ -30,8 +29,9 @@ def fixture_client():
     '''Returns a test client'''
     client = TestClient(app)
     app.dependency_overrides[get_repos] = get_repos_override
-    app.dependency_overrides[validate_access_token] = validate_access_token_override
-    return client
+    app.dependency_overrides[get_current_user] = get_current_user_override
+    yield client
+    del app.dependency_overrides[get_current_user]
 
 
 # =======================================
@@ -59,7 +59,7 @@ def test_success(uc_exec, client):
     # Assert results
     uc_req = uc.GenericSearchRequest(
         query='test',
-        user_id='5e7f656765f1b64f3f7f6900'
+        user=get_current_user_override(),
     )
     uc_exec.assert_called_with(uc_req)
     assert response.url == 'http://testserver/search/?q=test'
@@ -68,5 +68,6 @@ def test_success(uc_exec, client):
         'groups': [],
         'pages': [],
         'events': [],
+        'timed_out': [],
     }
     assert response.status_code == 200
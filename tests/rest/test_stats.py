@@ -9,6 +9,7 @@ from starlette.testclient import TestClient
 from harbor.app import app
 from harbor.domain import stats
 from harbor.repository.base import get_repos
+from harbor.rest import stats as router_stats
 from harbor.use_cases.stats import get_active_user_count as uc
 
 
@@ -27,6 +28,28 @@ def fixture_client():
     return client
 
 
+@pytest.fixture(autouse=True)
+def fixture_clear_response_cache():
+    '''Clears cached responses between tests'''
+    router_stats.get_response_cache.cache_clear()
+    yield
+    router_stats.get_response_cache.cache_clear()
+
+
+@pytest.fixture(name="uc_response")
+def fixture_uc_response():
+    '''Returns a use case response'''
+    return uc.GetActiveUserCountResponse(
+        now=50,
+        history=stats.ReadingAggregation(
+            subject=stats.ReadingSubject.ACTIVE_USERS,
+            timespan=stats.ReadingAggregationTimespan.MONTH,
+            operation=stats.ReadingAggregationOperation.AVERAGE,
+            values={date(2020, 4, 1): 49},
+        )
+    )
+
+
 # =======================================
 # =         /stats/active-users         =
 # =======================================
@@ -62,3 +85,66 @@ def test_success(uc_count, client):
         },
     }
     assert response.status_code == 200
+    assert response.headers['Cache-Control'].startswith('public, max-age=')
+    assert response.headers['ETag']
+
+
+@mock.patch.object(uc.GetActiveUserCountUsecase, 'execute')
+def test_success_cached(uc_count, client, uc_response):
+    '''Should serve repeated requests from cache until invalidated'''
+    # Mock use case response
+    uc_count.return_value = uc_response
+
+    # Send test requests
+    response1 = client.get("/stats/active-users/")
+    response2 = client.get("/stats/active-users/")
+
+    # Assert results
+    uc_count.assert_called_once()
+    assert response1.content == response2.content
+    assert response1.headers['ETag'] == response2.headers['ETag']
+
+    # Invalidate by new reading
+    router_stats.invalidate_response_cache()
+    client.get("/stats/active-users/")
+    assert uc_count.call_count == 2
+
+
+@mock.patch.object(uc.GetActiveUserCountUsecase, 'execute')
+def test_success_not_modified(uc_count, client, uc_response):
+    '''Should return 304 if ETag matches'''
+    # Mock use case response
+    uc_count.return_value = uc_response
+
+    # Send test requests
+    etag = client.get("/stats/active-users/").headers['ETag']
+    response = client.get("/stats/active-users/", headers={'If-None-Match': etag})
+
+    # Assert results
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response.headers['ETag'] == etag
+
+
+@pytest.mark.parametrize('header,modified', [
+    ('{etag}', False),
+    ('W/{etag}', False),
+    ('"other", {etag}', False),
+    ('"other",W/{etag} ', False),
+    ('*', False),
+    ('"other"', True),
+    ('', True),
+])
+@mock.patch.object(uc.GetActiveUserCountUsecase, 'execute')
+def test_success_if_none_match(uc_count, client, uc_response, header, modified):
+    '''Should return 304 if any tag of If-None-Match matches the ETag'''
+    # Mock use case response
+    uc_count.return_value = uc_response
+
+    # Send test requests
+    etag = client.get("/stats/active-users/").headers['ETag']
+    response = client.get("/stats/active-users/",
+                          headers={'If-None-Match': header.format(etag=etag)})
+
+    # Assert results
+    assert response.status_code == (200 if modified else 304)
@@ -9,7 +9,7 @@ from harbor.app import app
 from harbor.domain.token import AccessTokenData
 from harbor.domain.user import User, UserRelation
 from harbor.repository.base import get_repos
-from harbor.rest.auth.base import validate_access_token
+from harbor.rest.auth.base import get_current_user, validate_access_token
 from harbor.use_cases.user import (
     profile_get as uc_get,
     profile_update as uc_upd,
@@ -56,12 +56,16 @@ def test_success_get_profile_me(uc_exec, client):
     )
 
     # Send test request
-    response = client.get("/users/me/")
+    app.dependency_overrides[get_current_user] = lambda: user
+    try:
+        response = client.get("/users/me/")
+    finally:
+        del app.dependency_overrides[get_current_user]
 
     # Assert results
-    uc_req = uc_get.GetProfileByIDRequest(
+    uc_req = uc_get.GetProfileOfUserRequest(
         requester='5e7f656765f1b64f3f7f6900',
-        user_id='5e7f656765f1b64f3f7f6900',
+        user=user,
     )
     uc_exec.assert_called_with(uc_req)
     assert response.url == 'http://testserver/users/me/'
@@ -73,6 +77,24 @@ def test_success_get_profile_me(uc_exec, client):
     assert response.status_code == 200
 
 
+def test_fail_get_profile_me_user_not_found(client):
+    '''Should return 401 if user of token doesn't exist'''
+    # Mock repository
+    user_repo = mock.Mock()
+    user_repo.get = mock.AsyncMock(return_value=None)
+    app.dependency_overrides[get_repos] = lambda: {'user': user_repo}
+
+    # Send test request
+    try:
+        response = client.get("/users/me/")
+    finally:
+        app.dependency_overrides[get_repos] = get_repos_override
+
+    # Assert results
+    user_repo.get.assert_called_once_with('5e7f656765f1b64f3f7f6900')
+    assert response.status_code == 401
+
+
 # =======================================
 # =           PATCH /users/me/          =
 # =======================================
@@ -106,7 +128,11 @@ def test_success_update_profile(uc_exec, client, json_upd_req, uc_upd_req):
     uc_exec.return_value = expected
 
     # Send test request
-    response = client.patch("/users/me/", json=json_upd_req)
+    app.dependency_overrides[get_current_user] = lambda: expected
+    try:
+        response = client.patch("/users/me/", json=json_upd_req)
+    finally:
+        del app.dependency_overrides[get_current_user]
 
     # Assert results
     uc_exec.assert_called_with(uc_upd_req)
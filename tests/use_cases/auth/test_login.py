@@ -6,6 +6,7 @@ import pytest
 
 from harbor.domain.token import RefreshToken
 from harbor.domain.user import UserWithPassword
+from harbor.helpers import auth
 from harbor.repository.base import UserRepo, RefreshTokenRepo
 from harbor.use_cases.auth import login as uc_user_login
 
@@ -53,11 +54,41 @@ async def test_success_case_insensitive(create_access_token, uc_req, test_user):
     user_repo.get_by_login.assert_called_with('testuser')
     user_repo.update_last_login.assert_called_with(test_user.id)
     create_access_token.assert_called_with(user_id=test_user.id)
+    user_repo.upgrade_password_hash.assert_not_called()
     rt_repo.create_token.assert_called_with(test_user.id)
     assert tokens.access_token == 'TestAccessToken'
     assert tokens.refresh_token == f'{test_user.id}:TestRefreshToken'
 
 
+@pytest.mark.asyncio
+@mock.patch('harbor.helpers.auth.create_access_token')
+async def test_success_upgrade_hash(create_access_token, uc_req, test_user):
+    '''Should rehash password if hash is outdated'''
+    # Create mocks
+    # Hashed value: TestPassword (4 rounds)
+    old_hash = '$2b$04$U1DQAE8VwdP03xhfMAp.DuX3NeiMDVZftyfPr3hOGq11FdUEjNdT6'
+    test_user.password_hash = old_hash
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_by_login.return_value = test_user
+    rt_repo = mock.Mock(RefreshTokenRepo)
+    rt_repo.create_token.return_value = RefreshToken(
+        user_id=test_user.id,
+        secret='TestRefreshToken',
+    )
+    create_access_token.return_value = 'TestAccessToken'
+
+    # Call usecase
+    uc = uc_user_login.LoginUseCase(user_repo, rt_repo)
+    await uc.execute(uc_req)
+
+    # Assert results
+    user_id, prev_hash, new_hash = user_repo.upgrade_password_hash.call_args[0]
+    assert user_id == test_user.id
+    assert prev_hash == old_hash
+    assert new_hash.startswith('$2b$12$')
+    assert auth.verify_password('TestPassword', new_hash)
+
+
 @pytest.mark.asyncio
 async def test_fail_user_not_found(uc_req):
     '''Should throw InvalidCredsError if user is not found'''
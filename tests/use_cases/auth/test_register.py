@@ -57,10 +57,10 @@ def fixture_msg():
 
 
 @pytest.mark.asyncio
-@mock.patch('harbor.use_cases.auth.register.queue_task')
+@mock.patch('harbor.use_cases.auth.register.queue_mail')
 @mock.patch('harbor.use_cases.auth.register.email')
-@mock.patch('harbor.helpers.auth.get_password_hash')
-async def test_success_new_user(get_pw_hash, email, queue_task, uc_req, user, verif_token, msg):
+@mock.patch('harbor.helpers.auth.get_password_hash_async')
+async def test_success_new_user(get_pw_hash, email, queue_mail, uc_req, user, verif_token, msg):
     '''Should register a user'''
     # Create mocks
     get_pw_hash.return_value = "test-secure-hash"
@@ -91,17 +91,14 @@ async def test_success_new_user(get_pw_hash, email, queue_task, uc_req, user, ve
         'user@kh.test',
         'test-secret',
     )
-    queue_task.assert_called_with(
-        'harbor.worker.tasks.email.send_mail',
-        [msg.dict()],
-    )
+    queue_mail.assert_called_with(msg)
 
 
 @pytest.mark.asyncio
-@mock.patch('harbor.use_cases.auth.register.queue_task')
+@mock.patch('harbor.use_cases.auth.register.queue_mail')
 @mock.patch('harbor.use_cases.auth.register.email')
-@mock.patch('harbor.helpers.auth.get_password_hash')
-async def test_success_existing_user(get_pw_hash, email, queue_task, uc_req, msg):
+@mock.patch('harbor.helpers.auth.get_password_hash_async')
+async def test_success_existing_user(get_pw_hash, email, queue_mail, uc_req, msg):
     '''Should inform user for registering existing mail address'''
     # Create mocks
     get_pw_hash.return_value = "test-secure-hash"
@@ -127,10 +124,7 @@ async def test_success_existing_user(get_pw_hash, email, queue_task, uc_req, msg
         'TestUser',
         'user@kh.test'
     )
-    queue_task.assert_called_with(
-        'harbor.worker.tasks.email.send_mail',
-        [msg.dict()],
-    )
+    queue_mail.assert_called_with(msg)
 
 
 @pytest.mark.asyncio
@@ -153,7 +147,7 @@ async def test_fail_reserved_username(username):
 
 
 @pytest.mark.asyncio
-@mock.patch('harbor.helpers.auth.get_password_hash')
+@mock.patch('harbor.helpers.auth.get_password_hash_async')
 async def test_fail_username_taken(get_pw_hash, uc_req):
     '''Should return UsernameTakenError'''
     # Create mocks
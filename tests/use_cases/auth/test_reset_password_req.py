@@ -1,6 +1,7 @@
 '''Unit tests for Request Password Reset usecase'''
 # pylint: disable=too-many-arguments
 
+import asyncio
 from unittest import mock
 
 import pytest
@@ -10,6 +11,7 @@ from harbor.domain.token import VerificationToken, VerificationPurposeEnum as Ve
 from harbor.domain.user import User
 from harbor.repository.base import UserRepo, VerifTokenRepo
 from harbor.use_cases.auth import reset_password_req as uc_pw_req
+from harbor.worker.mail_buffer import MailBuffer
 
 
 @pytest.fixture(name='uc_req')
@@ -51,9 +53,9 @@ def fixture_msg():
 
 
 @pytest.mark.asyncio
-@mock.patch('harbor.use_cases.auth.reset_password_req.queue_task')
+@mock.patch('harbor.use_cases.auth.reset_password_req.queue_mail')
 @mock.patch('harbor.use_cases.auth.reset_password_req.email')
-async def test_success(email, queue_task, uc_req, user, verif_token, msg):
+async def test_success(email, queue_mail, uc_req, user, verif_token, msg):
     '''Should send a password reset link'''
     # Create mocks
     user_repo = mock.Mock(UserRepo)
@@ -78,16 +80,13 @@ async def test_success(email, queue_task, uc_req, user, verif_token, msg):
         '507f1f77bcf86cd799439011',
         'test-secret',
     )
-    queue_task.assert_called_with(
-        'harbor.worker.tasks.email.send_mail',
-        [msg.dict()],
-    )
+    queue_mail.assert_called_with(msg)
 
 
 @pytest.mark.asyncio
-@mock.patch('harbor.use_cases.auth.reset_password_req.queue_task')
+@mock.patch('harbor.use_cases.auth.reset_password_req.queue_mail')
 @mock.patch('harbor.use_cases.auth.reset_password_req.email')
-async def test_fail(email, queue_task, uc_req):
+async def test_fail(email, queue_mail, uc_req):
     '''User not found => Don't send link'''
     # Create mocks
     user_repo = mock.Mock(UserRepo)
@@ -102,4 +101,32 @@ async def test_fail(email, queue_task, uc_req):
     user_repo.get_by_login.assert_called_with('user@kh.test')
     vt_repo.create_verif_token.assert_not_called()
     email.prepare_reset_password.assert_not_called()
-    queue_task.assert_not_called()
+    queue_mail.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('registered', [True, False])
+@mock.patch('harbor.worker.mail_buffer.enqueue_task')
+@mock.patch('harbor.worker.mail_buffer.get_mail_buffer')
+@mock.patch('harbor.use_cases.auth.reset_password_req.email')
+async def test_same_path_for_unknown_email(email, get_mail_buffer, enqueue_task,
+                                           uc_req, user, verif_token, msg, registered):
+    '''Should not wait for the mail batch, so registered emails can't be told apart'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_by_login.return_value = user if registered else None
+    vt_repo = mock.Mock(VerifTokenRepo)
+    vt_repo.create_verif_token.return_value = verif_token
+    email.prepare_reset_password.return_value = msg
+    buffer = MailBuffer(max_size=10, max_delay=60)
+    get_mail_buffer.return_value = buffer
+
+    # Call usecase, returns before the batch is queued
+    uc = uc_pw_req.RequestPasswordResetUseCase(user_repo, vt_repo)
+    await asyncio.wait_for(uc.execute(uc_req), 1)
+
+    # Assert results
+    enqueue_task.assert_not_called()
+    assert len(buffer.pending) == (1 if registered else 0)
+    await buffer.close()
+    assert enqueue_task.call_count == (1 if registered else 0)
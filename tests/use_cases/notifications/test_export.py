@@ -0,0 +1,54 @@
+'''Unit tests for Export Notifications usecase'''
+
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from harbor.repository.base import NotificationRepo
+from harbor.use_cases.notifications import export as uc_export
+from harbor.use_cases.notifications.get_historic import MaxTimeRangeExceeded
+
+
+@pytest.fixture(name='uc_req')
+def fixture_uc_req():
+    '''Returns an export notifications request'''
+    return uc_export.ExportRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        from_=datetime.now(timezone.utc) - timedelta(days=300),
+        to=datetime.now(timezone.utc),
+    )
+
+
+def test_success(uc_req):
+    '''Should return iterator over historic notifications'''
+    # Create mocks
+    notif_repo = mock.Mock(NotificationRepo)
+    notif_repo.iter_historic.return_value = 'test-iterator'
+
+    # Call usecase
+    uc = uc_export.ExportUsecase(notif_repo)
+    result = uc.execute(uc_req)
+
+    # Assert results
+    notif_repo.iter_historic.assert_called_with(
+        '5e7f656765f1b64f3f7f6900',
+        uc_req.from_,
+        uc_req.to,
+    )
+    assert result == 'test-iterator'
+
+
+def test_fail_max_time_range_exceeded(uc_req):
+    '''Should return MaxTimeRangeExceeded error'''
+    # Create mocks
+    notif_repo = mock.Mock(NotificationRepo)
+
+    # Call usecase
+    uc = uc_export.ExportUsecase(notif_repo)
+    uc_req.from_ = datetime.now(timezone.utc) - timedelta(days=400)
+    with pytest.raises(MaxTimeRangeExceeded):
+        uc.execute(uc_req)
+
+    # Assert results
+    notif_repo.iter_historic.assert_not_called()
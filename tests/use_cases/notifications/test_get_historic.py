@@ -58,6 +58,8 @@ async def test_success(uc_req, notifs):
         '5e7f656765f1b64f3f7f6900',
         uc_req.from_,
         uc_req.to,
+        limit=None,
+        before=None,
     )
     assert result == notifs
 
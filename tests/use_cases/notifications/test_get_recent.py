@@ -51,5 +51,9 @@ async def test_success(uc_req, notifs):
     result = await uc.execute(uc_req)
 
     # Assert results
-    notif_repo.get_recent.assert_called_with('5e7f656765f1b64f3f7f6900')
+    notif_repo.get_recent.assert_called_with(
+        '5e7f656765f1b64f3f7f6900',
+        limit=None,
+        before=None,
+    )
     assert result == notifs
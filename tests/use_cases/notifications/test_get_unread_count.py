@@ -0,0 +1,25 @@
+'''Unit tests for Get Unread Count usecase'''
+
+from unittest import mock
+
+import pytest
+
+from harbor.repository.base import NotificationRepo
+from harbor.use_cases.notifications import get_unread_count as uc_unread
+
+
+@pytest.mark.asyncio
+async def test_success():
+    '''Should return the number of unread notifications'''
+    # Create mocks
+    notif_repo = mock.Mock(NotificationRepo)
+    notif_repo.get_unread_count.return_value = 3
+
+    # Call usecase
+    uc = uc_unread.GetUnreadCountUsecase(notif_repo)
+    uc_req = uc_unread.GetUnreadCountRequest(user_id='5e7f656765f1b64f3f7f6900')
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    notif_repo.get_unread_count.assert_called_with('5e7f656765f1b64f3f7f6900')
+    assert result == uc_unread.GetUnreadCountResponse(count=3)
@@ -0,0 +1,47 @@
+'''Unit tests for Search Notifications usecase'''
+
+from unittest import mock
+
+import pytest
+from pydantic import ValidationError
+
+from harbor.repository.base import NotificationRepo
+from harbor.use_cases.notifications import search as uc_search
+
+
+@pytest.mark.asyncio
+async def test_success():
+    '''Should return search results'''
+    # Create mocks
+    notif_repo = mock.Mock(NotificationRepo)
+    notif_repo.get_search.return_value = []
+
+    # Call usecase
+    uc = uc_search.SearchUsecase(notif_repo)
+    uc_req = uc_search.SearchRequest(
+        user_id='5e7f656765f1b64f3f7f6900',
+        query='harbor',
+        offset=20,
+    )
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    notif_repo.get_search.assert_called_with(
+        '5e7f656765f1b64f3f7f6900',
+        'harbor',
+        limit=20,
+        offset=20,
+    )
+    assert result == []
+
+
+@pytest.mark.parametrize('fields', [
+    {'query': ''},
+    {'query': 'harbor', 'limit': 0},
+    {'query': 'harbor', 'limit': 101},
+    {'query': 'harbor', 'offset': -1},
+])
+def test_fail_invalid_request(fields):
+    '''Should reject empty queries and invalid pages'''
+    with pytest.raises(ValidationError):
+        uc_search.SearchRequest(user_id='5e7f656765f1b64f3f7f6900', **fields)
@@ -1,10 +1,12 @@
 '''Unit tests for Generic Search usecase'''
 
+import asyncio
 from unittest import mock
 
 import pytest
 
-from harbor.domain.user import BaseUser
+from harbor.domain.user import BaseUser, User
+from harbor.helpers.autocomplete import AutocompleteIndex
 from harbor.repository.base import UserRepo
 from harbor.use_cases.search import generic as uc_search_gen
 
@@ -14,7 +16,7 @@ def fixture_uc_req():
     '''Returns a generic search request'''
     return uc_search_gen.GenericSearchRequest(
         query='test',
-        user_id='507f1f77bcf86cd799439010',
+        user=User(id='507f1f77bcf86cd799439010', display_name='Requester'),
     )
 
 
@@ -45,8 +47,111 @@ async def test_success(uc_req, test_users):
     result = await uc.execute(uc_req)
 
     # Assert results
-    user_repo.get_search.assert_called_with('507f1f77bcf86cd799439010', 'test')
+    user_repo.get_search.assert_called_with(uc_req.user, 'test')
     assert result.users == test_users
     assert result.groups == []
     assert result.pages == []
     assert result.events == []
+
+
+@pytest.mark.asyncio
+async def test_success_user_index(uc_req, test_users):
+    '''Should search users in the autocomplete index'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_network.return_value = (set(), set())
+    user_index = AutocompleteIndex()
+    user_index.build(test_users)
+
+    # Call usecase
+    uc = uc_search_gen.GenericSearchUseCase(user_repo, user_index)
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    user_repo.get_search.assert_not_called()
+    user_repo.get_network.assert_called_with(uc_req.user)
+    assert result.users == test_users
+
+
+@pytest.mark.asyncio
+async def test_success_user_index_ranked(uc_req, test_users):
+    '''Should rank friends, then friends of friends first in the autocomplete index'''
+    # Create mocks
+    other = BaseUser(id='507f1f77bcf86cd799439013', display_name='TestUser3')
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_network.return_value = ({other.id}, {test_users[1].id})
+    user_index = AutocompleteIndex()
+    user_index.build(test_users + [other])
+
+    # Call usecase
+    uc = uc_search_gen.GenericSearchUseCase(user_repo, user_index)
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    assert result.users == [other, test_users[1], test_users[0]]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('ready', [True, False])
+async def test_success_user_index_fallback(uc_req, test_users, ready):
+    '''Should search the repository for substrings or if index isn't loaded'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_search.return_value = test_users
+    user_repo.get_network.return_value = (set(), set())
+    user_index = AutocompleteIndex()
+    if ready:
+        user_index.build([])
+
+    # Call usecase
+    uc = uc_search_gen.GenericSearchUseCase(user_repo, user_index)
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    user_repo.get_search.assert_called_with(uc_req.user, 'test')
+    assert result.users == test_users
+
+
+@pytest.mark.asyncio
+async def test_success_sources_concurrent(uc_req, test_users):
+    '''Should search sources concurrently and skip slow sources'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_search.return_value = test_users
+
+    async def search_groups(req):
+        await asyncio.sleep(0.05)
+        return [req.query]
+
+    async def search_events(_):
+        await asyncio.sleep(10)
+
+    # Call usecase
+    uc = uc_search_gen.GenericSearchUseCase(user_repo, timeout=0.2, sources={
+        'groups': search_groups,
+        'events': search_events,
+    })
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    result = await uc.execute(uc_req)
+
+    # Assert results
+    assert loop.time() - start < 1
+    assert result.users == test_users
+    assert result.groups == ['test']
+    assert result.pages == []
+    assert result.events == []
+    assert result.timed_out == ['events']
+
+
+@pytest.mark.asyncio
+async def test_fail_source_error(uc_req):
+    '''Should raise unexpected errors of sources'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+    user_repo.get_search.side_effect = ValueError
+
+    # Call usecase
+    uc = uc_search_gen.GenericSearchUseCase(user_repo)
+    with pytest.raises(ValueError):
+        await uc.execute(uc_req)
@@ -129,6 +129,27 @@ async def test_success(get_by, user, uc_res):
     assert res == uc_res
 
 
+@pytest.mark.parametrize("user,uc_res", get_success_parameters())
+@pytest.mark.asyncio
+async def test_success_fetched_user(user, uc_res):
+    '''Should return a user profile without fetching the user again'''
+    # Create mocks
+    user_repo = mock.Mock(UserRepo)
+
+    # Call usecase
+    uc = uc_get.GetProfileUseCase(user_repo)
+    uc_req = uc_get.GetProfileOfUserRequest(
+        requester='507f1f77bcf86cd799439011',
+        user=user,
+    )
+    res = await uc.execute(uc_req)
+
+    # Assert results
+    user_repo.get.assert_not_called()
+    user_repo.get_by_username.assert_not_called()
+    assert res == uc_res
+
+
 @pytest.mark.parametrize("get_by", ['id', 'username'])
 @pytest.mark.parametrize("user,uc_res", get_success_parameters())
 @pytest.mark.asyncio
@@ -1,12 +1,14 @@
 '''Unit tests for Email worker tasks'''
 # pylint: disable=no-member,too-many-arguments
 
+import smtplib
 from unittest import mock
 
 import pytest
 
 from harbor.domain.email import EmailMsg, EmailSecurity
 from harbor.helpers.settings import get_settings
+from harbor.worker.smtp import get_smtp_pool
 from harbor.worker.tasks import email
 
 
@@ -18,6 +20,14 @@ def test_get_address():
     assert address.domain == 'kh.test'
 
 
+@pytest.fixture(autouse=True)
+def fixture_clear_smtp_pool():
+    '''Creates a new SMTP pool per test, so settings are reloaded'''
+    get_smtp_pool.cache_clear()
+    yield
+    get_smtp_pool.cache_clear()
+
+
 @pytest.fixture(name='msg')
 def fixture_msg():
     '''Returns an EmailMsg model'''
@@ -46,8 +56,8 @@ def assert_email_send(args):
     (False, '', ''),
     (True, 'test-username', 'test-password'),
 ])
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP_SSL')
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP_SSL')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
 def test_send_mail_unsecure(smtp, smtp_ssl, with_login, username, password, msg, monkeypatch):
     '''Should send a mail over unsecure SMTP'''
     # Mock ENV settings
@@ -81,8 +91,8 @@ def test_send_mail_unsecure(smtp, smtp_ssl, with_login, username, password, msg,
     (False, '', ''),
     (True, 'test-username', 'test-password'),
 ])
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP_SSL')
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP_SSL')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
 def test_send_mail_tls_ssl(smtp, smtp_ssl, with_login, username, password, msg, monkeypatch):
     '''Should send a mail over SMTP secured with TLS/SSL'''
     # Mock ENV settings
@@ -116,8 +126,8 @@ def test_send_mail_tls_ssl(smtp, smtp_ssl, with_login, username, password, msg,
     (False, '', ''),
     (True, 'test-username', 'test-password'),
 ])
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP_SSL')
-@mock.patch('harbor.worker.tasks.email.smtplib.SMTP')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP_SSL')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
 def test_send_mail_starttls(smtp, smtp_ssl, with_login, username, password, msg, monkeypatch):
     '''Should send a mail over SMTP secured with STARTTLS'''
     # Mock ENV settings
@@ -145,3 +155,73 @@ def test_send_mail_starttls(smtp, smtp_ssl, with_login, username, password, msg,
         mock_smtp.login.assert_not_called()
     args, _ = mock_smtp.send_message.call_args
     assert_email_send(args)
+
+
+@pytest.mark.parametrize('error,expected', [
+    (smtplib.SMTPServerDisconnected(), True),
+    (ConnectionRefusedError(), True),
+    (smtplib.SMTPResponseException(451, 'Try again later'), True),
+    (smtplib.SMTPResponseException(554, 'Rejected'), False),
+    (smtplib.SMTPRecipientsRefused({'user@kh.test': (450, b'Mailbox busy')}), True),
+    (smtplib.SMTPRecipientsRefused({'user@kh.test': (550, b'No such user')}), False),
+    (smtplib.SMTPNotSupportedError(), False),
+])
+def test_is_temporary(error, expected):
+    '''Should classify SMTP errors as temporary or permanent'''
+    assert email.is_temporary(error) is expected
+
+
+@mock.patch('harbor.worker.tasks.email.send_mail_batch.apply_async')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
+def test_send_mail_batch(smtp, apply_async, msg):
+    '''Should send all mails over one connection and retry temporary failures'''
+    # Create mocks
+    mock_smtp = smtp.return_value
+    mock_smtp.send_message.side_effect = [
+        None,
+        smtplib.SMTPRecipientsRefused({'user@kh.test': (550, b'No such user')}),
+        smtplib.SMTPRecipientsRefused({'user@kh.test': (450, b'Mailbox busy')}),
+        None,
+    ]
+    msg_dicts = [msg.dict() for _ in range(4)]
+
+    # Call task
+    report = email.send_mail_batch(msg_dicts)
+
+    # Assert results
+    assert report == {'sent': 2, 'retried': 1, 'failed': 1}
+    smtp.assert_called_once()
+    assert mock_smtp.send_message.call_count == 4
+    apply_async.assert_called_once_with(
+        ([msg_dicts[2]], 1),
+        countdown=get_settings().EMAIL_RETRY_DELAY_SECONDS,
+    )
+
+
+@mock.patch('harbor.worker.tasks.email.send_mail_batch.apply_async')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
+def test_send_mail_batch_server_down(smtp, apply_async, msg):
+    '''Should retry the remaining batch if the server is unreachable'''
+    smtp.side_effect = ConnectionRefusedError()
+    msg_dicts = [msg.dict() for _ in range(3)]
+
+    report = email.send_mail_batch(msg_dicts, attempt=1)
+
+    assert report == {'sent': 0, 'retried': 3, 'failed': 0}
+    assert smtp.call_count == 2  # Pool reconnects once for the first mail only
+    apply_async.assert_called_once_with(
+        (msg_dicts, 2),
+        countdown=get_settings().EMAIL_RETRY_DELAY_SECONDS * 2,
+    )
+
+
+@mock.patch('harbor.worker.tasks.email.send_mail_batch.apply_async')
+@mock.patch('harbor.worker.smtp.smtplib.SMTP')
+def test_send_mail_batch_max_retries(smtp, apply_async, msg):
+    '''Should drop mails after the maximum retries'''
+    smtp.side_effect = ConnectionRefusedError()
+
+    report = email.send_mail_batch([msg.dict()], attempt=get_settings().EMAIL_BATCH_MAX_RETRIES)
+
+    assert report == {'sent': 0, 'retried': 0, 'failed': 1}
+    apply_async.assert_not_called()
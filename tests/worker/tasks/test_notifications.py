@@ -0,0 +1,61 @@
+'''Unit tests for Notification worker tasks'''
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from harbor.domain.notification import NotificationTemplate
+from harbor.worker.runtime import WorkerRuntime
+from harbor.worker.tasks.notifications import fan_out_notification, reconcile_unread_counts
+
+
+@pytest.fixture(name='mock_notifs')
+def fixture_mock_notifs():
+    '''Runs tasks on a runtime with a mocked notification repository'''
+    runtime = WorkerRuntime()
+    runtime.loop = asyncio.new_event_loop()
+    runtime.repos = {'notification': mock.AsyncMock()}
+    with mock.patch('harbor.worker.runtime.get_runtime', return_value=runtime):
+        yield runtime.repos['notification']
+    runtime.close()
+
+
+def test_reconcile_unread_counts(mock_notifs):
+    '''Should recount unread notifications'''
+    # Create mocks
+    mock_notifs.reconcile_unread_counts.return_value = 2
+
+    # Call task
+    corrected = reconcile_unread_counts()
+
+    # Assert result
+    mock_notifs.reconcile_unread_counts.assert_called_with()
+    assert corrected == 2
+
+
+def test_fan_out_notification(mock_notifs):
+    '''Should insert a notification per recipient in batches'''
+    # Create mocks
+    mock_notifs.add_many.side_effect = lambda notifs, chunk_size: [
+        f'id-{notif.user_id}' for notif in notifs]
+
+    # Call task
+    recipients = [f'5e7f656765f1b64f3f7f690{i}' for i in range(5)]
+    template = NotificationTemplate(
+        title='Test notif',
+        description='Test notif desc',
+        icon='https://kh.test/icon',
+        link='https://kh.test/link',
+    )
+    report = fan_out_notification(recipients, template.dict(), batch_size=2)
+
+    # Assert result
+    batches = [call.args[0] for call in mock_notifs.add_many.call_args_list]
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [notif.user_id for batch in batches for notif in batch] == recipients
+    assert batches[0][0] == template.for_user(recipients[0]).copy(
+        update={'created_on': batches[0][0].created_on})
+    assert report['recipients'] == 5
+    assert report['inserted'] == 5
+    assert report['per_second'] > 0
@@ -1,40 +1,92 @@
 '''Unit tests for Stats worker tasks'''
-# pylint: disable=unused-argument
 
+import asyncio
 from datetime import datetime, timezone
 from unittest import mock
 
 import pytest
 
 from harbor.domain.stats import Reading, ReadingSubject
-from harbor.worker.tasks.stats import async_count_active_users
+from harbor.worker.runtime import WorkerRuntime
+from harbor.worker.app import app
+from harbor.worker.tasks.stats import COLLECTORS, collect_readings
 
 
-@pytest.mark.asyncio
-@mock.patch('harbor.worker.tasks.stats.StatsMongoRepo.__aenter__')
-@mock.patch('harbor.worker.tasks.stats.UserMongoRepo.__aenter__')
-async def test_count_active_users(mock_users_ctx, mock_stats_ctx, freezer):
-    '''Should insert the current active user count in the database'''
-    # Create mocks
+@pytest.fixture(name='mock_repos')
+def fixture_mock_repos():
+    '''Runs tasks on a runtime with mocked repositories'''
     mock_users = mock.AsyncMock()
     mock_users.count_active_users.return_value = 99
-    mock_users_ctx.return_value = mock_users
-
+    mock_users.count_registrations.return_value = 5
+    mock_notifs = mock.AsyncMock()
+    mock_notifs.count_added.return_value = 1000
     mock_stats = mock.AsyncMock()
-    mock_stats_ctx.return_value = mock_stats
+    runtime = WorkerRuntime()
+    runtime.loop = asyncio.new_event_loop()
+    runtime.repos = {'notification': mock_notifs, 'stats': mock_stats, 'user': mock_users}
+    with mock.patch('harbor.worker.runtime.get_runtime', return_value=runtime):
+        yield (mock_users, mock_notifs, mock_stats)
+    runtime.close()
 
-    # Call task
-    await async_count_active_users()
 
-    # Expected
+def create_reading(subject: ReadingSubject, value: int, unit: str = 'users'):
+    '''Returns a reading of today'''
     today = datetime.now(timezone.utc)
-    reading = Reading(
+    return Reading(
         datetime=datetime(today.year, today.month, today.day),
-        subject=ReadingSubject.ACTIVE_USERS,
-        value=99,
-        unit="users",
+        subject=subject,
+        value=value,
+        unit=unit,
     )
 
+
+@pytest.mark.usefixtures('freezer')
+def test_collect_readings(mock_repos):
+    '''Should store readings of all collectors with a single bulk upsert'''
+    (mock_users, _, mock_stats) = mock_repos
+
+    # Call task
+    report = collect_readings()
+
+    # Assert result
+    assert set(report) == {subject.value for subject in COLLECTORS}
+    assert report['active_users']['value'] == 99
+    assert all(result['seconds'] >= 0 for result in report.values())
+    mock_users.count_active_users.assert_any_call()
+    mock_stats.upsert.assert_not_called()
+    mock_stats.upsert_many.assert_called_once()
+    readings = mock_stats.upsert_many.call_args[0][0]
+    assert create_reading(ReadingSubject.ACTIVE_USERS, 99) in readings
+    assert create_reading(ReadingSubject.REGISTRATIONS, 5) in readings
+    assert create_reading(ReadingSubject.NOTIFICATIONS_SENT, 1000, 'notifications') in readings
+
+
+@pytest.mark.usefixtures('freezer')
+def test_collect_readings_failing_collector(mock_repos):
+    '''Should store other readings if a collector fails'''
+    (_, mock_notifs, mock_stats) = mock_repos
+    mock_notifs.count_added.side_effect = RuntimeError('Test')
+
+    # Call task
+    report = collect_readings(['active_users', 'notifications_sent'])
+
+    # Assert result
+    assert 'error' in report['notifications_sent']
+    mock_stats.upsert_many.assert_called_with([
+        create_reading(ReadingSubject.ACTIVE_USERS, 99),
+    ])
+
+
+@pytest.mark.usefixtures('freezer')
+def test_count_active_users_alias(mock_repos):
+    '''Should run tasks queued under the previous task name'''
+    (_, mock_notifs, mock_stats) = mock_repos
+
+    # Call task by its previous name
+    report = app.tasks['harbor.worker.tasks.stats.count_active_users']()
+
     # Assert result
-    mock_users.count_active_users.assert_called_with()
-    mock_stats.upsert.assert_called_with(reading)
+    assert set(report) == {ReadingSubject.ACTIVE_USERS.value}
+    mock_notifs.count_added.assert_not_called()
+    mock_stats.upsert_many.assert_called_once_with(
+        [create_reading(ReadingSubject.ACTIVE_USERS, 99)])
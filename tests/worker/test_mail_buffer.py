@@ -0,0 +1,88 @@
+'''Unit tests for the mail buffer'''
+
+import asyncio
+from unittest import mock
+
+import pytest
+
+from harbor.domain.email import EmailMsg
+from harbor.worker.mail_buffer import MailBuffer
+from harbor.worker.outbox import TaskOutboxFullError
+
+
+@pytest.fixture(name='msg')
+def fixture_msg():
+    '''Returns an EmailMsg model'''
+    return EmailMsg(
+        to_name='TestUser',
+        to_email='user@kh.test',
+        subject='test-subject',
+        text='test-text-content',
+        html='test-html-content',
+    )
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.worker.mail_buffer.enqueue_task')
+async def test_buffer_flush_on_delay(enqueue_task, msg):
+    '''Should queue mails as one batch after the delay'''
+    buffer = MailBuffer(max_size=10, max_delay=0.01)
+    for _ in range(3):
+        buffer.add(msg)
+    await asyncio.sleep(0)
+    enqueue_task.assert_not_called()
+
+    await asyncio.sleep(0.05)
+    await buffer.close()
+
+    enqueue_task.assert_called_once_with(
+        'harbor.worker.tasks.email.send_mail_batch',
+        [[msg.dict()] * 3],
+    )
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.worker.mail_buffer.enqueue_task')
+async def test_buffer_flush_on_size(enqueue_task, msg):
+    '''Should queue mails immediately when the batch is full'''
+    buffer = MailBuffer(max_size=2, max_delay=60)
+    for _ in range(5):
+        buffer.add(msg)
+    await asyncio.sleep(0)
+
+    assert enqueue_task.call_count == 2
+    assert len(buffer.pending) == 1
+    await buffer.close()
+    assert enqueue_task.call_count == 3
+    assert buffer.flush_handle is None
+    assert not buffer.flushing
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.worker.mail_buffer.enqueue_task')
+async def test_buffer_without_delay(enqueue_task, msg):
+    '''Should queue every mail immediately if delay is 0'''
+    buffer = MailBuffer(max_size=10, max_delay=0)
+    buffer.add(msg)
+    await asyncio.sleep(0)
+
+    enqueue_task.assert_called_once_with(
+        'harbor.worker.tasks.email.send_mail_batch',
+        [[msg.dict()]],
+    )
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.worker.mail_buffer.enqueue_task')
+async def test_buffer_queue_error(enqueue_task, msg, caplog):
+    '''Should log queueing errors without failing the callers'''
+    enqueue_task.side_effect = TaskOutboxFullError('Test')
+    buffer = MailBuffer(max_size=10, max_delay=0.01)
+
+    buffer.add(msg)
+    buffer.add(msg)
+    await buffer.close()
+
+    enqueue_task.assert_called_once()
+    assert not buffer.pending
+    assert 'Failed to queue batch of 2 mails' in caplog.text
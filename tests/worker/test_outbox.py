@@ -0,0 +1,127 @@
+'''Unit tests for the task outbox'''
+
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from bson import ObjectId
+
+from harbor.domain.outbox import OutboxTask
+from harbor.repository.base import TaskOutboxRepo
+from harbor.worker import outbox as outbox_module
+from harbor.worker.outbox import TaskOutbox, TaskOutboxFullError
+
+
+@pytest.mark.asyncio
+async def test_outbox_publishes_batches():
+    '''Should publish enqueued tasks in batches'''
+    publish = mock.Mock()
+    outbox = TaskOutbox(batch_size=2, publish=publish)
+    await outbox.start()
+    for i in range(3):
+        await outbox.enqueue('test.task', [i])
+    await outbox.close()
+
+    publish.assert_has_calls([
+        mock.call([('test.task', [0]), ('test.task', [1])]),
+        mock.call([('test.task', [2])]),
+    ])
+    assert outbox.metrics.published == 3
+    assert not outbox.running
+
+
+@pytest.mark.asyncio
+async def test_outbox_retries_failed_publish():
+    '''Should retry a batch until the broker accepts it'''
+    publish = mock.Mock(side_effect=[ConnectionError(), None])
+    outbox = TaskOutbox(publish=publish)
+    await outbox.start()
+    with mock.patch('harbor.worker.outbox.asyncio.sleep', new=mock.AsyncMock()):
+        await outbox.enqueue('test.task', [])
+        await outbox.close()
+
+    assert publish.call_count == 2
+    assert outbox.metrics.publish_errors == 1
+    assert outbox.metrics.published == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_full():
+    '''Should raise if the outbox is full'''
+    # Fake a started outbox without publisher
+    outbox = TaskOutbox(max_size=1)
+    outbox.queue = asyncio.Queue(maxsize=1)
+    outbox.workers = [mock.Mock()]
+    await outbox.enqueue('test.task', [])
+
+    with pytest.raises(TaskOutboxFullError) as error:
+        await outbox.enqueue('test.task', [])
+    assert isinstance(error.value.__cause__, asyncio.QueueFull)
+    assert outbox.dict()['depth'] == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_durable():
+    '''Should store tasks claimed by the outbox until published'''
+    task_id = str(ObjectId())
+    repo = mock.Mock(TaskOutboxRepo)
+    repo.add.return_value = task_id
+    repo.claim_stale.return_value = []
+    outbox = TaskOutbox(publish=mock.Mock())
+    await outbox.start(repo)
+    await outbox.enqueue('test.task', [1])
+    await outbox.close()
+
+    repo.add.assert_called_once_with(mock.ANY, outbox.claims.claimer_id)
+    repo.remove.assert_called_with([task_id])
+    assert not outbox.claims.task_ids
+    assert outbox.dict()['durable']
+
+
+@pytest.mark.asyncio
+async def test_outbox_close_saves_unpublished():
+    '''Should store tasks which weren't published on close without durability'''
+    repo = mock.Mock(TaskOutboxRepo)
+    repo.claim_stale.return_value = []
+    outbox = TaskOutbox(batch_size=1, publish=mock.Mock(side_effect=ConnectionError()))
+    await outbox.start(repo, durable=False)
+    await outbox.enqueue('test.task', [1])
+    await outbox.enqueue('test.task', [2])
+    await outbox.close(timeout=0.01)
+
+    assert [call.args[0].args for call in repo.add.call_args_list] == [[1], [2]]
+    assert outbox.metrics.saved_on_close == 2
+    assert not outbox.running
+
+
+@pytest.mark.asyncio
+async def test_outbox_recover():
+    '''Should renew claims and queue stale tasks, except tasks already queued'''
+    queued = OutboxTask(id=str(ObjectId()), task_name='test.task')
+    stale = OutboxTask(id=str(ObjectId()), task_name='test.task')
+    repo = mock.Mock(TaskOutboxRepo)
+    repo.claim_stale.return_value = [queued, stale]
+    outbox = TaskOutbox(batch_size=10, recover_after=timedelta(seconds=30))
+    outbox.claims.repo = repo
+    outbox.queue = asyncio.Queue()
+    outbox.claims.task_ids.add(queued.id)
+
+    await outbox.claims.refresh()
+    await outbox.recover()
+
+    claimer_id = outbox.claims.claimer_id
+    repo.refresh_claims.assert_called_with([queued.id], claimer_id)
+    repo.claim_stale.assert_called_with(timedelta(seconds=30), 10, claimer_id)
+    assert outbox.queue.qsize() == 1
+    assert outbox.claims.task_ids == {queued.id, stale.id}
+    assert outbox.metrics.recovered == 1
+
+
+@pytest.mark.asyncio
+@mock.patch('harbor.worker.outbox.queue_task')
+async def test_enqueue_task_not_started(queue_task):
+    '''Should publish directly if the outbox isn't started'''
+    outbox_module.get_task_outbox.cache_clear()
+    await outbox_module.enqueue_task('test.task', [1])
+    queue_task.assert_called_with('test.task', [1])
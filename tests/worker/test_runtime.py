@@ -0,0 +1,55 @@
+'''Unit tests for the worker runtime'''
+
+from unittest import mock
+
+import pytest
+
+from harbor.worker.runtime import WorkerRuntime, async_task
+
+
+@async_task
+async def echo(repos, value, suffix=''):
+    '''Returns the repositories and arguments'''
+    return (repos, f'{value}{suffix}')
+
+
+@pytest.fixture(name='runtime')
+def fixture_runtime():
+    '''Returns a runtime with mocked database'''
+    runtime = WorkerRuntime()
+    with mock.patch('harbor.worker.runtime.get_runtime', return_value=runtime), \
+            mock.patch('harbor.worker.runtime.mongo_common.create_db_client') as create_client, \
+            mock.patch('harbor.worker.runtime.mongo_notif.NotificationMongoRepo') as notif, \
+            mock.patch('harbor.worker.runtime.mongo_stats.StatsMongoRepo'), \
+            mock.patch('harbor.worker.runtime.mongo_user.UserMongoRepo'):
+        notif.return_value = 'notification-repo'
+        yield (runtime, create_client, notif)
+    runtime.close()
+
+
+def test_async_task(runtime):
+    '''Should start the runtime once and pass the shared repositories'''
+    (runtime, create_client, notif) = runtime
+
+    (repos, value) = echo('test', suffix='-1')
+    (repos_again, _) = echo('test')
+
+    assert value == 'test-1'
+    assert repos['notification'] == 'notification-repo'
+    assert repos_again is repos
+    create_client.assert_called_once()
+    notif.assert_called_once_with(create_client.return_value)
+    assert echo.name == 'tests.worker.test_runtime.echo'
+
+
+def test_close(runtime):
+    '''Should close the database client and event loop'''
+    (runtime, create_client, _) = runtime
+    echo('test')
+    loop = runtime.loop
+
+    runtime.close()
+
+    create_client.return_value.close.assert_called_with()
+    assert loop.is_closed()
+    assert runtime.repos == {}
@@ -0,0 +1,100 @@
+'''Unit tests for the SMTP connection pool'''
+
+import smtplib
+from unittest import mock
+
+import pytest
+
+from harbor.helpers.settings import get_settings
+from harbor.worker.smtp import SMTPPool
+
+
+@pytest.fixture(name='smtp')
+def fixture_smtp(monkeypatch):
+    '''Patches SMTP class to return a new mock per connection'''
+    monkeypatch.setenv("EMAIL_MAX_MESSAGES_PER_CONNECTION", "3")
+    get_settings.cache_clear()
+    with mock.patch('harbor.worker.smtp.smtplib.SMTP',
+                    side_effect=lambda *args: mock.MagicMock()) as smtp:
+        yield smtp
+    get_settings.cache_clear()
+
+
+def test_pool_reuses_connection(smtp):
+    '''Should send multiple messages over one connection'''
+    pool = SMTPPool()
+    for _ in range(3):
+        pool.send_message(mock.MagicMock())
+
+    assert smtp.call_count == 1
+    assert pool.connects == 1
+
+
+@pytest.mark.usefixtures('smtp')
+def test_pool_max_messages():
+    '''Should open a new connection after the maximum messages per connection'''
+    pool = SMTPPool()
+    for _ in range(3):
+        pool.send_message(mock.MagicMock())
+    assert not pool.idle.queue
+
+    pool.send_message(mock.MagicMock())
+    assert pool.connects == 2
+
+
+@pytest.mark.usefixtures('smtp')
+def test_pool_keepalive(monkeypatch):
+    '''Should replace idle connections which fail NOOP'''
+    monkeypatch.setenv("EMAIL_KEEPALIVE_SECONDS", "0")
+    get_settings.cache_clear()
+    pool = SMTPPool()
+    pool.send_message(mock.MagicMock())
+    conn = pool.idle.queue[0]
+    conn.smtp.noop.side_effect = smtplib.SMTPServerDisconnected()
+
+    pool.send_message(mock.MagicMock())
+
+    assert pool.connects == 2
+    conn.smtp.quit.assert_called_with()
+
+
+@pytest.mark.usefixtures('smtp')
+def test_pool_reconnect():
+    '''Should reconnect and retry once if the server dropped the connection'''
+    pool = SMTPPool()
+    pool.send_message(mock.MagicMock())
+    conn = pool.idle.queue[0]
+    conn.smtp.send_message.side_effect = smtplib.SMTPServerDisconnected()
+
+    pool.send_message(mock.MagicMock())
+
+    assert pool.connects == 2
+    assert len(pool.idle.queue) == 1
+    assert pool.idle.queue[0] is not conn
+
+
+@pytest.mark.usefixtures('smtp')
+def test_pool_keeps_connection_on_refused_recipient():
+    '''Should keep the connection if only the message failed'''
+    pool = SMTPPool()
+    pool.send_message(mock.MagicMock())
+    conn = pool.idle.queue[0]
+    conn.smtp.send_message.side_effect = smtplib.SMTPRecipientsRefused({})
+
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message(mock.MagicMock())
+
+    assert pool.idle.queue == [conn]
+
+
+@pytest.mark.usefixtures('smtp')
+def test_pool_close():
+    '''Should quit idle connections'''
+    pool = SMTPPool()
+    pool.send_message(mock.MagicMock())
+    conn = pool.idle.queue[0]
+
+    pool.close()
+
+    conn.smtp.quit.assert_called_with()
+    assert not pool.idle.queue